@@ -0,0 +1,193 @@
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+from starlette.responses import JSONResponse
+
+# Admission control: per-client token buckets for expensive routes, plus
+# load shedding when the event loop or the MongoDB pool falls behind.
+
+
+class InMemoryTokenBuckets:
+    """Token buckets held in this process, bounded by evicting the idlest keys."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Tuple[bool, float]:
+        """Take ``cost`` tokens; returns (allowed, seconds until enough tokens are available)."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+
+_REDIS_TOKEN_BUCKET = """
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or ARGV[2])
+local updated = tonumber(redis.call('HGET', KEYS[1], 'updated') or ARGV[4])
+local rate, burst, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisTokenBuckets:
+    """Token buckets shared between workers in any Redis-protocol store."""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package") from e
+        self.prefix = prefix
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(_REDIS_TOKEN_BUCKET)
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1.0) -> Tuple[bool, float]:
+        allowed, tokens = await self._script(keys=[self.prefix + key], args=[rate, burst, cost, time.time()])
+        if allowed:
+            return True, 0.0
+        return False, (cost - float(tokens)) / rate
+
+
+class PoolWaitListener(monitoring.ConnectionPoolListener):
+    """Tracks how many operations are waiting to check out a MongoDB connection."""
+
+    def __init__(self):
+        self.waiting = 0
+        self._lock = threading.Lock()
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.waiting -= 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_created(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_closed(self, event): pass
+    def connection_checked_in(self, event): pass
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes a periodic sleeper."""
+
+    def __init__(self, interval_seconds: float = 0.1):
+        self.interval_seconds = interval_seconds
+        self.lag_seconds = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval_seconds
+            await asyncio.sleep(self.interval_seconds)
+            lag = max(0.0, loop.time() - expected)
+            # Rise immediately, decay gradually so one quiet tick doesn't reopen the gate
+            self.lag_seconds = lag if lag > self.lag_seconds else self.lag_seconds * 0.7 + lag * 0.3
+
+
+class AdmissionMiddleware:
+    """ASGI middleware returning 429 for clients over their rate and 503 under overload."""
+
+    def __init__(self, app, buckets, pool_listener: PoolWaitListener, lag_monitor: LoopLagMonitor,
+                 limited_routes: Iterable[Tuple[str, str]], rate: float, burst: float,
+                 max_loop_lag_seconds: float, max_pool_waiters: int,
+                 exempt_prefixes: Iterable[str] = (), on_reject: Optional[Callable[[str], None]] = None,
+                 identify: Optional[Callable[[str], Awaitable[Optional[str]]]] = None):
+        self.app = app
+        self.buckets = buckets
+        self.pool_listener = pool_listener
+        self.lag_monitor = lag_monitor
+        self.limited_routes: List[Tuple[str, str]] = list(limited_routes)
+        self.rate = rate
+        self.burst = burst
+        self.max_loop_lag_seconds = max_loop_lag_seconds
+        self.max_pool_waiters = max_pool_waiters
+        self.exempt_prefixes = tuple(exempt_prefixes)
+        self.on_reject = on_reject
+        self.identify = identify
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        if self.max_loop_lag_seconds and self.lag_monitor.lag_seconds > self.max_loop_lag_seconds:
+            await self._reject(scope, receive, send, 503, "Server overloaded", 1, "loop_lag")
+            return
+        if self.max_pool_waiters and self.pool_listener.waiting > self.max_pool_waiters:
+            await self._reject(scope, receive, send, 503, "Server overloaded", 1, "db_pool")
+            return
+
+        if self.rate > 0 and self._is_limited(scope):
+            allowed, retry_after = await self.buckets.take(await self._client_key(scope), self.rate, self.burst)
+            if not allowed:
+                await self._reject(scope, receive, send, 429, "Too many requests", retry_after, "rate_limit")
+                return
+
+        await self.app(scope, receive, send)
+
+    def _is_limited(self, scope) -> bool:
+        method, path = scope["method"], scope["path"]
+        return any(method == m and path.startswith(prefix) for m, prefix in self.limited_routes)
+
+    async def _client_key(self, scope) -> str:
+        # Only a token that ``identify`` resolves to a user gets its own
+        # bucket; anything else shares the client address's bucket, so
+        # sending made-up tokens does not get around the limit
+        if self.identify is not None:
+            for name, value in scope["headers"]:
+                if name == b"authorization" and value:
+                    user_id = await self.identify(value.decode("latin-1"))
+                    if user_id is not None:
+                        return "user:" + user_id
+                    break
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    async def _reject(self, scope, receive, send, status: int, detail: str, retry_after: float, reason: str):
+        if self.on_reject is not None:
+            self.on_reject(reason)
+        response = JSONResponse(
+            {"detail": detail}, status_code=status,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,82 @@
+import asyncio
+import random
+from typing import Dict, Optional
+
+import httpx
+
+DEFAULT_SESSION_DATA_URL = "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data"
+
+
+class AuthProviderError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class AuthProviderClient:
+    """Pooled async client for the external session-data endpoint.
+
+    Concurrent lookups for the same session id share a single upstream
+    request; transport errors and 5xx responses are retried with
+    exponential backoff.
+    """
+
+    def __init__(
+        self,
+        session_data_url: str = DEFAULT_SESSION_DATA_URL,
+        connect_timeout: float = 2.0,
+        read_timeout: float = 5.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.2,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+    ):
+        self.session_data_url = session_data_url
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get_session_data(self, session_id: str) -> dict:
+        future = self._inflight.get(session_id)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_session_data(session_id))
+            self._inflight[session_id] = future
+            future.add_done_callback(lambda _: self._inflight.pop(session_id, None))
+        return await asyncio.shield(future)
+
+    async def _fetch_session_data(self, session_id: str) -> dict:
+        last_error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = self.backoff_base * (2 ** (attempt - 1))
+                await asyncio.sleep(delay + random.uniform(0, delay))
+            try:
+                response = await self._client.get(
+                    self.session_data_url,
+                    headers={"X-Session-ID": session_id},
+                )
+            except httpx.TransportError as e:
+                last_error = e
+                continue
+
+            if response.status_code >= 500:
+                last_error = AuthProviderError(502, f"Auth provider returned {response.status_code}")
+                continue
+            if response.status_code != 200:
+                raise AuthProviderError(401, "Invalid session")
+            return response.json()
+
+        if isinstance(last_error, AuthProviderError):
+            raise last_error
+        raise AuthProviderError(504, f"Auth provider unreachable: {last_error}")
+
+    async def aclose(self):
+        await self._client.aclose()
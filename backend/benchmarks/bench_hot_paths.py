@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""Time the request hot paths in-process and fail when they regress against a baseline.
+
+Helpers (courier charges, cart pricing, Cart/Order models) are timed
+directly; endpoints are timed through an ASGI client against the real app,
+with the in-memory MongoDB from mongomock-motor unless --mongo-url points
+at a local server. Nothing leaves the process.
+
+Run from the backend directory:
+
+    python benchmarks/bench_hot_paths.py --save      # record benchmarks/baseline.json
+    python benchmarks/bench_hot_paths.py             # compare; exits 1 on a regression
+
+Each benchmark is repeated, alternating with a fixed pure-Python
+calibration loop, and its fastest run is divided by the fastest
+calibration run. Baselines store these ratios, so they stay comparable
+across machines and across load changes on a shared host; microseconds
+are shown for reading only.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# The app reads its settings at import. Keep admission control and
+# background work out of the measurements.
+os.environ.setdefault('MONGO_URL', 'mongodb://127.0.0.1:27017')
+os.environ.setdefault('DB_NAME', 'bench_hot_paths')
+os.environ.setdefault('RATE_LIMIT_RPS', '1000000')
+os.environ.setdefault('RATE_LIMIT_BURST', '1000000')
+os.environ.setdefault('SHED_LOOP_LAG_MS', '60000')
+os.environ.setdefault('CATALOG_RELOAD_SECONDS', '0')
+os.environ.setdefault('OUTBOX_WORKERS', '0')
+
+import httpx  # noqa: E402
+
+import server  # noqa: E402
+from courier_rates import rate_for  # noqa: E402
+from documents import cart_view, new_order_document, order_view, priced_lines  # noqa: E402
+from fast_json import FastJSONResponse  # noqa: E402
+from server import Cart, Order, get_courier_charge  # noqa: E402
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+MENU_ITEM_IDS = ["chicken", "chicken_boneless", "prawns_small", "prawns_big", "mutton"]
+CHECKOUT = {
+    "delivery_address": "12-3-45, Main Road, Bhimavaram",
+    "pincode": "534201",
+    "phone": "9999999999",
+    "state": "andhra pradesh",
+}
+
+
+REPEATS = 7
+
+
+def _calibration_work():
+    total = 0
+    for i in range(20000):
+        total += i * i % 7
+    return total
+
+
+def calibrate(number: int = 2) -> float:
+    """Seconds for a fixed pure-Python workload on this machine, right now."""
+    return timeit.timeit(_calibration_work, number=number) / number
+
+
+def time_call(fn: Callable[[], object], number: int) -> float:
+    """Cost of one call relative to the calibration workload."""
+    calibrations, timings = [], []
+    for _ in range(REPEATS):
+        calibrations.append(calibrate())
+        timings.append(timeit.timeit(fn, number=number) / number)
+    return min(timings) / min(calibrations)
+
+
+async def time_request(request: Callable[[], Awaitable[httpx.Response]], number: int,
+                       setup: Optional[Callable[[], Awaitable[None]]] = None) -> float:
+    """Cost of one request relative to the calibration workload."""
+    calibrations, timings = [], []
+    for _ in range(REPEATS):
+        calibrations.append(calibrate())
+        elapsed = 0.0
+        for _ in range(number):
+            if setup is not None:
+                await setup()
+            started = time.perf_counter()
+            response = await request()
+            elapsed += time.perf_counter() - started
+            if response.status_code >= 400:
+                raise RuntimeError(f"{response.request.method} {response.request.url.path} "
+                                   f"returned {response.status_code}: {response.text}")
+        timings.append(elapsed / number)
+    return min(timings) / min(calibrations)
+
+
+def helper_benchmarks(number: int, orders_per_page: int) -> Dict[str, float]:
+    prices = server.catalog.prices
+    cart = {
+        "user_id": str(uuid.uuid4()), "v": 2, "version": 3,
+        "items": {menu_item_id: i + 1 for i, menu_item_id in enumerate(MENU_ITEM_IDS)},
+        "created_at": datetime.utcnow(), "updated_at": datetime.utcnow(),
+    }
+    view = cart_view(cart, prices)
+    document = new_order_document(cart["user_id"], priced_lines(cart, prices), 48000 * 15, **CHECKOUT)
+    page = [order_view(document)] * orders_per_page
+
+    return {
+        # rate_for is lru_cached; __wrapped__ times the lookup itself
+        "courier rate (state)": time_call(lambda: rate_for.__wrapped__("Andhra Pradesh", "534201"), number * 10),
+        "courier rate (pincode fallback)": time_call(lambda: rate_for.__wrapped__("Nowhere", "500 032"), number * 10),
+        "get_courier_charge (cached)": time_call(lambda: get_courier_charge("Andhra Pradesh", "534201"), number * 10),
+        "cart total (cart_view)": time_call(lambda: cart_view(cart, prices), number),
+        "Cart model build + dump_json": time_call(
+            lambda: Cart(id=str(uuid.uuid4()), **view).model_dump_json(), number
+        ),
+        "Order model build + dump_json": time_call(lambda: Order(**order_view(document)).model_dump_json(), number),
+        f"orders page of {orders_per_page} (FastJSONResponse)": time_call(lambda: FastJSONResponse(page), number),
+    }
+
+
+async def endpoint_benchmarks(number: int, orders_per_page: int) -> Dict[str, float]:
+    db = server.db
+    user_id = str(uuid.uuid4())
+    token = str(uuid.uuid4())
+    await db.users.insert_one({"id": user_id, "email": "bench@example.com", "name": "Bench", "picture": None,
+                               "created_at": datetime.utcnow()})
+    await db.sessions.insert_one({"session_token": token, "user_id": user_id,
+                                  "expires_at": datetime.utcnow() + timedelta(days=1), "created_at": datetime.utcnow()})
+    auth = {"Authorization": token}
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def add(menu_item_id: str = "chicken", quantity: int = 1):
+            return await client.post("/api/cart/add", headers=auth,
+                                     json={"menu_item_id": menu_item_id, "quantity": quantity})
+
+        async def fill_cart():
+            for menu_item_id in MENU_ITEM_IDS[:3]:
+                await add(menu_item_id, 2)
+
+        async def checkout():
+            return await client.post("/api/orders", headers=auth, json=CHECKOUT)
+
+        for _ in range(orders_per_page):
+            await fill_cart()
+            await checkout()
+        await fill_cart()
+        batch = {"operations": [{"op": "set", "menu_item_id": menu_item_id, "quantity": 2}
+                                for menu_item_id in MENU_ITEM_IDS]}
+
+        results = {
+            "GET /api/menu": await time_request(lambda: client.get("/api/menu"), number),
+            "GET /api/courier-charges/{state}": await time_request(
+                lambda: client.get("/api/courier-charges/telangana", params={"pincode": "500001"}), number
+            ),
+            "POST /api/cart/add": await time_request(add, number),
+            "POST /api/cart/batch": await time_request(
+                lambda: client.post("/api/cart/batch", headers=auth, json=batch), number
+            ),
+            "GET /api/cart": await time_request(lambda: client.get("/api/cart", headers=auth), number),
+        }
+        etag = (await client.get("/api/cart", headers=auth)).headers["ETag"]
+        results["GET /api/cart (304)"] = await time_request(
+            lambda: client.get("/api/cart", headers={**auth, "If-None-Match": etag}), number
+        )
+        results[f"GET /api/orders ({orders_per_page})"] = await time_request(
+            lambda: client.get("/api/orders", headers=auth, params={"limit": orders_per_page}), number
+        )
+        orders_etag = (await client.get("/api/orders", headers=auth)).headers["ETag"]
+        results["GET /api/orders (304)"] = await time_request(
+            lambda: client.get("/api/orders", headers={**auth, "If-None-Match": orders_etag}), number
+        )
+        results["GET /api/bootstrap"] = await time_request(lambda: client.get("/api/bootstrap", headers=auth), number)
+        # Checkout consumes the cart, so refill it untimed before each request
+        results["POST /api/orders"] = await time_request(checkout, number, setup=fill_cart)
+    return results
+
+
+def use_in_memory_mongo():
+    from mongomock_motor import AsyncMongoMockClient
+
+    class InMemoryClient(AsyncMongoMockClient):
+        def __init__(self, *args, event_listeners=None, **kwargs):
+            super().__init__()
+
+    server.AsyncIOMotorClient = InMemoryClient
+
+
+async def run(args) -> Dict[str, float]:
+    results = helper_benchmarks(args.number, args.orders)
+    async with server.app.router.lifespan_context(server.app):
+        await server.client.drop_database(server.DB_NAME)
+        results.update(await endpoint_benchmarks(max(1, args.number // 10), args.orders))
+        await server.client.drop_database(server.DB_NAME)
+    return results
+
+
+def compare(results: Dict[str, float], calibration: float, baseline: dict, budget: float) -> list:
+    """Names of benchmarks slower than their baseline by more than ``budget``.
+
+    Both sides are shown in microseconds at this machine's current speed.
+    """
+    regressions = []
+    print(f"\n{'benchmark':<44}{'baseline us':>13}{'now us':>10}{'change':>9}")
+    for name, cost in results.items():
+        previous = baseline["results"].get(name)
+        if previous is None:
+            print(f"{name:<44}{'-':>13}{cost * calibration * 1e6:>10.1f}{'new':>9}")
+            continue
+        change = cost / previous - 1
+        flag = "  REGRESSION" if change > budget else ""
+        print(f"{name:<44}{previous * calibration * 1e6:>13.1f}{cost * calibration * 1e6:>10.1f}{change:>+9.0%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=1000, help="calls per helper measurement (endpoints: a tenth)")
+    parser.add_argument("--orders", type=int, default=20, help="orders in the history page")
+    parser.add_argument("--mongo-url", default=None, help="time against this MongoDB instead of the in-memory one")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--budget", type=float, default=float(os.environ.get('BENCH_REGRESSION_BUDGET', '0.25')),
+                        help="allowed slowdown as a fraction of the baseline (default 0.25)")
+    parser.add_argument("--save", action="store_true", help="record these results as the new baseline")
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    if args.mongo_url:
+        server.mongo_url = args.mongo_url
+    else:
+        use_in_memory_mongo()
+
+    results = asyncio.run(run(args))
+    calibration = min(calibrate() for _ in range(REPEATS))
+    for name, cost in results.items():
+        print(f"  {name:<44} {cost * calibration * 1e6:10.1f} us")
+
+    if args.save:
+        args.baseline.write_text(json.dumps({
+            "recorded_at": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "mongo": args.mongo_url or "in-memory",
+            "calibration_seconds": calibration,
+            "results": results,
+        }, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}; record one with --save")
+        sys.exit(1)
+    regressions = compare(results, calibration, json.loads(args.baseline.read_text()), args.budget)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) exceeded the {args.budget:.0%} regression budget")
+        sys.exit(1)
+    print(f"\nAll benchmarks within the {args.budget:.0%} regression budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Compare the generic FastAPI encode path with the FastJSONResponse path.
+
+Run from the backend directory:  python benchmarks/bench_serialization.py
+"""
+import argparse
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from starlette.responses import JSONResponse  # noqa: E402
+
+from catalog import Catalog  # noqa: E402
+from documents import SCHEMA_VERSION, cart_view, new_order_document, order_view, priced_lines  # noqa: E402
+from fast_json import FastJSONResponse  # noqa: E402
+from server import Cart, Order  # noqa: E402
+
+PRICES = Catalog().prices
+CHECKOUT_FIELDS = {
+    "delivery_address": "12-3-45, Main Road, Bhimavaram",
+    "pincode": "534201",
+    "phone": "9999999999",
+    "state": "andhra pradesh",
+}
+
+
+def make_cart_document(lines: int = 5) -> dict:
+    """A stored (schema v2) cart, as the cart store returns it."""
+    now = datetime.utcnow()
+    return {
+        "user_id": str(uuid.uuid4()),
+        "v": SCHEMA_VERSION,
+        "items": {menu_item_id: i + 1 for i, menu_item_id in enumerate(list(PRICES)[:lines])},
+        "version": 3,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def make_order_documents(count: int) -> list:
+    """Stored (schema v2) orders, as order history reads them."""
+    orders = []
+    start = datetime.utcnow()
+    for i in range(count):
+        cart = make_cart_document(3)
+        order = new_order_document(cart["user_id"], priced_lines(cart, PRICES), 48000, **CHECKOUT_FIELDS)
+        order["created_at"] = start - timedelta(days=i)
+        orders.append(order)
+    return orders
+
+
+def bench(label: str, fn, number: int) -> float:
+    seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {label:<44} {seconds * 1e6:10.1f} us")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=50, help="orders per /orders page")
+    parser.add_argument("--number", type=int, default=200, help="iterations per measurement")
+    args = parser.parse_args()
+
+    orders = make_order_documents(args.orders)
+    cart = make_cart_document()
+
+    print(f"/orders page of {args.orders}")
+    slow = bench("Order(**order_view) + jsonable_encoder",
+                 lambda: JSONResponse(jsonable_encoder([Order(**order_view(order)) for order in orders])), args.number)
+    fast = bench("FastJSONResponse(order_view(doc) ...)",
+                 lambda: FastJSONResponse([order_view(order) for order in orders]), args.number)
+    print(f"  saved per request: {(slow - fast) * 1e6:.1f} us ({slow / fast:.1f}x)")
+
+    print("/cart")
+    slow = bench("Cart(**cart_view) + jsonable_encoder",
+                 lambda: JSONResponse(jsonable_encoder(Cart(**cart_view(cart, PRICES)).model_dump())), args.number)
+    fast = bench("FastJSONResponse(cart_view(doc))", lambda: FastJSONResponse(cart_view(cart, PRICES)), args.number)
+    print(f"  saved per request: {(slow - fast) * 1e6:.1f} us ({slow / fast:.1f}x)")
+
+    def checkout_via_models():
+        view = Cart(**cart_view(cart, PRICES))
+        return Order(user_id=view.user_id, items=view.items, subtotal=view.total_amount, courier_charges=480.0,
+                     total_amount=view.total_amount + 480.0, **CHECKOUT_FIELDS).model_dump()
+
+    def checkout_from_document():
+        return order_view(new_order_document(cart["user_id"], priced_lines(cart, PRICES), 48000, **CHECKOUT_FIELDS))
+
+    print("checkout order build")
+    slow = bench("Cart/Order models", checkout_via_models, args.number)
+    fast = bench("new_order_document + order_view", checkout_from_document, args.number)
+    print(f"  saved per request: {(slow - fast) * 1e6:.1f} us ({slow / fast:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+
+from cart_updates import CartChange, apply_cart_update, apply_changes
+from documents import SCHEMA_VERSION, upgrade_cart
+from fast_json import dumps
+
+logger = logging.getLogger(__name__)
+
+# Cart storage behind one interface. MongoCartStore writes every change
+# straight to the carts collection; WriteBackCartStore serves carts from a
+# hot cache and flushes changed carts to MongoDB in the background.
+
+
+class MongoCartStore:
+    """Carts read and updated directly in the carts collection."""
+
+    def __init__(self):
+        self.db = None
+
+    def start(self, db):
+        self.db = db
+
+    async def stop(self):
+        pass
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        return await self.db.carts.find_one({"user_id": user_id}, {"_id": 0})
+
+    async def head(self, user_id: str) -> Optional[dict]:
+        """Just the fields a cart's ETag depends on."""
+        return await self.db.carts.find_one({"user_id": user_id}, {"_id": 0, "created_at": 1, "version": 1, "items": 1})
+
+    async def apply(self, user_id: str, changes: List[CartChange], upsert: bool = True) -> Optional[dict]:
+        return await apply_cart_update(self.db, user_id, changes, upsert=upsert)
+
+    @asynccontextmanager
+    async def checkout(self, user_id: str):
+        yield
+
+    def stats(self) -> dict:
+        return {"dirty": 0, "flushes": 0, "flush_failures": 0}
+
+
+class InProcessCartCache:
+    """Hot carts in this worker's memory, expiring ``ttl_seconds`` after their last write.
+
+    Only suitable for a single worker (or session-sticky routing), since
+    other workers never see these carts.
+    """
+
+    shared = False
+
+    def __init__(self, max_size: int = 100000, ttl_seconds: float = 3600.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[dict, float]]" = OrderedDict()
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        cart, deadline = entry
+        if deadline <= time.monotonic():
+            del self._entries[user_id]
+            return None
+        self._entries.move_to_end(user_id)
+        return cart
+
+    async def set(self, user_id: str, cart: dict):
+        self._entries.pop(user_id, None)
+        self._entries[user_id] = (cart, time.monotonic() + self.ttl_seconds)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    async def delete(self, user_id: str):
+        self._entries.pop(user_id, None)
+
+    @asynccontextmanager
+    async def lock(self, user_id: str, wait: bool = True):
+        # One worker: WriteBackCartStore's own per-user lock is enough
+        yield True
+
+
+_REDIS_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+  return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisCartCache:
+    """Hot carts in a Redis-protocol store shared by every worker, with a per-key TTL.
+
+    ``lock(user_id)`` is a lease held in the same store (SET NX PX), so
+    a cart can be held still across workers; it lapses after
+    ``lock_ttl_seconds`` if its worker dies.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, ttl_seconds: float = 3600.0, prefix: str = "cart:",
+                 lock_ttl_seconds: float = 30.0, lock_timeout_seconds: float = 5.0):
+        try:
+            import redis.asyncio as redis
+        except ImportError as e:
+            raise RuntimeError("CART_STORE=redis requires the 'redis' package") from e
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.lock_timeout_seconds = lock_timeout_seconds
+        self._redis = redis.from_url(url)
+        self._release = self._redis.register_script(_REDIS_RELEASE_LOCK)
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        raw = await self._redis.get(self.prefix + user_id)
+        if raw is None:
+            return None
+        cart = json.loads(raw)
+        for key in ("created_at", "updated_at"):
+            if cart.get(key):
+                cart[key] = datetime.fromisoformat(cart[key])
+        return cart
+
+    async def set(self, user_id: str, cart: dict):
+        await self._redis.set(self.prefix + user_id, dumps(cart), px=int(self.ttl_seconds * 1000))
+
+    async def delete(self, user_id: str):
+        await self._redis.delete(self.prefix + user_id)
+
+    @asynccontextmanager
+    async def lock(self, user_id: str, wait: bool = True):
+        """Hold ``user_id``'s cart across workers. Yields False, holding nothing, if it is taken and ``wait`` is off."""
+        key = f"{self.prefix}lock:{user_id}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout_seconds
+        while not await self._redis.set(key, token, nx=True, px=int(self.lock_ttl_seconds * 1000)):
+            if not wait:
+                yield False
+                return
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Cart of {user_id} is locked by another worker")
+            await asyncio.sleep(0.01)
+        try:
+            yield True
+        finally:
+            await self._release(keys=[key], args=[token])
+
+
+def _older_stored_cart(user_id: str, cart: dict) -> dict:
+    """Matches ``user_id``'s stored cart only if ``cart`` is newer than it."""
+    created_at = cart.get("created_at")
+    if created_at is None:
+        return {"user_id": user_id}
+    # MongoDB keeps milliseconds, so compare at that precision
+    created_at = created_at.replace(microsecond=created_at.microsecond // 1000 * 1000)
+    return {"user_id": user_id, "$or": [
+        {"v": {"$ne": SCHEMA_VERSION}},
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "version": {"$lt": cart.get("version", 0)}},
+    ]}
+
+
+class WriteBackCartStore:
+    """Cart reads and writes served from a hot cache, flushed to MongoDB asynchronously.
+
+    Changed carts are written to the carts collection every
+    ``flush_interval_seconds`` in one bulk write, and on shutdown. A worker
+    crash loses at most one interval of cart edits. Checkout runs inside
+    ``checkout(user_id)``, which holds the user's cart still, writes its
+    current version to MongoDB and drops the hot copy afterwards, so the
+    order is always built from a flushed cart.
+
+    With a shared hot cache, cart writes and checkout also hold the hot
+    cache's cross-worker lock for the user, and background flushes skip
+    carts locked by a checkout elsewhere. Flushes only replace a stored
+    cart with a newer one, so a stale copy never overwrites a later write.
+    """
+
+    def __init__(self, hot, flush_interval_seconds: float = 1.0):
+        self.db = None
+        self.hot = hot
+        self.flush_interval_seconds = flush_interval_seconds
+        self._dirty: Dict[str, dict] = {}
+        self._locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.flush_failures = 0
+
+    def start(self, db):
+        self.db = db
+        self._flusher = asyncio.create_task(self._run_flusher())
+
+    async def stop(self):
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
+
+    async def get(self, user_id: str) -> Optional[dict]:
+        cart = await self.hot.get(user_id)
+        if cart is not None:
+            return cart
+        async with self._lock(user_id):
+            return await self._load(user_id)
+
+    async def head(self, user_id: str) -> Optional[dict]:
+        return await self.get(user_id)
+
+    async def apply(self, user_id: str, changes: List[CartChange], upsert: bool = True) -> Optional[dict]:
+        async with self._lock(user_id), self.hot.lock(user_id):
+            cart = await self._load(user_id)
+            if cart is None and not upsert:
+                return None
+            cart = apply_changes(cart, user_id, changes)
+            await self.hot.set(user_id, cart)
+            self._dirty[user_id] = cart
+            return cart
+
+    async def flush(self, user_id: Optional[str] = None):
+        """Write dirty carts (or ``user_id``'s current cart) to MongoDB."""
+        async with self._flush_lock:
+            if user_id is not None:
+                pending = {user_id: self._dirty.pop(user_id, None)}
+            else:
+                pending, self._dirty = self._dirty, {}
+
+            async with AsyncExitStack() as locks:
+                writes = []
+                for pending_user_id, cart in list(pending.items()):
+                    # A checkout holds the lock and flushes the cart itself;
+                    # reading it now could write it back after it is claimed
+                    if user_id is None and not await locks.enter_async_context(
+                        self.hot.lock(pending_user_id, wait=False)
+                    ):
+                        del pending[pending_user_id]
+                        self._dirty.setdefault(pending_user_id, cart)
+                        continue
+                    # A shared cache holds the latest version from any worker
+                    if self.hot.shared or cart is None:
+                        cart = await self.hot.get(pending_user_id)
+                    if cart is not None:
+                        writes.append(ReplaceOne(_older_stored_cart(pending_user_id, cart), cart, upsert=True))
+                if not writes:
+                    return
+                try:
+                    await self.db.carts.bulk_write(writes, ordered=False)
+                except BulkWriteError as e:
+                    # Duplicate keys are carts whose stored copy is newer; those writes are dropped
+                    errors = e.details["writeErrors"]
+                    if e.details.get("writeConcernErrors") or any(error["code"] != 11000 for error in errors):
+                        self._retry_later(pending)
+                        raise
+                except Exception:
+                    self._retry_later(pending)
+                    raise
+            self.flushes += 1
+
+    def _retry_later(self, pending: Dict[str, Optional[dict]]):
+        self.flush_failures += 1
+        for pending_user_id, cart in pending.items():
+            if cart is not None:
+                self._dirty.setdefault(pending_user_id, cart)
+
+    @asynccontextmanager
+    async def checkout(self, user_id: str):
+        """Hold ``user_id``'s cart still and flushed while an order is placed from MongoDB."""
+        async with self._lock(user_id), self.hot.lock(user_id):
+            await self.flush(user_id)
+            try:
+                yield
+            finally:
+                # Claimed by the order, or restored to MongoDB; reload from there next time
+                await self.hot.delete(user_id)
+
+    def stats(self) -> dict:
+        return {"dirty": len(self._dirty), "flushes": self.flushes, "flush_failures": self.flush_failures}
+
+    def _lock(self, user_id: str) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    async def _load(self, user_id: str) -> Optional[dict]:
+        cart = await self.hot.get(user_id)
+        if cart is None:
+            cart = await self.db.carts.find_one({"user_id": user_id}, {"_id": 0})
+            if cart is not None:
+                cart = upgrade_cart(cart)
+                await self.hot.set(user_id, cart)
+        return cart
+
+    async def _run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval_seconds)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Cart flush failed; %d carts will be retried", len(self._dirty))
@@ -0,0 +1,96 @@
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from documents import SCHEMA_VERSION, upgrade_stored_cart
+
+# Updates on the carts collection. A cart stores {menu_item_id: quantity}
+# (see documents.py), so every mutation, however many lines it touches, is
+# one atomic find_one_and_update of $inc/$set/$unset on those fields.
+# Every mutation also bumps the cart's version, which conditional GETs use.
+# apply_changes performs the same mutation on an in-memory cart document.
+
+
+class CartChange(NamedTuple):
+    op: str  # "add", "set" or "remove"
+    menu_item_id: str
+    quantity: int = 0
+
+
+def _item_path(menu_item_id: str) -> str:
+    if not menu_item_id or "." in menu_item_id or menu_item_id.startswith("$"):
+        raise ValueError(f"Invalid menu item id: {menu_item_id!r}")
+    return "items." + menu_item_id
+
+
+def _fold(changes: List[CartChange]) -> Dict[str, Tuple[str, int]]:
+    """Net effect per item: ("inc", n), ("set", n) or ("unset", 0)."""
+    effects: Dict[str, Tuple[str, int]] = {}
+    for change in changes:
+        previous = effects.get(change.menu_item_id)
+        if change.op == "remove" or (change.op == "set" and change.quantity <= 0):
+            effects[change.menu_item_id] = ("unset", 0)
+        elif change.op == "set":
+            effects[change.menu_item_id] = ("set", change.quantity)
+        elif previous is None:
+            effects[change.menu_item_id] = ("inc", change.quantity)
+        elif previous[0] == "unset":
+            effects[change.menu_item_id] = ("set", change.quantity)
+        else:
+            effects[change.menu_item_id] = (previous[0], previous[1] + change.quantity)
+    return effects
+
+
+def cart_update(changes: List[CartChange]) -> dict:
+    now = datetime.utcnow()
+    update = {"$set": {"updated_at": now}, "$setOnInsert": {"created_at": now}, "$inc": {"version": 1}}
+    for menu_item_id, (op, quantity) in _fold(changes).items():
+        path = _item_path(menu_item_id)
+        if op == "unset":
+            update.setdefault("$unset", {})[path] = ""
+        else:
+            update.setdefault("$" + op, {})[path] = quantity
+    return update
+
+
+def apply_changes(cart: Optional[dict], user_id: str, changes: List[CartChange]) -> dict:
+    """Return a copy of ``cart`` (or a new cart) with ``changes`` applied, like cart_update."""
+    now = datetime.utcnow()
+    cart = dict(cart) if cart else {"user_id": user_id, "v": SCHEMA_VERSION, "created_at": now}
+    items = dict(cart.get("items") or {})
+    for menu_item_id, (op, quantity) in _fold(changes).items():
+        _item_path(menu_item_id)
+        if op == "unset":
+            items.pop(menu_item_id, None)
+        elif op == "set":
+            items[menu_item_id] = quantity
+        else:
+            items[menu_item_id] = items.get(menu_item_id, 0) + quantity
+    cart.update(items=items, updated_at=now, version=cart.get("version", 0) + 1)
+    return cart
+
+
+async def _find_and_update(db, user_id: str, update: dict, upsert: bool) -> Optional[dict]:
+    return await db.carts.find_one_and_update(
+        {"user_id": user_id, "v": SCHEMA_VERSION},
+        update,
+        projection={"_id": 0},
+        upsert=upsert,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def apply_cart_update(db, user_id: str, changes: List[CartChange], upsert: bool = True) -> Optional[dict]:
+    """Apply ``changes`` to a user's cart in one round trip and return the stored cart."""
+    update = cart_update(changes)
+    try:
+        cart = await _find_and_update(db, user_id, update, upsert)
+    except DuplicateKeyError:
+        # Lost an upsert race against a concurrent first write, or the
+        # user's cart is still in an older schema
+        cart = None
+    if cart is None and (await upgrade_stored_cart(db, user_id) or upsert):
+        cart = await _find_and_update(db, user_id, update, upsert=False)
+    return cart
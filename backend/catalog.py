@@ -0,0 +1,123 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from documents import to_paise
+from http_cache import etag_for
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MENU_ITEMS = [
+    {
+        "id": "chicken",
+        "name": "Chicken",
+        "price": 800.0,
+        "description": "Fresh chicken pickle per KG",
+        "image_url": ""
+    },
+    {
+        "id": "chicken_boneless",
+        "name": "Chicken Boneless",
+        "price": 1000.0,
+        "description": "Boneless chicken pickle per KG",
+        "image_url": ""
+    },
+    {
+        "id": "prawns_small",
+        "name": "Prawns Small Size",
+        "price": 1200.0,
+        "description": "Small size prawn pickle per KG",
+        "image_url": ""
+    },
+    {
+        "id": "prawns_big",
+        "name": "Prawns Big Size",
+        "price": 1400.0,
+        "description": "Big size prawn pickle per KG",
+        "image_url": ""
+    },
+    {
+        "id": "mutton",
+        "name": "Mutton",
+        "price": 1500.0,
+        "description": "Fresh mutton pickle per KG",
+        "image_url": ""
+    }
+]
+
+
+def _normalize_item(item: dict) -> dict:
+    missing = [key for key in ("id", "name", "price") if key not in item]
+    if missing:
+        raise ValueError(f"Menu item {item!r} is missing {', '.join(missing)}")
+    return {
+        "id": str(item["id"]),
+        "name": item["name"],
+        "price": float(item["price"]),
+        "description": item.get("description"),
+        "image_url": item.get("image_url"),
+    }
+
+
+class Catalog:
+    """In-memory menu with an id index and a pre-encoded response body.
+
+    The source is a JSON file when ``file_path`` is set, otherwise the
+    ``menu_items`` collection, falling back to the built-in menu when that
+    collection is empty. ``reload`` swaps in a complete new snapshot, so
+    readers never see a half-built catalog.
+    """
+
+    def __init__(self, file_path: Optional[str] = None):
+        self.file_path = file_path
+        self.items: List[dict] = []
+        self.by_id: Dict[str, dict] = {}
+        self.prices: Dict[str, int] = {}
+        self.body = b"[]"
+        self.etag = ""
+        self.loaded_at: Optional[datetime] = None
+        self._file_mtime: Optional[float] = None
+        self.load(DEFAULT_MENU_ITEMS)
+
+    def load(self, items: List[dict]):
+        items = [_normalize_item(item) for item in items]
+        body = json.dumps(items, separators=(",", ":")).encode()
+        # Assign the snapshot fields together; there is no await in between
+        self.items = items
+        self.by_id = {item["id"]: item for item in items}
+        self.prices = {item["id"]: to_paise(item["price"]) for item in items}
+        self.body = body
+        self.etag = etag_for(body)
+        self.loaded_at = datetime.utcnow()
+
+    def get(self, item_id: str) -> Optional[dict]:
+        return self.by_id.get(item_id)
+
+    async def reload(self, db) -> bool:
+        """Reload from the configured source. Returns True when the menu changed."""
+        previous_etag = self.etag
+        if self.file_path:
+            mtime = os.path.getmtime(self.file_path)
+            if mtime == self._file_mtime:
+                return False
+            with open(self.file_path) as f:
+                items = json.load(f)
+            self._file_mtime = mtime
+        else:
+            items = await db.menu_items.find({}, {"_id": 0}).sort("_id", 1).to_list(None)
+            if not items:
+                items = DEFAULT_MENU_ITEMS
+        self.load(items)
+        return self.etag != previous_etag
+
+    async def watch(self, db, interval_seconds: float):
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                if await self.reload(db):
+                    logger.info("Menu catalog reloaded (%d items)", len(self.items))
+            except Exception:
+                logger.exception("Menu catalog reload failed; keeping previous snapshot")
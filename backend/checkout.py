@@ -0,0 +1,72 @@
+import hashlib
+import json
+from datetime import datetime
+from typing import Optional
+
+from pymongo.errors import DuplicateKeyError
+
+# Helpers for placing an order exactly once. The cart is claimed with a
+# single find_one_and_delete, so two concurrent checkouts can never both
+# turn the same cart into an order, and Idempotency-Key records store the
+# first response so client retries replay it instead of writing again.
+
+
+class IdempotencyConflict(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def request_fingerprint(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+async def begin_idempotent_request(db, user_id: str, key: str, fingerprint: str) -> Optional[dict]:
+    """Reserve ``key`` for this request, or return the stored response of a completed one."""
+    try:
+        await db.idempotency_keys.insert_one({
+            "user_id": user_id,
+            "key": key,
+            "fingerprint": fingerprint,
+            "status": "in_progress",
+            "created_at": datetime.utcnow(),
+        })
+        return None
+    except DuplicateKeyError:
+        record = await db.idempotency_keys.find_one({"user_id": user_id, "key": key})
+
+    if record is None:
+        # Expired between the insert attempt and the read; treat as a new request
+        return await begin_idempotent_request(db, user_id, key, fingerprint)
+    if record["fingerprint"] != fingerprint:
+        raise IdempotencyConflict(422, "Idempotency-Key was already used with a different request")
+    if record["status"] != "completed":
+        raise IdempotencyConflict(409, "A request with this Idempotency-Key is still in progress")
+    return record["response"]
+
+
+async def complete_idempotent_request(db, user_id: str, key: str, response: dict, session=None):
+    await db.idempotency_keys.update_one(
+        {"user_id": user_id, "key": key},
+        {"$set": {"status": "completed", "response": response, "completed_at": datetime.utcnow()}},
+        session=session,
+    )
+
+
+async def abandon_idempotent_request(db, user_id: str, key: str):
+    await db.idempotency_keys.delete_one({"user_id": user_id, "key": key, "status": "in_progress"})
+
+
+async def claim_cart(db, user_id: str, session=None) -> Optional[dict]:
+    """Atomically take a non-empty cart out of the carts collection."""
+    return await db.carts.find_one_and_delete(
+        {"user_id": user_id, "items": {"$exists": True, "$nin": [{}, []]}},
+        session=session,
+    )
+
+
+async def restore_cart(db, cart: dict):
+    """Put a claimed cart back after a failed non-transactional checkout."""
+    cart = {key: value for key, value in cart.items() if key != "_id"}
+    await db.carts.replace_one({"user_id": cart["user_id"]}, cart, upsert=True)
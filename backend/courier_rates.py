@@ -0,0 +1,120 @@
+import json
+import re
+from functools import lru_cache
+from itertools import product
+from typing import Dict, List, Optional
+
+from http_cache import etag_for
+
+# Per-kg courier rates by zone. Every state/UT maps to a zone; anything
+# unrecognised falls back to DEFAULT_ZONE.
+ZONE_RATES: Dict[str, float] = {
+    "andhra_pradesh": 80.0,
+    "telangana": 100.0,
+    "rest_of_india": 150.0,
+}
+DEFAULT_ZONE = "rest_of_india"
+
+_STATE_ZONES = {
+    "andhra pradesh": "andhra_pradesh",
+    "telangana": "telangana",
+}
+
+# Other spellings shoppers use, by the state name they stand for
+_STATE_ALIASES = {
+    "andhra": "andhra pradesh",
+    "ap": "andhra pradesh",
+    "ts": "telangana",
+    "tg": "telangana",
+}
+
+_OTHER_STATES = [
+    "andaman and nicobar islands", "arunachal pradesh", "assam", "bihar", "chandigarh",
+    "chhattisgarh", "dadra and nagar haveli and daman and diu", "delhi", "goa", "gujarat",
+    "haryana", "himachal pradesh", "jammu and kashmir", "jharkhand", "karnataka", "kerala",
+    "ladakh", "lakshadweep", "madhya pradesh", "maharashtra", "manipur", "meghalaya",
+    "mizoram", "nagaland", "odisha", "puducherry", "punjab", "rajasthan", "sikkim",
+    "tamil nadu", "tripura", "uttar pradesh", "uttarakhand", "west bengal", "other",
+]
+
+# Three-digit pincode prefixes of the Hyderabad (Telangana) and Andhra
+# Pradesh postal regions.
+_PINCODE_PREFIX_ZONES = {
+    **{str(prefix): "telangana" for prefix in range(500, 510)},
+    **{str(prefix): "andhra_pradesh" for prefix in range(515, 536)},
+}
+
+
+def normalize_state(state: str) -> str:
+    state = re.sub(r"[^a-z0-9]+", " ", state.lower().replace("&", " and "))
+    return " ".join(state.split())
+
+
+def canonical_state(state: str) -> str:
+    """The normalized state name, with known aliases ("AP", "Andhra") mapped to the full name."""
+    state = normalize_state(state or "")
+    return _STATE_ALIASES.get(state, state)
+
+
+# Characters normalize_state turns into word breaks; "&" also becomes "and"
+_SEPARATOR = "[^a-z0-9&]"
+
+
+def _spelling_patterns(name: str) -> List[str]:
+    patterns = []
+    for words in product(*((["and", "&"] if word == "and" else [word]) for word in name.split())):
+        pattern = ""
+        for previous, word in zip(("",) + words, words):
+            if previous and "&" not in (previous, word):
+                pattern += f"{_SEPARATOR}+"
+            elif previous:
+                pattern += f"{_SEPARATOR}*"
+            pattern += re.escape(word)
+        patterns.append(pattern)
+    return patterns
+
+
+def state_pattern(state: str) -> str:
+    """A case-insensitive regex matching exactly the spellings whose canonical_state is that of ``state``."""
+    canonical = canonical_state(state)
+    names = [canonical] + sorted(alias for alias, name in _STATE_ALIASES.items() if name == canonical)
+    spellings = [pattern for name in names for pattern in _spelling_patterns(name)]
+    return f"^{_SEPARATOR}*(?:{'|'.join(spellings)}){_SEPARATOR}*$"
+
+
+def _build_state_rates() -> Dict[str, float]:
+    zones = dict(_STATE_ZONES)
+    for alias, state in _STATE_ALIASES.items():
+        zones[alias] = _STATE_ZONES[state]
+    for state in _OTHER_STATES:
+        zones.setdefault(state, DEFAULT_ZONE)
+    return {state: ZONE_RATES[zone] for state, zone in zones.items()}
+
+
+STATE_RATES = _build_state_rates()
+PINCODE_PREFIX_RATES = {prefix: ZONE_RATES[zone] for prefix, zone in _PINCODE_PREFIX_ZONES.items()}
+DEFAULT_RATE = ZONE_RATES[DEFAULT_ZONE]
+
+
+@lru_cache(maxsize=4096)
+def rate_for(state: str, pincode: Optional[str] = None) -> float:
+    """Per-kg rate: a recognised state wins, then the pincode prefix, then the default."""
+    rate = STATE_RATES.get(normalize_state(state or ""))
+    if rate is not None:
+        return rate
+    if pincode:
+        pincode = pincode.replace(" ", "")
+        if len(pincode) == 6 and pincode.isdigit():
+            rate = PINCODE_PREFIX_RATES.get(pincode[:3])
+            if rate is not None:
+                return rate
+    return DEFAULT_RATE
+
+
+RATE_TABLE = {
+    "default_per_kg": DEFAULT_RATE,
+    "states": STATE_RATES,
+    "pincode_prefixes": PINCODE_PREFIX_RATES,
+}
+RATE_TABLE_BODY = json.dumps(RATE_TABLE, separators=(",", ":"), sort_keys=True).encode()
+RATE_TABLE_ETAG = etag_for(RATE_TABLE_BODY)
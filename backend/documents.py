@@ -0,0 +1,191 @@
+import argparse
+import asyncio
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne
+
+# Stored schema for carts and orders, and conversion to the API shape.
+#
+# Version 2 documents carry "v": 2. A cart stores {menu_item_id: quantity}
+# and is priced from the catalog when read. An order stores
+# {menu_item_id: [quantity, unit price]} and every amount as integer paise.
+# Version 1 documents (item lists and float rupees) are still read, upgraded
+# whenever a cart is written, and rewritten in bulk by ``migrate``.
+
+SCHEMA_VERSION = 2
+ORDER_MONEY_FIELDS = ("subtotal", "courier_charges", "total_amount")
+
+
+def to_paise(rupees: float) -> int:
+    return int(round(rupees * 100))
+
+
+def from_paise(paise: int) -> float:
+    return paise / 100
+
+
+def cart_quantities(cart: dict) -> Dict[str, int]:
+    items = cart.get("items") or {}
+    if isinstance(items, dict):
+        return items
+    quantities: Dict[str, int] = {}
+    for item in items:
+        quantities[item["menu_item_id"]] = quantities.get(item["menu_item_id"], 0) + item["quantity"]
+    return quantities
+
+
+def priced_lines(cart: dict, prices: Mapping[str, int]) -> Dict[str, List[int]]:
+    """{menu_item_id: [quantity, unit price in paise]}, skipping items no longer on the menu."""
+    return {
+        menu_item_id: [quantity, prices[menu_item_id]]
+        for menu_item_id, quantity in cart_quantities(cart).items()
+        if menu_item_id in prices
+    }
+
+
+def cart_view(cart: Optional[dict], prices: Mapping[str, int], available: Optional[Mapping[str, int]] = None) -> dict:
+    """API form of a stored cart: a priced item list and its total in rupees.
+
+    Lines for items with limited stock also carry ``available_kg`` from ``available``.
+    """
+    if not cart:
+        return {"items": [], "total_amount": 0.0}
+    lines = priced_lines(cart, prices)
+    view = {key: value for key, value in cart.items() if key not in ("_id", "v", "id", "items", "total_amount")}
+    view["items"] = [
+        {"menu_item_id": menu_item_id, "quantity": quantity, "price": from_paise(price)}
+        for menu_item_id, (quantity, price) in lines.items()
+    ]
+    if available:
+        for item in view["items"]:
+            if item["menu_item_id"] in available:
+                item["available_kg"] = available[item["menu_item_id"]]
+    view["total_amount"] = from_paise(sum(quantity * price for quantity, price in lines.values()))
+    return view
+
+
+def cart_revision(cart: Optional[dict]) -> str:
+    """Changes whenever the stored cart does, including when it is checked out and recreated."""
+    if not cart:
+        return "none"
+    created_at = cart.get("created_at")
+    return f"{int(created_at.timestamp() * 1000) if created_at else 0}:{cart.get('version', 0)}"
+
+
+def new_order_document(user_id: str, lines: Dict[str, List[int]], courier_charges: int, **details) -> dict:
+    subtotal = sum(quantity * price for quantity, price in lines.values())
+    return {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "v": SCHEMA_VERSION,
+        "items": lines,
+        "subtotal": subtotal,
+        "courier_charges": courier_charges,
+        "total_amount": subtotal + courier_charges,
+        **details,
+        "status": "pending",
+        "created_at": datetime.utcnow(),
+    }
+
+
+def order_view(order: dict) -> dict:
+    """API form of a stored order (any version, possibly projected)."""
+    view = {key: value for key, value in order.items() if key != "v"}
+    if order.get("v") != SCHEMA_VERSION:
+        return view
+    if "items" in view:
+        view["items"] = [
+            {"menu_item_id": menu_item_id, "quantity": quantity, "price": from_paise(price)}
+            for menu_item_id, (quantity, price) in view["items"].items()
+        ]
+    for field in ORDER_MONEY_FIELDS:
+        if field in view:
+            view[field] = from_paise(view[field])
+    return view
+
+
+def upgrade_cart(cart: dict) -> dict:
+    if cart.get("v") == SCHEMA_VERSION:
+        return cart
+    upgraded = {key: value for key, value in cart.items() if key not in ("id", "items", "total_amount")}
+    upgraded["v"] = SCHEMA_VERSION
+    upgraded["items"] = cart_quantities(cart)
+    return upgraded
+
+
+def upgrade_order(order: dict) -> dict:
+    if order.get("v") == SCHEMA_VERSION:
+        return order
+    upgraded = dict(order)
+    upgraded["v"] = SCHEMA_VERSION
+    lines: Dict[str, List[int]] = {}
+    for item in order["items"]:
+        if item["menu_item_id"] in lines:
+            lines[item["menu_item_id"]][0] += item["quantity"]
+        else:
+            lines[item["menu_item_id"]] = [item["quantity"], to_paise(item["price"])]
+    upgraded["items"] = lines
+    for field in ORDER_MONEY_FIELDS:
+        upgraded[field] = to_paise(order[field])
+    return upgraded
+
+
+async def upgrade_stored_cart(db, user_id: str) -> bool:
+    """Rewrite ``user_id``'s cart in the current schema. Returns False if there was nothing to upgrade."""
+    cart = await db.carts.find_one({"user_id": user_id, "v": {"$ne": SCHEMA_VERSION}})
+    if cart is None:
+        return False
+    await db.carts.replace_one({"_id": cart["_id"], "v": {"$ne": SCHEMA_VERSION}}, upgrade_cart(cart))
+    return True
+
+
+UPGRADES = {"carts": upgrade_cart, "orders": upgrade_order}
+
+
+async def migrate(db, collection: str, batch_size: int = 1000, pause_seconds: float = 0.0) -> int:
+    """Rewrite older documents in ``collection`` in _id order. Safe to stop and rerun."""
+    upgrade = UPGRADES[collection]
+    migrated = 0
+    last_id = None
+    while True:
+        query = {"v": {"$ne": SCHEMA_VERSION}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db[collection].find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            return migrated
+        # The version guard skips documents upgraded by a request since they were read
+        result = await db[collection].bulk_write(
+            [ReplaceOne({"_id": doc["_id"], "v": {"$ne": SCHEMA_VERSION}}, upgrade(doc)) for doc in batch],
+            ordered=False,
+        )
+        migrated += result.modified_count
+        last_id = batch[-1]["_id"]
+        if pause_seconds:
+            await asyncio.sleep(pause_seconds)
+
+
+async def _main(collections: List[str], batch_size: int, pause_seconds: float):
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        for collection in collections:
+            migrated = await migrate(client[os.environ['DB_NAME']], collection, batch_size, pause_seconds)
+            print(f"Migrated {migrated} {collection} documents to schema v{SCHEMA_VERSION}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=f"Rewrite carts and orders in schema v{SCHEMA_VERSION}")
+    parser.add_argument("collections", nargs="*", choices=sorted(UPGRADES), help="default: all")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--pause-ms", type=float, default=0, help="sleep between batches to limit load")
+    args = parser.parse_args()
+    asyncio.run(_main(args.collections or sorted(UPGRADES), args.batch_size, args.pause_ms / 1000))
@@ -0,0 +1,336 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import time
+from datetime import date, datetime
+from enum import Enum
+from pathlib import Path
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import typer
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from courier_rates import canonical_state, state_pattern
+from documents import order_view, upgrade_order
+from fast_json import dumps
+from mongo_options import read_preference
+from order_archive import ARCHIVE_SCHEMA, OrderArchive, order_row
+
+# Streams orders to CSV (one row per order line), NDJSON (one
+# order per line) or Parquet (a directory of part files in the archive
+# schema). Reads and encoding overlap: while one batch is encoded and
+# written on a worker thread, the next is fetched from MongoDB. At most a
+# couple of batches are held in memory. After every batch a checkpoint
+# records the last exported (created_at, id) and how much output is
+# complete, so --resume carries on after an interruption.
+#
+# Orders already moved to ORDER_ARCHIVE_URI are read from its Parquet files
+# first, month by month, then the orders still in MongoDB, oldest first.
+# Don't run the archival job during an export: orders it moves after the
+# archive has been read are in neither.
+
+app = typer.Typer(add_completion=False)
+
+CSV_COLUMNS = [
+    "order_id", "created_at", "user_id", "status", "state", "pincode", "phone", "delivery_address",
+    "menu_item_id", "quantity", "unit_price", "subtotal", "courier_charges", "total_amount",
+]
+
+Position = Tuple[datetime, str]
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+    parquet = "parquet"
+
+
+def _rupees(paise: int) -> str:
+    return f"{paise // 100}.{paise % 100:02d}"
+
+
+def orders_filter(start: Optional[datetime], end: Optional[datetime], state: Optional[str],
+                  status: Optional[str], pincodes: List[str]) -> dict:
+    query = {}
+    if start or end:
+        query["created_at"] = {}
+        if start:
+            query["created_at"]["$gte"] = start
+        if end:
+            query["created_at"]["$lt"] = end
+    if state:
+        # States are stored as entered at checkout; match every spelling of the same state
+        query["state"] = {"$regex": state_pattern(state), "$options": "i"}
+    if status:
+        query["status"] = status
+    if pincodes:
+        query["pincode"] = {"$in": pincodes}
+    return query
+
+
+def archived_orders_filter(state: Optional[str], status: Optional[str], pincodes: List[str]) -> Callable[[dict], bool]:
+    """The filters of ``orders_filter`` but dates, for orders read from the archive."""
+    state = canonical_state(state) if state else None
+
+    def keep(order: dict) -> bool:
+        return ((state is None or canonical_state(order.get("state")) == state)
+                and (not status or order.get("status") == status)
+                and (not pincodes or order.get("pincode") in pincodes))
+
+    return keep
+
+
+def _after(query: dict, position: Optional[Position]) -> dict:
+    if position is None:
+        return query
+    created_at, order_id = position
+    return {"$and": [query, {"$or": [
+        {"created_at": {"$gt": created_at}},
+        {"created_at": created_at, "id": {"$gt": order_id}},
+    ]}]}
+
+
+class _CsvWriter:
+    def __init__(self, path: Path, offset: int):
+        self.file = _open_at(path, offset)
+        self.offset = offset
+
+    def write(self, orders: List[dict]) -> int:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if self.offset == 0:
+            writer.writerow(CSV_COLUMNS)
+        for order in orders:
+            order = upgrade_order(order)
+            for menu_item_id, (quantity, price) in order["items"].items():
+                writer.writerow([
+                    order["id"], order["created_at"].isoformat(), order["user_id"], order.get("status"),
+                    order.get("state"), order.get("pincode"), order.get("phone"), order.get("delivery_address"),
+                    menu_item_id, quantity, _rupees(price), _rupees(order["subtotal"]),
+                    _rupees(order["courier_charges"]), _rupees(order["total_amount"]),
+                ])
+        return self._append(buffer.getvalue().encode())
+
+    def _append(self, data: bytes) -> int:
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.offset += len(data)
+        return len(data)
+
+    def state(self) -> dict:
+        return {"bytes": self.offset}
+
+    def close(self):
+        self.file.close()
+
+
+class _NdjsonWriter(_CsvWriter):
+    def write(self, orders: List[dict]) -> int:
+        return self._append(b"".join(dumps(order_view(order)) + b"\n" for order in orders))
+
+
+class _ParquetWriter:
+    def __init__(self, directory: Path, parts: int):
+        directory.mkdir(parents=True, exist_ok=True)
+        # Drop parts after the checkpoint, or every part when starting over
+        for stale in directory.glob("part-*.parquet"):
+            if int(stale.stem.split("-")[1]) >= parts:
+                stale.unlink()
+        self.directory = directory
+        self.parts = parts
+
+    def write(self, orders: List[dict]) -> int:
+        path = self.directory / f"part-{self.parts:05d}.parquet"
+        table = pa.Table.from_pylist([order_row(order) for order in orders], schema=ARCHIVE_SCHEMA)
+        pq.write_table(table, path, compression="zstd")
+        self.parts += 1
+        return path.stat().st_size
+
+    def state(self) -> dict:
+        return {"parts": self.parts}
+
+    def close(self):
+        pass
+
+
+def _open_at(path: Path, offset: int):
+    """Open ``path`` for appending after the first ``offset`` bytes, dropping any partial tail."""
+    if offset == 0:
+        return open(path, "wb")
+    file = open(path, "r+b")
+    file.truncate(offset)
+    file.seek(offset)
+    return file
+
+
+def _checkpoint_path(output: Path) -> Path:
+    return output.with_name(output.name + ".checkpoint")
+
+
+def _save_checkpoint(path: Path, checkpoint: dict):
+    temporary = path.with_name(path.name + ".tmp")
+    temporary.write_text(json.dumps(checkpoint))
+    os.replace(temporary, path)
+
+
+async def _archived_batches(archive: OrderArchive, db, start: Optional[date], end: Optional[date],
+                            keep: Callable[[dict], bool], batch_size: int, skip: int) -> AsyncIterator[Tuple[dict, List[dict]]]:
+    scanned = 0
+    async for batch in archive.scan(db, start, end, batch_size):
+        scanned += 1
+        if scanned > skip:
+            # Batches left empty by the filters still advance the checkpoint
+            yield {"archived_batches": scanned}, [order for order in batch if keep(order)]
+
+
+async def _hot_batches(cursor, batch_size: int) -> AsyncIterator[Tuple[dict, List[dict]]]:
+    batch = []
+    async for order in cursor:
+        batch.append(order)
+        if len(batch) >= batch_size:
+            yield {"position": [order["created_at"].isoformat(), order["id"]]}, batch
+            batch = []
+    if batch:
+        yield {"position": [batch[-1]["created_at"].isoformat(), batch[-1]["id"]]}, batch
+
+
+async def _read_batches(sources: List[AsyncIterator[Tuple[dict, List[dict]]]], queue: asyncio.Queue):
+    try:
+        for source in sources:
+            async for progress, batch in source:
+                await queue.put((progress, batch))
+    finally:
+        # Also on failure, so the writer stops waiting; awaiting this task re-raises the error
+        await queue.put(None)
+
+
+async def export_orders(db, output: Path, export_format: ExportFormat, query: dict, batch_size: int,
+                        resume: bool, force: bool, archive: Optional[OrderArchive] = None,
+                        start: Optional[date] = None, end: Optional[date] = None,
+                        keep: Callable[[dict], bool] = lambda order: True) -> int:
+    """Export the orders matching ``query``. With ``archive``, the archived orders created in
+    [start, end) that ``keep`` accepts are exported first. Returns the number of orders exported."""
+    checkpoint_path = _checkpoint_path(output)
+    fingerprint = hashlib.sha256(json.dumps(
+        [export_format.value, query, archive.uri if archive else None], sort_keys=True, default=str,
+    ).encode()).hexdigest()
+    checkpoint = {"fingerprint": fingerprint, "archived_batches": 0, "position": None, "rows": 0, "bytes": 0, "parts": 0}
+    if resume:
+        if not checkpoint_path.exists():
+            raise typer.BadParameter(f"No checkpoint at {checkpoint_path}", param_hint="--resume")
+        checkpoint = json.loads(checkpoint_path.read_text())
+        if checkpoint["fingerprint"] != fingerprint:
+            raise typer.BadParameter("The checkpoint was written for a different format or filters", param_hint="--resume")
+    elif output.exists() and not force:
+        raise typer.BadParameter(f"{output} exists; pass --resume to continue it or --force to overwrite it")
+
+    position = None
+    if checkpoint["position"]:
+        position = (datetime.fromisoformat(checkpoint["position"][0]), checkpoint["position"][1])
+    if export_format is ExportFormat.parquet:
+        writer = _ParquetWriter(output, checkpoint["parts"])
+    elif export_format is ExportFormat.csv:
+        writer = _CsvWriter(output, checkpoint["bytes"])
+    else:
+        writer = _NdjsonWriter(output, checkpoint["bytes"])
+
+    sources = []
+    if archive is not None and position is None:
+        sources.append(_archived_batches(archive, db, start, end, keep, batch_size, checkpoint["archived_batches"]))
+    cursor = db.orders.find(_after(query, position), {"_id": 0}).sort(
+        [("created_at", 1), ("id", 1)]
+    ).batch_size(batch_size)
+    sources.append(_hot_batches(cursor, batch_size))
+    # At most one batch waits here while another is encoded and the next is read
+    queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+    reader = asyncio.create_task(_read_batches(sources, queue))
+
+    started = time.monotonic()
+    rows = written = 0
+    try:
+        while (item := await queue.get()) is not None:
+            progress, batch = item
+            if batch:
+                written += await asyncio.to_thread(writer.write, batch)
+            rows += len(batch)
+            checkpoint.update(writer.state())
+            checkpoint.update(progress)
+            checkpoint["rows"] += len(batch)
+            _save_checkpoint(checkpoint_path, checkpoint)
+            if not batch:
+                continue
+            last = batch[-1]
+
+            elapsed = max(time.monotonic() - started, 1e-9)
+            typer.echo(
+                f"\r{checkpoint['rows']:,} orders  {rows / elapsed:,.0f} orders/s  "
+                f"{written / elapsed / 1e6:.1f} MB/s  up to {last['created_at']:%Y-%m-%d}",
+                err=True, nl=False,
+            )
+        await reader
+    finally:
+        reader.cancel()
+        writer.close()
+    typer.echo("", err=True)
+
+    checkpoint_path.unlink(missing_ok=True)
+    return checkpoint["rows"]
+
+
+@app.command()
+def main(
+    output: Path = typer.Argument(..., help="File to write (a directory for parquet)"),
+    export_format: Optional[ExportFormat] = typer.Option(
+        None, "--format", help="Output format; defaults to the output's extension"
+    ),
+    start: Optional[datetime] = typer.Option(None, formats=["%Y-%m-%d"], help="First day to include"),
+    end: Optional[datetime] = typer.Option(None, formats=["%Y-%m-%d"], help="Day after the last day to include"),
+    state: Optional[str] = typer.Option(None, help="Delivery state; any spelling, e.g. AP or Andhra"),
+    status: Optional[str] = typer.Option(None, help="Order status"),
+    pincode: List[str] = typer.Option([], help="Delivery pincode; repeat for several"),
+    batch_size: int = typer.Option(2000, min=1),
+    resume: bool = typer.Option(False, help="Continue from the checkpoint left by an interrupted export"),
+    force: bool = typer.Option(False, help="Overwrite an existing output"),
+):
+    """Stream orders from MongoDB to CSV, NDJSON or Parquet."""
+    if export_format is None:
+        try:
+            export_format = ExportFormat(output.suffix.lstrip(".").lower() or "parquet")
+        except ValueError:
+            raise typer.BadParameter(f"Cannot infer a format from {output.name}", param_hint="--format")
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    async def run():
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        # Exports are reporting reads and may be served by a secondary
+        db = client.get_database(os.environ['DB_NAME'], read_preference=read_preference(
+            os.environ.get('MONGO_REPORTING_READ_PREFERENCE', 'secondaryPreferred'),
+            int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', '-1')),
+        ))
+        archive = None
+        if os.environ.get('ORDER_ARCHIVE_URI'):
+            archive = OrderArchive(os.environ['ORDER_ARCHIVE_URI'])
+        try:
+            query = orders_filter(start, end, state, status, pincode)
+            return await export_orders(
+                db, output, export_format, query, batch_size, resume, force, archive,
+                start.date() if start else None, end.date() if end else None,
+                archived_orders_filter(state, status, pincode),
+            )
+        finally:
+            client.close()
+
+    exported = asyncio.run(run())
+    typer.echo(f"Exported {exported:,} orders to {output}", err=True)
+
+
+if __name__ == "__main__":
+    app()
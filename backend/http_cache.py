@@ -0,0 +1,18 @@
+import hashlib
+from typing import Optional
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def version_etag(*parts) -> str:
+    """Weak ETag derived from version stamps rather than the response body."""
+    return "W/" + etag_for(":".join(str(part) for part in parts).encode())
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if not if_none_match or not etag:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
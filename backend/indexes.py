@@ -0,0 +1,176 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, List
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Every index the application relies on, keyed by collection.
+# Names are explicit so verification can compare against what exists.
+INDEX_SPECS: Dict[str, List[IndexModel]] = {
+    "sessions": [
+        IndexModel([("session_token", ASCENDING)], name="session_token_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    # Only needed until every worker's cache entry for the token has expired
+    "session_revocations": [
+        IndexModel([("session_token", ASCENDING)], name="session_token_unique", unique=True),
+        IndexModel([("revoked_at", ASCENDING)], name="revoked_at_ttl", expireAfterSeconds=60 * 60),
+    ],
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "carts": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="user_id_created_at_id",
+        ),
+        # Archival and exports walk orders oldest first
+        IndexModel([("created_at", ASCENDING), ("id", ASCENDING)], name="created_at_id"),
+    ],
+    "orders_archive": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="user_id_created_at_id",
+        ),
+        IndexModel([("file", ASCENDING)], name="file"),
+        IndexModel([("pending", ASCENDING)], name="pending", partialFilterExpression={"pending": True}),
+    ],
+    "order_archive_files": [
+        IndexModel([("path", ASCENDING)], name="path_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("month", ASCENDING)], name="status_month"),
+    ],
+    "outbox": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="status_available_at"),
+        IndexModel(
+            [("processed_at", ASCENDING)],
+            name="processed_at_ttl",
+            expireAfterSeconds=7 * 24 * 60 * 60,
+            partialFilterExpression={"status": "done"},
+        ),
+    ],
+    "sales_daily": [
+        IndexModel(
+            [("day", ASCENDING), ("menu_item_id", ASCENDING), ("state", ASCENDING)],
+            name="day_menu_item_id_state_unique",
+            unique=True,
+        ),
+    ],
+    "stock": [
+        IndexModel([("menu_item_id", ASCENDING), ("shard", ASCENDING)], name="menu_item_id_shard_unique", unique=True),
+    ],
+    "stock_reservations": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at"),
+    ],
+    "idempotency_keys": [
+        IndexModel([("user_id", ASCENDING), ("key", ASCENDING)], name="user_id_key_unique", unique=True),
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=24 * 60 * 60),
+    ],
+}
+
+# Indexes an earlier release created and a wider one in INDEX_SPECS has
+# replaced. Every index costs each write, so ensure_indexes drops these
+# once their replacement exists.
+SUPERSEDED_INDEXES: Dict[str, List[str]] = {
+    "orders": ["user_id_created_at", "created_at"],
+}
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """Create any missing indexes and drop superseded ones. Safe to run on every startup."""
+    created = {}
+    for collection, models in INDEX_SPECS.items():
+        try:
+            created[collection] = await db[collection].create_indexes(models)
+        except OperationFailure as e:
+            # Conflicting options or duplicate data; keep serving and surface it
+            logger.error("Index bootstrap failed for %s: %s", collection, e)
+            created[collection] = []
+            continue
+        await _drop_superseded(db, collection)
+    return created
+
+
+async def _drop_superseded(db, collection: str):
+    existing = set()
+    async for index in db[collection].list_indexes():
+        existing.add(index["name"])
+    for name in SUPERSEDED_INDEXES.get(collection, []):
+        if name not in existing:
+            continue
+        try:
+            await db[collection].drop_index(name)
+            logger.info("Dropped superseded index %s.%s", collection, name)
+        except OperationFailure as e:
+            logger.error("Could not drop superseded index %s.%s: %s", collection, name, e)
+
+
+async def warm_indexes(db):
+    """Run one cheap query per hot index so its pages are resident before traffic arrives."""
+    await asyncio.gather(
+        db.sessions.find_one({"session_token": ""}),
+        db.users.find_one({"id": ""}),
+        db.users.find_one({"email": ""}),
+        db.carts.find_one({"user_id": ""}),
+        db.orders.find_one({"user_id": ""}, sort=[("created_at", DESCENDING), ("id", DESCENDING)]),
+    )
+
+
+async def verify_indexes(db) -> Dict[str, dict]:
+    """Report indexes that are missing, unexpected, or never used since the last restart."""
+    report = {}
+    for collection, models in INDEX_SPECS.items():
+        expected = {model.document["name"] for model in models}
+        existing = set()
+        async for index in db[collection].list_indexes():
+            existing.add(index["name"])
+
+        unused = []
+        try:
+            async for stats in db[collection].aggregate([{"$indexStats": {}}]):
+                if stats["name"] != "_id_" and stats["accesses"]["ops"] == 0:
+                    unused.append(stats["name"])
+        except OperationFailure as e:
+            logger.warning("$indexStats unavailable for %s: %s", collection, e)
+
+        report[collection] = {
+            "missing": sorted(expected - existing),
+            "unexpected": sorted(existing - expected - {"_id_"}),
+            "superseded": sorted(existing & set(SUPERSEDED_INDEXES.get(collection, []))),
+            "unused": sorted(unused),
+        }
+    return report
+
+
+async def _main(verify: bool):
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        result = await verify_indexes(db) if verify else await ensure_indexes(db)
+        print(json.dumps(result, indent=2))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or verify MongoDB indexes")
+    parser.add_argument("--verify", action="store_true", help="report missing, superseded and unused indexes instead of creating them")
+    args = parser.parse_args()
+    asyncio.run(_main(args.verify))
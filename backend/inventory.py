@@ -0,0 +1,277 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# Stock per menu item in whole kg, for items with documents in the stock
+# collection; items without any are not limited. An item's stock is split
+# over one or more shard documents {menu_item_id, shard, available_kg}, and
+# a checkout decrements a random shard, so concurrent checkouts of a hot
+# item rarely update the same document.
+#
+# Stock is taken when a shopper reserves it from the checkout page, or at
+# the latest when the order is placed. A reservation is one document per
+# user in stock_reservations; placing the order deletes it, and expired
+# ones are deleted and their stock returned by the sweeper. A reservation
+# is always deleted before its stock is returned, so a crash in between
+# can only undercount stock, never oversell it.
+#
+# The totals shown with carts come from a snapshot refreshed in the
+# background, not from the counters.
+
+
+class OutOfStock(Exception):
+    def __init__(self, menu_item_id: str, available_kg: int):
+        super().__init__(f"Only {available_kg} kg of {menu_item_id} left")
+        self.menu_item_id = menu_item_id
+        self.available_kg = available_kg
+
+
+class ReservationLost(Exception):
+    def __init__(self):
+        super().__init__("Stock reservation expired or changed; please try again")
+
+
+@dataclass
+class Reservation:
+    user_id: str
+    items: Dict[str, int] = field(default_factory=dict)
+    version: Optional[int] = None  # None when nothing is held
+    expires_at: Optional[datetime] = None
+
+
+class Inventory:
+    """Sharded stock counters, per-user checkout reservations and an availability snapshot."""
+
+    def __init__(self, reservation_ttl_seconds: float = 600.0):
+        self.reservation_ttl = timedelta(seconds=reservation_ttl_seconds)
+        self.db = None
+        self.available: Dict[str, int] = {}
+        self.shards: Dict[str, int] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, db, interval_seconds: float):
+        """Bind to ``db`` and refresh the snapshot and expire reservations every ``interval_seconds``."""
+        self.db = db
+        if interval_seconds > 0:
+            self._task = asyncio.create_task(self._watch(interval_seconds))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _watch(self, interval_seconds: float):
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                expired = await self.expire_reservations()
+                if expired:
+                    logger.info("Returned stock from %d expired reservations", expired)
+                await self.refresh()
+            except Exception:
+                logger.exception("Inventory refresh failed; keeping previous snapshot")
+
+    async def refresh(self):
+        totals = await self.db.stock.aggregate([
+            {"$group": {"_id": "$menu_item_id", "available_kg": {"$sum": "$available_kg"}, "shards": {"$sum": 1}}},
+        ]).to_list(None)
+        # Assign the snapshot fields together; there is no await in between
+        self.available = {total["_id"]: total["available_kg"] for total in totals}
+        self.shards = {total["_id"]: total["shards"] for total in totals}
+
+    def stock_stamp(self, menu_item_ids: Iterable[str]) -> str:
+        """The snapshot's stock of just these items, for versioning responses that show it."""
+        return ",".join(f"{item}={self.available[item]}" for item in sorted(menu_item_ids) if item in self.available)
+
+    # Counters
+
+    async def _decrement(self, menu_item_id: str, shard: int, kg: int) -> bool:
+        result = await self.db.stock.update_one(
+            {"menu_item_id": menu_item_id, "shard": shard, "available_kg": {"$gte": kg}},
+            {"$inc": {"available_kg": -kg}},
+        )
+        return result.modified_count == 1
+
+    async def _take(self, menu_item_id: str, kg: int):
+        # Usually the whole quantity comes from one random shard
+        if await self._decrement(menu_item_id, random.randrange(self.shards.get(menu_item_id, 1)), kg):
+            return
+        # Otherwise gather it from the fullest shards, or put back what was taken
+        shards = await self.db.stock.find(
+            {"menu_item_id": menu_item_id, "available_kg": {"$gt": 0}}, {"_id": 0, "shard": 1, "available_kg": 1}
+        ).sort("available_kg", -1).to_list(None)
+        taken = []
+        remaining = kg
+        for shard in shards:
+            part = min(remaining, shard["available_kg"])
+            if await self._decrement(menu_item_id, shard["shard"], part):
+                taken.append((shard["shard"], part))
+                remaining -= part
+                if remaining == 0:
+                    return
+        for shard, part in taken:
+            await self.db.stock.update_one({"menu_item_id": menu_item_id, "shard": shard}, {"$inc": {"available_kg": part}})
+        raise OutOfStock(menu_item_id, sum(shard["available_kg"] for shard in shards))
+
+    async def _give_back(self, items: Dict[str, int]):
+        for menu_item_id, kg in items.items():
+            if kg > 0:
+                await self.db.stock.update_one(
+                    {"menu_item_id": menu_item_id, "shard": random.randrange(self.shards.get(menu_item_id, 1))},
+                    {"$inc": {"available_kg": kg}},
+                    upsert=True,
+                )
+
+    async def adjust(self, menu_item_id: str, kg: int, shards: int = 1):
+        """Add (or with a negative ``kg``, remove) stock, spread evenly over ``shards`` shards."""
+        current = await self.db.stock.count_documents({"menu_item_id": menu_item_id})
+        self.shards[menu_item_id] = shards = max(shards, current, 1)
+        if kg < 0:
+            await self._take(menu_item_id, -kg)
+            return
+        for shard in range(shards):
+            await self.db.stock.update_one(
+                {"menu_item_id": menu_item_id, "shard": shard},
+                {"$inc": {"available_kg": kg // shards + (1 if shard < kg % shards else 0)}},
+                upsert=True,
+            )
+
+    # Reservations
+
+    async def reserve(self, user_id: str, quantities: Dict[str, int], attempts: int = 3) -> Reservation:
+        """Hold exactly ``quantities`` kg for ``user_id``, taking or returning the difference from any current hold.
+
+        Raises OutOfStock when an item cannot be covered; the previous hold is kept.
+        """
+        quantities = {item: kg for item, kg in quantities.items() if item in self.shards and kg > 0}
+        for _ in range(attempts):
+            existing = await self.db.stock_reservations.find_one({"user_id": user_id})
+            if existing is not None and existing["expires_at"] <= datetime.utcnow():
+                await self._expire(existing)
+                existing = None
+            held = existing["items"] if existing else {}
+            if not quantities and not held:
+                return Reservation(user_id)
+
+            taken: Dict[str, int] = {}
+            try:
+                for item, kg in quantities.items():
+                    if kg > held.get(item, 0):
+                        await self._take(item, kg - held.get(item, 0))
+                        taken[item] = kg - held.get(item, 0)
+            except OutOfStock:
+                await self._give_back(taken)
+                raise
+
+            now = datetime.utcnow()
+            expires_at = now + self.reservation_ttl
+            if existing is None:
+                version = 1
+                try:
+                    await self.db.stock_reservations.insert_one({
+                        "user_id": user_id, "items": quantities, "version": version,
+                        "expires_at": expires_at, "updated_at": now,
+                    })
+                    written = True
+                except DuplicateKeyError:
+                    written = False
+            else:
+                version = existing["version"] + 1
+                result = await self.db.stock_reservations.update_one(
+                    {"user_id": user_id, "version": existing["version"]},
+                    {"$set": {"items": quantities, "version": version, "expires_at": expires_at, "updated_at": now}},
+                )
+                written = result.modified_count == 1
+            if not written:
+                # A concurrent reserve or the sweeper got there first
+                await self._give_back(taken)
+                continue
+
+            await self._give_back({item: kg - quantities.get(item, 0) for item, kg in held.items()})
+            return Reservation(user_id, quantities, version, expires_at)
+        raise ReservationLost()
+
+    async def consume(self, reservation: Reservation, session=None):
+        """Turn a reservation into a sale: its stock is never returned. Raises ReservationLost if it is gone."""
+        if reservation.version is None:
+            return
+        result = await self.db.stock_reservations.delete_one(
+            {"user_id": reservation.user_id, "version": reservation.version, "expires_at": {"$gt": datetime.utcnow()}},
+            session=session,
+        )
+        if result.deleted_count != 1:
+            raise ReservationLost()
+
+    async def restock(self, reservation: Reservation):
+        """Return the stock of a consumed reservation whose order was not placed after all."""
+        await self._give_back(reservation.items)
+
+    async def release(self, user_id: str):
+        reservation = await self.db.stock_reservations.find_one_and_delete({"user_id": user_id})
+        if reservation is not None:
+            await self._give_back(reservation["items"])
+
+    async def _expire(self, reservation: dict) -> bool:
+        claimed = await self.db.stock_reservations.find_one_and_delete(
+            {"_id": reservation["_id"], "version": reservation["version"], "expires_at": {"$lte": datetime.utcnow()}}
+        )
+        if claimed is None:
+            return False
+        await self._give_back(claimed["items"])
+        return True
+
+    async def expire_reservations(self, limit: int = 1000) -> int:
+        expired = 0
+        for reservation in await self.db.stock_reservations.find(
+            {"expires_at": {"$lte": datetime.utcnow()}}
+        ).to_list(limit):
+            expired += await self._expire(reservation)
+        return expired
+
+    def stats(self) -> dict:
+        return {"tracked_items": len(self.shards), "available_kg": dict(self.available)}
+
+
+async def _main(command: str, menu_item_id: Optional[str], kg: int, shards: int):
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    inventory = Inventory()
+    inventory.start(client[os.environ['DB_NAME']], 0)
+    try:
+        await inventory.refresh()
+        if command == "add":
+            await inventory.adjust(menu_item_id, kg, shards)
+        elif command == "set":
+            await inventory.adjust(menu_item_id, kg - inventory.available.get(menu_item_id, 0), shards)
+        elif command == "untrack":
+            await inventory.db.stock.delete_many({"menu_item_id": menu_item_id})
+        await inventory.refresh()
+        for item, available in sorted(inventory.available.items()):
+            print(f"{item:<24}{available:>8} kg  ({inventory.shards[item]} shards)")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show or change per-item stock in kg")
+    parser.add_argument("command", choices=["show", "add", "set", "untrack"])
+    parser.add_argument("menu_item_id", nargs="?")
+    parser.add_argument("kg", nargs="?", type=int, default=0)
+    parser.add_argument("--shards", type=int, default=1, help="counter documents for the item; use more for hot items")
+    args = parser.parse_args()
+    if args.command != "show" and not args.menu_item_id:
+        parser.error(f"{args.command} needs a menu item id")
+    asyncio.run(_main(args.command, args.menu_item_id, args.kg, args.shards))
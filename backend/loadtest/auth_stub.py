@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Local stand-in for the external auth provider's session-data endpoint.
+
+Start it, then point the backend at it:
+
+    python loadtest/auth_stub.py --port 8099
+    AUTH_SESSION_DATA_URL=http://127.0.0.1:8099/session-data uvicorn server:app --port 8001
+"""
+import argparse
+import asyncio
+
+import uvicorn
+from fastapi import FastAPI, Header, HTTPException
+
+app = FastAPI()
+app.state.latency_seconds = 0.0
+
+
+@app.get("/session-data")
+async def session_data(x_session_id: str = Header(None)):
+    if not x_session_id:
+        raise HTTPException(status_code=401, detail="Missing session id")
+    if app.state.latency_seconds:
+        await asyncio.sleep(app.state.latency_seconds)
+    return {
+        "email": f"{x_session_id}@loadtest.local",
+        "name": f"Load Test {x_session_id}",
+        "picture": None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub auth provider for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="artificial upstream latency")
+    args = parser.parse_args()
+    app.state.latency_seconds = args.latency_ms / 1000
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
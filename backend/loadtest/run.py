@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Replay shopper flows against a running backend and report latency percentiles.
+
+Each virtual user logs in once through the stub auth provider
+(loadtest/auth_stub.py), then repeats menu -> add to cart -> cart ->
+checkout -> orders until the run ends. Results are printed as a table and
+optionally written as JSON so runs can be compared across releases:
+
+    python loadtest/run.py --base-url http://127.0.0.1:8001 --concurrency 50 \\
+        --duration 60 --label v1.4.0 --output results/v1.4.0.json
+
+Every virtual user has its own session, so each gets its own rate limit
+bucket (RATE_LIMIT_RPS / RATE_LIMIT_BURST, default 5 / 20 per user). A
+user loops faster than 5 writes a second against a quick backend, so
+start the backend with RATE_LIMIT_RPS=0 to measure capacity; keep the
+defaults to see how admission control behaves, with 429s counted as
+errors. Load shedding (SHED_LOOP_LAG_MS, SHED_DB_POOL_WAITERS) stays on
+either way and shows up as 503s.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import subprocess
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+MENU_ITEM_IDS = ["chicken", "chicken_boneless", "prawns_small", "prawns_big", "mutton"]
+STATES = ["andhra pradesh", "telangana", "other"]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+
+    async def request(self, client: httpx.AsyncClient, label: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.latencies[label].append((time.perf_counter() - start) * 1000)
+            self.errors[label] += 1
+            return None
+        self.latencies[label].append((time.perf_counter() - start) * 1000)
+        self.statuses[label][response.status_code] += 1
+        if response.status_code >= 400:
+            self.errors[label] += 1
+        return response
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(values: List[float], errors: int, elapsed: float) -> dict:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "errors": errors,
+        "rps": len(values) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(values) / len(values) if values else 0.0,
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": values[-1] if values else 0.0,
+    }
+
+
+async def shopper(client: httpx.AsyncClient, recorder: Recorder, run_id: str, number: int, deadline: float,
+                  max_iterations: Optional[int]):
+    response = await recorder.request(
+        client, "POST /auth/login", "POST", "/api/auth/login",
+        json={"session_id": f"{run_id}-{number}"},
+    )
+    if response is None or response.status_code != 200:
+        return
+    headers = {"Authorization": response.json()["session_token"]}
+
+    iteration = 0
+    while time.perf_counter() < deadline and (max_iterations is None or iteration < max_iterations):
+        iteration += 1
+        await recorder.request(client, "GET /menu", "GET", "/api/menu")
+        for menu_item_id in random.sample(MENU_ITEM_IDS, random.randint(1, 3)):
+            await recorder.request(
+                client, "POST /cart/add", "POST", "/api/cart/add", headers=headers,
+                json={"menu_item_id": menu_item_id, "quantity": random.randint(1, 2)},
+            )
+        await recorder.request(client, "GET /cart", "GET", "/api/cart", headers=headers)
+        await recorder.request(
+            client, "POST /orders", "POST", "/api/orders",
+            headers={**headers, "Idempotency-Key": str(uuid.uuid4())},
+            json={
+                "delivery_address": "1-2-3, Load Test Street",
+                "pincode": "534201",
+                "phone": "9000000000",
+                "state": random.choice(STATES),
+            },
+        )
+        await recorder.request(client, "GET /orders", "GET", "/api/orders", headers=headers)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    recorder = Recorder()
+    run_id = f"loadtest-{uuid.uuid4().hex[:8]}"
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        started_at = datetime.utcnow()
+        start = time.perf_counter()
+        deadline = start + args.duration
+        shoppers = []
+        for number in range(args.concurrency):
+            shoppers.append(asyncio.create_task(
+                shopper(client, recorder, run_id, number, deadline, args.iterations)
+            ))
+            if args.ramp_up:
+                await asyncio.sleep(args.ramp_up / args.concurrency)
+        await asyncio.gather(*shoppers)
+        elapsed = time.perf_counter() - start
+
+    all_latencies = [value for values in recorder.latencies.values() for value in values]
+    return {
+        "label": args.label,
+        "revision": git_revision(),
+        "started_at": started_at.isoformat(),
+        "elapsed_s": elapsed,
+        "config": {
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "iterations": args.iterations,
+            "ramp_up_s": args.ramp_up,
+        },
+        "endpoints": {
+            label: {
+                **summarize(values, recorder.errors[label], elapsed),
+                "statuses": {str(code): count for code, count in sorted(recorder.statuses[label].items())},
+            }
+            for label, values in sorted(recorder.latencies.items())
+        },
+        "total": summarize(all_latencies, sum(recorder.errors.values()), elapsed),
+    }
+
+
+def print_report(result: dict):
+    print(f"{'endpoint':<20}{'count':>8}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    rows = list(result["endpoints"].items()) + [("TOTAL", result["total"])]
+    for label, stats in rows:
+        print(f"{label:<20}{stats['count']:>8}{stats['errors']:>8}{stats['rps']:>9.1f}"
+              f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['max_ms']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent shopper-flow load generator")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8001", help="backend root, without /api")
+    parser.add_argument("--concurrency", type=int, default=20, help="number of concurrent shoppers")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to run")
+    parser.add_argument("--iterations", type=int, default=None, help="stop each shopper after N flows")
+    parser.add_argument("--ramp-up", type=float, default=0.0, help="seconds over which shoppers start")
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-request timeout in seconds")
+    parser.add_argument("--label", default=None, help="release or run label stored in the results")
+    parser.add_argument("--output", type=Path, default=None, help="write JSON results to this file")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(result, indent=2))
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import monitoring
+
+# In-process metrics rendered in the Prometheus text format. Recording is a
+# handful of integer updates per request; all formatting happens only when
+# /metrics is scraped.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+DB_CALL_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (f'{key}="{_escape(value)}"' for key, value in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Iterable[float]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            counts[bisect_left(self.buckets, value)] += 1
+            self._sums[key] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(float(bound))))} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, kind: str = "counter"):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self._values: Dict[Labels, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            snapshot = list(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(key)} {value}" for key, value in snapshot)
+        return lines
+
+
+class Gauge(Counter):
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text, kind="gauge")
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+
+class RequestDBStats:
+    __slots__ = ("commands", "seconds", "_lock")
+
+    def __init__(self):
+        self.commands = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self.commands += 1
+            self.seconds += seconds
+
+
+# Set by the middleware for the duration of each request. Motor copies the
+# context into its executor threads, so the command listener sees it too.
+current_db_stats: contextvars.ContextVar[Optional[RequestDBStats]] = contextvars.ContextVar(
+    "current_db_stats", default=None
+)
+
+
+class Metrics:
+    def __init__(self):
+        self.request_seconds = Histogram(
+            "http_request_duration_seconds", "HTTP request latency by route", LATENCY_BUCKETS
+        )
+        self.requests_in_flight = Gauge("http_requests_in_flight", "Requests currently being served")
+        self.requests_in_flight.inc(0)
+        self.db_commands_per_request = Histogram(
+            "http_request_db_commands", "MongoDB commands issued per request", DB_CALL_BUCKETS
+        )
+        self.db_seconds_per_request = Histogram(
+            "http_request_db_seconds", "Time spent in MongoDB commands per request", LATENCY_BUCKETS
+        )
+        self.db_commands = Counter("mongodb_commands_total", "MongoDB commands by name and outcome")
+        self.db_command_seconds = Counter("mongodb_command_seconds_total", "Time spent in MongoDB commands by name")
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        """Register a callable producing extra exposition lines at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in (self.request_seconds, self.requests_in_flight, self.db_commands_per_request,
+                       self.db_seconds_per_request, self.db_commands, self.db_command_seconds):
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, "success")
+
+    def failed(self, event):
+        self._record(event, "failure")
+
+    def _record(self, event, outcome: str):
+        seconds = event.duration_micros / 1e6
+        self.metrics.db_commands.inc(command=event.command_name, outcome=outcome)
+        self.metrics.db_command_seconds.inc(seconds, command=event.command_name)
+        stats = current_db_stats.get()
+        if stats is not None:
+            stats.add(seconds)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests and DB usage per route."""
+
+    def __init__(self, app, metrics: Metrics, on_request: Optional[Callable[[dict, float, RequestDBStats], None]] = None):
+        self.app = app
+        self.metrics = metrics
+        self.on_request = on_request
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        stats = RequestDBStats()
+        token = current_db_stats.set(stats)
+        self.metrics.requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_db_stats.reset(token)
+            self.metrics.requests_in_flight.dec()
+
+            route = scope.get("route")
+            labels = {
+                "method": scope["method"],
+                "route": getattr(route, "path", "unmatched"),
+            }
+            self.metrics.request_seconds.observe(elapsed, status=str(status["code"]), **labels)
+            self.metrics.db_commands_per_request.observe(stats.commands, **labels)
+            self.metrics.db_seconds_per_request.observe(stats.seconds, **labels)
+            if self.on_request is not None:
+                self.on_request(scope, elapsed, stats)
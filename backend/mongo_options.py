@@ -0,0 +1,66 @@
+import importlib.util
+import logging
+from typing import Mapping
+
+from pymongo.read_preferences import (
+    Nearest,
+    Primary,
+    PrimaryPreferred,
+    Secondary,
+    SecondaryPreferred,
+)
+
+logger = logging.getLogger(__name__)
+
+# Wire compressors and the module pymongo needs for each of them
+_COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+# Environment variable -> (MongoClient keyword, type)
+_CLIENT_OPTIONS = {
+    "MONGO_MAX_POOL_SIZE": ("maxPoolSize", int),
+    "MONGO_MIN_POOL_SIZE": ("minPoolSize", int),
+    "MONGO_MAX_IDLE_TIME_MS": ("maxIdleTimeMS", int),
+    "MONGO_MAX_CONNECTING": ("maxConnecting", int),
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": ("waitQueueTimeoutMS", int),
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", int),
+    "MONGO_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", int),
+    "MONGO_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", int),
+    "MONGO_ZLIB_COMPRESSION_LEVEL": ("zlibCompressionLevel", int),
+    "MONGO_REPLICA_SET": ("replicaSet", str),
+}
+
+
+def client_options_from_env(environ: Mapping[str, str]) -> dict:
+    """Keyword arguments for AsyncIOMotorClient built from MONGO_* variables."""
+    options = {}
+    for variable, (option, cast) in _CLIENT_OPTIONS.items():
+        if environ.get(variable):
+            options[option] = cast(environ[variable])
+
+    compressors = []
+    for name in filter(None, (c.strip() for c in environ.get("MONGO_COMPRESSORS", "").split(","))):
+        module = _COMPRESSOR_MODULES.get(name)
+        if module is None:
+            raise ValueError(f"Unknown MongoDB compressor: {name}")
+        if importlib.util.find_spec(module) is None:
+            logger.warning("MongoDB compressor %s requested but %s is not installed; skipping", name, module)
+            continue
+        compressors.append(name)
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+    return options
+
+
+def read_preference(name: str, max_staleness_seconds: int = -1):
+    """Read preference by its connection-string name, e.g. 'secondaryPreferred'."""
+    if name == "primary":
+        return Primary()
+    modes = {
+        "primaryPreferred": PrimaryPreferred,
+        "secondary": Secondary,
+        "secondaryPreferred": SecondaryPreferred,
+        "nearest": Nearest,
+    }
+    if name not in modes:
+        raise ValueError(f"Unknown read preference: {name}")
+    return modes[name](max_staleness=max_staleness_seconds)
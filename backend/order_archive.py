@@ -0,0 +1,248 @@
+import argparse
+import asyncio
+import logging
+import os
+import uuid
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from documents import SCHEMA_VERSION, upgrade_order
+from order_history import ORDER_SORT, keyset_query
+
+logger = logging.getLogger(__name__)
+
+# Cold orders are moved out of the orders collection into zstd-compressed
+# Parquet files, one directory per month, under a local path or an object
+# store URI (e.g. s3://bucket/orders). Each archived order leaves a stub in
+# orders_archive holding its sort keys and file, so order history can page
+# through archived orders on an index and open only the files it needs.
+# order_archive_files lists every file; only "done" files are read.
+
+ARCHIVE_SCHEMA = pa.schema([
+    ("id", pa.string()),
+    ("user_id", pa.string()),
+    ("created_at", pa.timestamp("ms")),
+    ("status", pa.string()),
+    ("subtotal", pa.int64()),
+    ("courier_charges", pa.int64()),
+    ("total_amount", pa.int64()),
+    ("delivery_address", pa.string()),
+    ("pincode", pa.string()),
+    ("phone", pa.string()),
+    ("state", pa.string()),
+    ("items", pa.list_(pa.struct([
+        ("menu_item_id", pa.string()),
+        ("quantity", pa.int64()),
+        ("price", pa.int64()),
+    ]))),
+])
+
+Position = Tuple[datetime, str]
+
+
+def order_row(order: dict) -> dict:
+    order = upgrade_order(order)
+    row = {name: order.get(name) for name in ARCHIVE_SCHEMA.names if name != "items"}
+    row["items"] = [
+        {"menu_item_id": menu_item_id, "quantity": quantity, "price": price}
+        for menu_item_id, (quantity, price) in order["items"].items()
+    ]
+    return row
+
+
+def order_from_row(row: dict) -> dict:
+    """A stored (schema v2) order document from an archive row."""
+    order = {key: value for key, value in row.items() if key != "items"}
+    order["v"] = SCHEMA_VERSION
+    order["items"] = {item["menu_item_id"]: [item["quantity"], item["price"]] for item in row["items"]}
+    return order
+
+
+class OrderArchive:
+    def __init__(self, uri: str, compression: str = "zstd"):
+        self.uri = uri
+        self.filesystem, self.base_path = pafs.FileSystem.from_uri(uri)
+        self.compression = compression
+
+    # Archival job
+
+    async def archive(self, db, older_than: datetime, batch_size: int = 5000) -> int:
+        """Move orders created before ``older_than`` into the archive. Resumes interrupted runs."""
+        await self._recover(db)
+        archived = 0
+        while True:
+            batch = await db.orders.find(
+                {"created_at": {"$lt": older_than}}, {"_id": 0}
+            ).sort([("created_at", 1), ("id", 1)]).limit(batch_size).to_list(batch_size)
+            if not batch:
+                return archived
+
+            months: Dict[str, List[dict]] = {}
+            for order in batch:
+                months.setdefault(order["created_at"].strftime("%Y-%m"), []).append(order_row(order))
+            for month, rows in months.items():
+                await self._archive_file(db, month, rows)
+            await self._finish_pending(db)
+
+            archived += len(batch)
+            logger.info("Archived %d orders (up to %s)", archived, batch[-1]["created_at"].isoformat())
+
+    async def _archive_file(self, db, month: str, rows: List[dict]):
+        # Each step is undone or completed by _recover if the job dies after it:
+        # the file is listed before it is written, its stubs stay hidden
+        # ("pending") until the hot orders are deleted
+        path = f"month={month}/part-{uuid.uuid4().hex}.parquet"
+        await db.order_archive_files.insert_one({
+            "path": path, "month": month, "rows": len(rows), "status": "writing", "created_at": datetime.utcnow(),
+        })
+        await asyncio.to_thread(self._write, path, rows)
+        await db.orders_archive.bulk_write([
+            UpdateOne(
+                {"id": row["id"]},
+                {"$set": {
+                    "user_id": row["user_id"], "created_at": row["created_at"], "file": path, "pending": True,
+                }},
+                upsert=True,
+            )
+            for row in rows
+        ], ordered=False)
+        await db.order_archive_files.update_one({"path": path}, {"$set": {"status": "done"}})
+
+    async def _finish_pending(self, db, chunk_size: int = 5000):
+        while True:
+            stubs = await db.orders_archive.find({"pending": True}, {"_id": 0, "id": 1}).to_list(chunk_size)
+            if not stubs:
+                return
+            ids = [stub["id"] for stub in stubs]
+            await db.orders.delete_many({"id": {"$in": ids}})
+            await db.orders_archive.update_many({"id": {"$in": ids}}, {"$unset": {"pending": ""}})
+
+    async def _recover(self, db):
+        """Discard files whose run died before they were complete, then finish the rest."""
+        async for listed in db.order_archive_files.find({"status": "writing"}):
+            # Their orders are all still in the hot collection
+            await db.orders_archive.delete_many({"file": listed["path"], "pending": True})
+            await asyncio.to_thread(self._delete, listed["path"])
+            await db.order_archive_files.delete_one({"_id": listed["_id"]})
+            logger.warning("Discarded incomplete archive file %s", listed["path"])
+        await self._finish_pending(db)
+
+    def _write(self, path: str, rows: List[dict]):
+        directory = f"{self.base_path}/{path.rsplit('/', 1)[0]}"
+        self.filesystem.create_dir(directory, recursive=True)
+        table = pa.Table.from_pylist(rows, schema=ARCHIVE_SCHEMA)
+        pq.write_table(table, f"{self.base_path}/{path}", filesystem=self.filesystem, compression=self.compression)
+
+    def _delete(self, path: str):
+        try:
+            self.filesystem.delete_file(f"{self.base_path}/{path}")
+        except FileNotFoundError:
+            pass
+
+    # Reads
+
+    async def fetch(self, db, user_id: str, limit: int, position: Optional[Position] = None,
+                    session=None) -> Tuple[List[dict], Optional[Position]]:
+        """Up to ``limit`` archived orders after ``position``, newest first, and the position of the last stub."""
+        stubs = await db.orders_archive.find(
+            {**keyset_query(user_id, position), "pending": {"$exists": False}},
+            {"_id": 0, "id": 1, "created_at": 1, "file": 1},
+            session=session,
+        ).sort(ORDER_SORT).limit(limit).to_list(limit)
+        if not stubs:
+            return [], None
+
+        ids_by_file: Dict[str, List[str]] = {}
+        for stub in stubs:
+            ids_by_file.setdefault(stub["file"], []).append(stub["id"])
+        files = await asyncio.gather(*(asyncio.to_thread(self._read, path, ids) for path, ids in ids_by_file.items()))
+        orders = {order["id"]: order for rows in files for order in rows}
+        return (
+            [orders[stub["id"]] for stub in stubs if stub["id"] in orders],
+            (stubs[-1]["created_at"], stubs[-1]["id"]),
+        )
+
+    async def iter_orders(self, db, user_id: str, position: Optional[Position] = None,
+                          batch_size: int = 500) -> AsyncIterator[dict]:
+        while True:
+            orders, position = await self.fetch(db, user_id, batch_size, position)
+            for order in orders:
+                yield order
+            if position is None:
+                return
+
+    async def scan(self, db, start: Optional[date] = None, end: Optional[date] = None,
+                   batch_size: int = 5000) -> AsyncIterator[List[dict]]:
+        """Archived orders created in [start, end), in batches, month by month but unordered within a month."""
+        query = {"status": "done"}
+        if start or end:
+            query["month"] = {}
+            if start:
+                query["month"]["$gte"] = start.strftime("%Y-%m")
+            if end:
+                query["month"]["$lte"] = end.strftime("%Y-%m")
+        paths = [listed["path"] async for listed in db.order_archive_files.find(query, {"path": 1}).sort("path", 1)]
+        if not paths:
+            return
+
+        batches = self._scan_batches(paths, start, end, batch_size)
+        while True:
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                return
+            yield batch
+
+    def _scan_batches(self, paths: List[str], start: Optional[date], end: Optional[date],
+                      batch_size: int) -> Iterator[List[dict]]:
+        dataset = ds.dataset(
+            [f"{self.base_path}/{path}" for path in paths], schema=ARCHIVE_SCHEMA,
+            filesystem=self.filesystem, format="parquet",
+        )
+        condition = None
+        if start:
+            condition = ds.field("created_at") >= pa.scalar(datetime.combine(start, time.min), pa.timestamp("ms"))
+        if end:
+            before_end = ds.field("created_at") < pa.scalar(datetime.combine(end, time.min), pa.timestamp("ms"))
+            condition = before_end if condition is None else condition & before_end
+        for record_batch in dataset.to_batches(filter=condition, batch_size=batch_size):
+            if record_batch.num_rows:
+                yield [order_from_row(row) for row in record_batch.to_pylist()]
+
+    def _read(self, path: str, ids: List[str]) -> List[dict]:
+        table = pq.read_table(
+            f"{self.base_path}/{path}", filesystem=self.filesystem, filters=[("id", "in", ids)],
+        )
+        return [order_from_row(row) for row in table.to_pylist()]
+
+
+async def _main(older_than_days: Optional[int], batch_size: int):
+    load_dotenv(Path(__file__).parent / '.env')
+    if older_than_days is None:
+        older_than_days = int(os.environ.get('ORDER_ARCHIVE_AFTER_DAYS', '365'))
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    archive = OrderArchive(os.environ['ORDER_ARCHIVE_URI'])
+    try:
+        older_than = datetime.utcnow() - timedelta(days=older_than_days)
+        archived = await archive.archive(client[os.environ['DB_NAME']], older_than, batch_size)
+        print(f"Archived {archived} orders created before {older_than.isoformat()} to {archive.uri}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Move old orders to the archive at ORDER_ARCHIVE_URI")
+    parser.add_argument("--older-than-days", type=int, default=None,
+                        help="default: ORDER_ARCHIVE_AFTER_DAYS or 365")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(_main(args.older_than_days, args.batch_size))
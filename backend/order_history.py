@@ -0,0 +1,113 @@
+import base64
+from datetime import datetime
+from typing import AsyncIterator, Iterable, Optional, Tuple
+
+from pymongo import DESCENDING
+
+from documents import order_view
+from fast_json import dumps
+
+# Keyset pagination over a user's orders, newest first, ordered by
+# (created_at, id) so pages stay stable while new orders arrive. When an
+# archive is given, pages continue into archived orders once the orders
+# collection runs out.
+
+ORDER_SORT = [("created_at", DESCENDING), ("id", DESCENDING)]
+CURSOR_FIELDS = ("created_at", "id")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(order: dict) -> str:
+    raw = f"{order['created_at'].isoformat()}|{order['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, order_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), order_id
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor("Invalid cursor") from e
+
+
+def keyset_query(user_id: str, position: Optional[Tuple[datetime, str]] = None) -> dict:
+    query = {"user_id": user_id}
+    if position:
+        created_at, order_id = position
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": order_id}},
+        ]
+    return query
+
+
+def orders_query(user_id: str, cursor: Optional[str] = None) -> dict:
+    return keyset_query(user_id, decode_cursor(cursor) if cursor else None)
+
+
+def _project(order: dict, projection: Optional[dict]) -> dict:
+    fields = [field for field, include in (projection or {}).items() if include]
+    if not fields:
+        return order
+    return {field: order[field] for field in fields if field in order}
+
+
+def orders_projection(fields: Optional[Iterable[str]], allowed: Iterable[str]) -> dict:
+    if not fields:
+        return {"_id": 0}
+    fields = set(fields)
+    unknown = fields - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown order fields: {', '.join(sorted(unknown))}")
+    projection = {field: 1 for field in fields | set(CURSOR_FIELDS)}
+    projection["_id"] = 0
+    # The schema version decides how the stored fields are read
+    projection["v"] = 1
+    return projection
+
+
+async def fetch_orders_page(db, user_id: str, limit: int, cursor: Optional[str] = None, projection: Optional[dict] = None,
+                            session=None, archive=None):
+    """Return (orders, next_cursor); next_cursor is None on the last page."""
+    docs = await db.orders.find(
+        orders_query(user_id, cursor), projection or {"_id": 0}, session=session
+    ).sort(ORDER_SORT).limit(limit + 1).to_list(limit + 1)
+
+    if archive is not None and len(docs) <= limit:
+        # Paged past the hot orders; continue from the last one into the archive
+        position = (docs[-1]["created_at"], docs[-1]["id"]) if docs else (decode_cursor(cursor) if cursor else None)
+        archived, _ = await archive.fetch(db, user_id, limit + 1 - len(docs), position, session=session)
+        docs += [_project(order, projection) for order in archived]
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1])
+    return [order_view(doc) for doc in docs], next_cursor
+
+
+async def stream_orders_ndjson(db, user_id: str, cursor: Optional[str] = None, projection: Optional[dict] = None,
+                               batch_size: int = 500, archive=None) -> AsyncIterator[bytes]:
+    mongo_cursor = db.orders.find(
+        orders_query(user_id, cursor), projection or {"_id": 0}
+    ).sort(ORDER_SORT).batch_size(batch_size)
+    position = decode_cursor(cursor) if cursor else None
+    lines = []
+    async for order in mongo_cursor:
+        position = (order["created_at"], order["id"])
+        lines.append(dumps(order_view(order)))
+        if len(lines) >= 100:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if archive is not None:
+        async for order in archive.iter_orders(db, user_id, position, batch_size):
+            lines.append(dumps(order_view(_project(order, projection))))
+            if len(lines) >= 100:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class Outbox:
+    """Transactional outbox drained by in-process asyncio workers.
+
+    Events are written next to the business document (in the same
+    transaction when one is in use) and delivered at least once: a worker
+    leases an event, runs its handler, and marks it done. Failed handlers are
+    retried with exponential backoff until ``max_attempts``, after which the
+    event is parked as ``dead``. A worker that dies mid-delivery loses its
+    lease and the event is picked up again.
+    """
+
+    def __init__(self, max_attempts: int = 8, lease_seconds: float = 60.0,
+                 backoff_base_seconds: float = 2.0, poll_interval_seconds: float = 1.0):
+        self.db = None
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.backoff_base_seconds = backoff_base_seconds
+        self.poll_interval_seconds = poll_interval_seconds
+        self._subscribers: Dict[str, List[str]] = {}
+        self._handlers: Dict[str, Handler] = {}
+        self._wakeup = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+
+    def subscribe(self, event_type: str, name: str, handler: Handler):
+        self._subscribers.setdefault(event_type, []).append(name)
+        self._handlers[name] = handler
+
+    def build_events(self, event_type: str, payload: dict) -> List[dict]:
+        """One outbox document per subscriber, so each side effect retries on its own."""
+        now = datetime.utcnow()
+        return [
+            {
+                "id": str(uuid.uuid4()),
+                "event_type": event_type,
+                "handler": name,
+                "payload": payload,
+                "status": "pending",
+                "attempts": 0,
+                "available_at": now,
+                "created_at": now,
+            }
+            for name in self._subscribers.get(event_type, [])
+        ]
+
+    async def write(self, events: List[dict], session=None):
+        if events:
+            await self.db.outbox.insert_many(events, session=session)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def start(self, db, workers: int):
+        """Bind the outbox to ``db`` and start ``workers`` delivery tasks (0 only binds)."""
+        self.db = db
+        for number in range(workers):
+            self._workers.append(asyncio.create_task(self._run_worker(number)))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await self.db.outbox.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "available_at": {"$lte": now}},
+                {"status": "processing", "locked_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {"status": "processing", "locked_until": now + timedelta(seconds=self.lease_seconds)},
+                "$inc": {"attempts": 1},
+            },
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _deliver(self, event: dict):
+        handler = self._handlers.get(event["handler"])
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for {event['handler']}")
+            await handler(event["payload"])
+        except Exception as e:
+            await self._fail(event, e)
+            return
+        await self.db.outbox.update_one(
+            {"id": event["id"]},
+            {"$set": {"status": "done", "processed_at": datetime.utcnow()}, "$unset": {"locked_until": ""}},
+        )
+
+    async def _fail(self, event: dict, error: Exception):
+        if event["attempts"] >= self.max_attempts:
+            logger.error("Outbox event %s (%s) is dead after %d attempts: %s",
+                         event["id"], event["handler"], event["attempts"], error)
+            update = {"status": "dead", "last_error": repr(error)}
+        else:
+            delay = self.backoff_base_seconds * (2 ** (event["attempts"] - 1))
+            delay += random.uniform(0, delay / 2)
+            logger.warning("Outbox event %s (%s) failed, retrying in %.1fs: %s",
+                           event["id"], event["handler"], delay, error)
+            update = {
+                "status": "pending",
+                "available_at": datetime.utcnow() + timedelta(seconds=delay),
+                "last_error": repr(error),
+            }
+        await self.db.outbox.update_one({"id": event["id"]}, {"$set": update, "$unset": {"locked_until": ""}})
+
+    async def _run_worker(self, number: int):
+        while True:
+            try:
+                event = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Outbox worker %d could not claim an event", number)
+                event = None
+
+            if event is not None:
+                try:
+                    await self._deliver(event)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    # Could not record the outcome; the lease expires and the event is redelivered
+                    logger.exception("Outbox worker %d could not record delivery of %s", number, event["id"])
+                    await asyncio.sleep(self.poll_interval_seconds)
+                continue
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval_seconds)
+            except asyncio.TimeoutError:
+                pass
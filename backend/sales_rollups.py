@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import os
+from datetime import date, datetime, time
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteOne, ReplaceOne, UpdateOne
+
+from courier_rates import canonical_state
+from documents import ORDER_MONEY_FIELDS, from_paise, upgrade_order
+from order_archive import OrderArchive
+
+# Daily sales counters in the sales_daily collection, one document per
+# (day, menu_item_id, state), with amounts in integer paise like stored
+# orders. Checkout increments them; the backfill rebuilds them from the
+# orders collection. The backfill never touches today or later, where
+# checkouts are still incrementing, and replaces rows key by key instead
+# of deleting and reinserting the range.
+
+
+def rollup_key(day: str, menu_item_id: str, state: str) -> dict:
+    return {"day": day, "menu_item_id": menu_item_id, "state": state}
+
+
+def _courier_shares(courier_charges: int, quantities: List[int]) -> List[int]:
+    """Split paise over lines by weight so that the shares add up to exactly ``courier_charges``."""
+    weight = sum(quantities)
+    if not weight:
+        return [courier_charges] + [0] * (len(quantities) - 1)
+    shares = [courier_charges * quantity // weight for quantity in quantities]
+    for index in range(courier_charges - sum(shares)):
+        shares[index] += 1
+    return shares
+
+
+def order_lines(order: dict) -> List[dict]:
+    """Rollup contributions of a stored order (any version), one per line."""
+    order = upgrade_order(order)
+    day = order["created_at"].strftime("%Y-%m-%d")
+    state = canonical_state(order["state"])
+    lines = list(order["items"].items())
+    shares = _courier_shares(order["courier_charges"], [quantity for _, (quantity, _) in lines])
+    return [
+        {
+            "id": order["id"], "day": day, "menu_item_id": menu_item_id, "state": state,
+            "quantity": quantity, "subtotal": quantity * price, "courier_charges": share,
+        }
+        for (menu_item_id, (quantity, price)), share in zip(lines, shares)
+    ]
+
+
+def order_rollup_updates(order: dict) -> List[UpdateOne]:
+    """Upserting $inc updates for every line of a stored order."""
+    return [
+        UpdateOne(
+            rollup_key(line["day"], line["menu_item_id"], line["state"]),
+            {"$inc": {
+                "quantity": line["quantity"],
+                "subtotal": line["subtotal"],
+                "courier_charges": line["courier_charges"],
+                "orders": 1,
+            }},
+            upsert=True,
+        )
+        for line in order_lines(order)
+    ]
+
+
+async def apply_order_rollup(db, order: dict, session=None):
+    updates = order_rollup_updates(order)
+    if updates:
+        await db.sales_daily.bulk_write(updates, ordered=False, session=session)
+
+
+def _order_lines_frame(orders: List[dict]) -> pd.DataFrame:
+    return pd.DataFrame([line for order in orders for line in order_lines(order)])
+
+
+async def backfill(db, start: Optional[date] = None, end: Optional[date] = None, batch_size: int = 5000,
+                   archive=None) -> int:
+    """Rebuild sales_daily for [start, end) from orders, and archived orders when ``archive`` is given.
+    Days from today (UTC) on are skipped. Returns the number of rollup rows written."""
+    today = datetime.utcnow().date()
+    if end is None or end > today:
+        end = today
+    if start is not None and start >= end:
+        return 0
+
+    query = {}
+    if start or end:
+        query["created_at"] = {}
+        if start:
+            query["created_at"]["$gte"] = datetime.combine(start, time.min)
+        if end:
+            query["created_at"]["$lt"] = datetime.combine(end, time.min)
+
+    totals = None
+    batch: List[dict] = []
+    projection = {"_id": 0, "id": 1, "v": 1, "items": 1, "state": 1, "created_at": 1,
+                  **{field: 1 for field in ORDER_MONEY_FIELDS}}
+    cursor = db.orders.find(query, projection).batch_size(batch_size)
+
+    def fold(orders: List[dict]):
+        nonlocal totals
+        frame = _order_lines_frame(orders)
+        if frame.empty:
+            return
+        grouped = frame.groupby(["day", "menu_item_id", "state"]).agg(
+            quantity=("quantity", "sum"),
+            subtotal=("subtotal", "sum"),
+            courier_charges=("courier_charges", "sum"),
+            orders=("id", "nunique"),
+        )
+        totals = grouped if totals is None else totals.add(grouped, fill_value=0)
+
+    async for order in cursor:
+        batch.append(order)
+        if len(batch) >= batch_size:
+            fold(batch)
+            batch = []
+    if batch:
+        fold(batch)
+    if archive is not None:
+        async for archived in archive.scan(db, start, end, batch_size):
+            fold(archived)
+
+    rows = totals.reset_index().to_dict("records") if totals is not None else []
+    for row in rows:
+        # Partial sums are exact, though adding frames turns them into floats
+        for field in ("quantity", "orders", "subtotal", "courier_charges"):
+            row[field] = int(row[field])
+    rebuilt = {(row["day"], row["menu_item_id"], row["state"]) for row in rows}
+
+    day_filter = {"$lt": end.isoformat()}
+    if start:
+        day_filter["$gte"] = start.isoformat()
+    stale = [
+        DeleteOne(rollup_key(row["day"], row["menu_item_id"], row["state"]))
+        async for row in db.sales_daily.find({"day": day_filter}, {"_id": 0, "day": 1, "menu_item_id": 1, "state": 1})
+        if (row["day"], row["menu_item_id"], row["state"]) not in rebuilt
+    ]
+    writes = stale + [
+        ReplaceOne(rollup_key(row["day"], row["menu_item_id"], row["state"]), row, upsert=True) for row in rows
+    ]
+    for offset in range(0, len(writes), batch_size):
+        await db.sales_daily.bulk_write(writes[offset:offset + batch_size], ordered=False)
+    return len(rows)
+
+
+async def query_rollups(db, start: date, end: date, menu_item_id: Optional[str] = None,
+                        state: Optional[str] = None) -> List[dict]:
+    """Rollup rows in [start, end), with amounts converted to rupees for the report."""
+    query = {"day": {"$gte": start.isoformat(), "$lt": end.isoformat()}}
+    if menu_item_id:
+        query["menu_item_id"] = menu_item_id
+    if state:
+        query["state"] = canonical_state(state)
+    cursor = db.sales_daily.find(query, {"_id": 0}).sort([("day", 1), ("menu_item_id", 1), ("state", 1)])
+    rows = await cursor.to_list(None)
+    for row in rows:
+        row["subtotal"] = from_paise(row["subtotal"])
+        row["courier_charges"] = from_paise(row["courier_charges"])
+    return rows
+
+
+async def _main(start: Optional[date], end: Optional[date], batch_size: int):
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    archive = None
+    if os.environ.get('ORDER_ARCHIVE_URI'):
+        archive = OrderArchive(os.environ['ORDER_ARCHIVE_URI'])
+    try:
+        written = await backfill(client[os.environ['DB_NAME']], start, end, batch_size, archive)
+        print(f"Wrote {written} sales_daily rows")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild sales_daily rollups from the orders collection")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="first day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="day after the last day to rebuild; at most today")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(_main(args.start, args.end, args.batch_size))
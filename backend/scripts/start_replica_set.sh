@@ -0,0 +1,33 @@
+#!/usr/bin/env bash
+# Start a throwaway three-node replica set on localhost for testing read
+# preferences, transactions and failover. Data lives under $RS_DIR.
+#
+#   ./scripts/start_replica_set.sh
+#   MONGO_URL="mongodb://localhost:27017,localhost:27018,localhost:27019/?replicaSet=rs0" \
+#   MONGO_HISTORY_READ_PREFERENCE=secondaryPreferred CHECKOUT_TRANSACTIONS=true \
+#   uvicorn server:app --port 8001
+#
+# Stop it with: pkill -f "mongod --replSet rs0"
+set -euo pipefail
+
+RS_DIR="${RS_DIR:-/tmp/mvr-rs0}"
+PORTS=(27017 27018 27019)
+
+for port in "${PORTS[@]}"; do
+  mkdir -p "$RS_DIR/$port"
+  mongod --replSet rs0 --port "$port" --bind_ip localhost \
+    --dbpath "$RS_DIR/$port" --logpath "$RS_DIR/$port.log" --fork
+done
+
+mongosh --quiet --port "${PORTS[0]}" --eval '
+rs.initiate({
+  _id: "rs0",
+  members: [
+    { _id: 0, host: "localhost:27017", priority: 2 },
+    { _id: 1, host: "localhost:27018" },
+    { _id: 2, host: "localhost:27019" }
+  ]
+});
+while (!db.hello().isWritablePrimary) { sleep(500); }
+print("rs0 is up with primary " + db.hello().primary);
+'
@@ -1,26 +1,231 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Header
+from fastapi import FastAPI, APIRouter, HTTPException, Header, Query, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReadPreference, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 import uuid
-from datetime import datetime, timedelta
-import requests
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
+
+from admission import AdmissionMiddleware, InMemoryTokenBuckets, LoopLagMonitor, PoolWaitListener, RedisTokenBuckets
+from auth_client import AuthProviderClient, AuthProviderError, DEFAULT_SESSION_DATA_URL
+from catalog import Catalog
+from checkout import (
+    IdempotencyConflict,
+    abandon_idempotent_request,
+    begin_idempotent_request,
+    claim_cart,
+    complete_idempotent_request,
+    request_fingerprint,
+    restore_cart,
+)
+from cart_store import InProcessCartCache, MongoCartStore, RedisCartCache, WriteBackCartStore
+from cart_updates import CartChange
+from compression import CompressionMiddleware
+from courier_rates import RATE_TABLE_BODY, RATE_TABLE_ETAG, rate_for
+from documents import cart_quantities, cart_revision, cart_view, new_order_document, order_view, priced_lines, to_paise
+from fast_json import FastJSONResponse
+from http_cache import etag_matches, version_etag
+from indexes import ensure_indexes, warm_indexes
+from inventory import Inventory, OutOfStock, ReservationLost
+from metrics import Counter, Metrics, MetricsMiddleware, MongoCommandListener
+from mongo_options import client_options_from_env, read_preference
+from order_archive import OrderArchive
+from order_history import InvalidCursor, decode_cursor, fetch_orders_page, orders_projection, stream_orders_ndjson
+from outbox import Outbox
+from sales_rollups import apply_order_rollup, query_rollups
+from session_cache import SessionCache, SessionRevocations
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Request and MongoDB command metrics, exposed at /metrics
+metrics = Metrics()
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_MS', '500')) / 1000
+
+# MongoDB connection settings; the client itself is created per worker in lifespan
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+DB_NAME = os.environ['DB_NAME']
+MONGO_CLIENT_OPTIONS = client_options_from_env(os.environ)
+MONGO_WARM_CONNECTIONS = int(os.environ.get('MONGO_WARM_CONNECTIONS', '10'))
+
+# Order history and reporting tolerate slight staleness, so they can be
+# pointed at secondaries; cart and checkout always use the primary via db
+MONGO_MAX_STALENESS_SECONDS = int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', '-1'))
+HISTORY_READ_PREFERENCE = read_preference(
+    os.environ.get('MONGO_HISTORY_READ_PREFERENCE', 'primary'), MONGO_MAX_STALENESS_SECONDS
+)
+REPORTING_READ_PREFERENCE = read_preference(
+    os.environ.get('MONGO_REPORTING_READ_PREFERENCE', 'secondaryPreferred'), MONGO_MAX_STALENESS_SECONDS
+)
+
+# Per-worker resources, opened by lifespan after the server forks workers
+client: Optional[AsyncIOMotorClient] = None
+db = None
+history_db = None
+reporting_db = None
+auth_client: Optional[AuthProviderClient] = None
+worker_state = {"ready": False, "cold_start_seconds": None}
+
+# In-process cache of session_token -> User
+session_cache = SessionCache(
+    max_size=int(os.environ.get('SESSION_CACHE_SIZE', '10000')),
+    ttl_seconds=float(os.environ.get('SESSION_CACHE_TTL_SECONDS', '60')),
+)
+# Logouts reach the caches of other workers within this many seconds
+session_revocations = SessionRevocations(
+    session_cache, interval_seconds=float(os.environ.get('SESSION_REVOCATION_POLL_SECONDS', '1')),
+)
+
+# Pooled client settings for the external auth provider
+AUTH_CLIENT_OPTIONS = dict(
+    session_data_url=os.environ.get('AUTH_SESSION_DATA_URL', DEFAULT_SESSION_DATA_URL),
+    connect_timeout=float(os.environ.get('AUTH_CONNECT_TIMEOUT_SECONDS', '2')),
+    read_timeout=float(os.environ.get('AUTH_READ_TIMEOUT_SECONDS', '5')),
+    max_retries=int(os.environ.get('AUTH_MAX_RETRIES', '2')),
+)
+
+# Menu catalog, loaded once and refreshed in the background
+catalog = Catalog(file_path=os.environ.get('CATALOG_FILE'))
+CATALOG_RELOAD_SECONDS = float(os.environ.get('CATALOG_RELOAD_SECONDS', '60'))
+MENU_CACHE_CONTROL = os.environ.get('MENU_CACHE_CONTROL', 'public, max-age=60')
+
+# Cart storage: "mongo" writes every change through to the carts collection;
+# "memory" (single worker) and "redis" serve carts from a hot cache and flush
+# changed carts to MongoDB every CART_FLUSH_INTERVAL_SECONDS
+CART_STORE = os.environ.get('CART_STORE', 'mongo')
+CART_TTL_SECONDS = float(os.environ.get('CART_TTL_SECONDS', '3600'))
+CART_FLUSH_INTERVAL_SECONDS = float(os.environ.get('CART_FLUSH_INTERVAL_SECONDS', '1'))
+if CART_STORE == 'memory':
+    cart_store = WriteBackCartStore(InProcessCartCache(ttl_seconds=CART_TTL_SECONDS), CART_FLUSH_INTERVAL_SECONDS)
+elif CART_STORE == 'redis':
+    cart_store = WriteBackCartStore(
+        RedisCartCache(os.environ['CART_STORE_REDIS_URL'], ttl_seconds=CART_TTL_SECONDS), CART_FLUSH_INTERVAL_SECONDS
+    )
+else:
+    cart_store = MongoCartStore()
+
+# Stock per menu item in kg (see inventory.py). Shoppers on the checkout
+# page hold their cart's stock for RESERVATION_TTL_SECONDS; the availability
+# shown with carts is refreshed every INVENTORY_REFRESH_SECONDS
+inventory = Inventory(reservation_ttl_seconds=float(os.environ.get('RESERVATION_TTL_SECONDS', '600')))
+INVENTORY_REFRESH_SECONDS = float(os.environ.get('INVENTORY_REFRESH_SECONDS', '5'))
+
+# Run checkout as a multi-document transaction (requires a replica set)
+CHECKOUT_TRANSACTIONS = os.environ.get('CHECKOUT_TRANSACTIONS', 'false').lower() == 'true'
+
+# Post-order side effects are delivered from the outbox by background workers
+outbox = Outbox(
+    max_attempts=int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8')),
+    lease_seconds=float(os.environ.get('OUTBOX_LEASE_SECONDS', '60')),
+)
+OUTBOX_WORKERS = int(os.environ.get('OUTBOX_WORKERS', '2'))
+
+# Shared secret for the reporting endpoints; reporting is disabled when unset
+REPORTS_API_KEY = os.environ.get('REPORTS_API_KEY')
+
+# Order history paging
+ORDERS_PAGE_SIZE = int(os.environ.get('ORDERS_PAGE_SIZE', '50'))
+ORDERS_MAX_PAGE_SIZE = int(os.environ.get('ORDERS_MAX_PAGE_SIZE', '200'))
+
+# Orders moved to the archive by order_archive.py are still served by history
+order_archive = OrderArchive(os.environ['ORDER_ARCHIVE_URI']) if os.environ.get('ORDER_ARCHIVE_URI') else None
+
+# Carts and order history are revalidated on every use via version ETags
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+# Responses at least this large are brotli/gzip compressed
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+
+# Admission control: per-user token buckets on cart writes and checkout,
+# and load shedding when the event loop lags or the MongoDB pool queues up.
+# RATE_LIMIT_BACKEND=redis shares buckets between workers and hosts.
+RATE_LIMIT_RPS = float(os.environ.get('RATE_LIMIT_RPS', '5'))
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', '20'))
+RATE_LIMITED_ROUTES = [
+    ("POST", "/api/cart/"),
+    ("PUT", "/api/cart/"),
+    ("DELETE", "/api/cart/"),
+    ("POST", "/api/orders"),
+    ("POST", "/api/checkout/"),
+]
+if os.environ.get('RATE_LIMIT_BACKEND', 'memory') == 'redis':
+    rate_limit_buckets = RedisTokenBuckets(os.environ['RATE_LIMIT_REDIS_URL'])
+else:
+    rate_limit_buckets = InMemoryTokenBuckets()
+SHED_LOOP_LAG_SECONDS = float(os.environ.get('SHED_LOOP_LAG_MS', '250')) / 1000
+SHED_DB_POOL_WAITERS = int(os.environ.get('SHED_DB_POOL_WAITERS', '100'))
+pool_wait_listener = PoolWaitListener()
+loop_lag_monitor = LoopLagMonitor()
+admission_rejections = Counter("http_admission_rejections_total", "Requests rejected by admission control")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db, history_db, reporting_db, auth_client
+    started = time.perf_counter()
+    
+    client = AsyncIOMotorClient(
+        mongo_url,
+        event_listeners=[MongoCommandListener(metrics), pool_wait_listener],
+        **MONGO_CLIENT_OPTIONS,
+    )
+    db = client[DB_NAME]
+    history_db = client.get_database(DB_NAME, read_preference=HISTORY_READ_PREFERENCE)
+    reporting_db = client.get_database(DB_NAME, read_preference=REPORTING_READ_PREFERENCE)
+    auth_client = AuthProviderClient(**AUTH_CLIENT_OPTIONS)
+    
+    # Warm up before the server starts accepting traffic: indexes, catalog,
+    # a pool of open connections and the hot index pages
+    await ensure_indexes(db)
+    await catalog.reload(db)
+    inventory.start(db, INVENTORY_REFRESH_SECONDS)
+    await inventory.refresh()
+    await asyncio.gather(*(db.command("ping") for _ in range(MONGO_WARM_CONNECTIONS)))
+    await warm_indexes(db)
+    
+    outbox.start(db, OUTBOX_WORKERS)
+    cart_store.start(db)
+    session_revocations.start(db)
+    loop_lag_monitor.start()
+    catalog_watcher = None
+    if CATALOG_RELOAD_SECONDS > 0:
+        catalog_watcher = asyncio.create_task(catalog.watch(db, CATALOG_RELOAD_SECONDS))
+    
+    worker_state["cold_start_seconds"] = time.perf_counter() - started
+    worker_state["ready"] = True
+    logger.info("Worker %d ready in %.0f ms", os.getpid(), worker_state["cold_start_seconds"] * 1000)
+    try:
+        yield
+    finally:
+        worker_state["ready"] = False
+        if catalog_watcher is not None:
+            catalog_watcher.cancel()
+        await loop_lag_monitor.stop()
+        await session_revocations.stop()
+        await inventory.stop()
+        await cart_store.stop()
+        await outbox.stop()
+        await auth_client.aclose()
+        client.close()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -80,6 +285,17 @@ class AddToCartRequest(BaseModel):
     menu_item_id: str
     quantity: int
 
+class UpdateCartItemRequest(BaseModel):
+    quantity: int
+
+class CartOperation(BaseModel):
+    op: Literal["add", "set", "remove"]
+    menu_item_id: str
+    quantity: int = 0
+
+class BatchCartRequest(BaseModel):
+    operations: List[CartOperation] = Field(..., max_length=50)
+
 class CheckoutRequest(BaseModel):
     delivery_address: str
     pincode: str
@@ -87,51 +303,98 @@ class CheckoutRequest(BaseModel):
     state: str
 
 # Helper functions
-def get_courier_charge(state: str) -> float:
-    state_lower = state.lower()
-    if 'andhra' in state_lower or 'ap' in state_lower:
-        return 80.0
-    elif 'telangana' in state_lower or 'ts' in state_lower:
-        return 100.0
-    else:
-        return 150.0
+def get_courier_charge(state: str, pincode: Optional[str] = None) -> float:
+    return rate_for(state, pincode)
 
 async def get_user_from_session(session_token: str) -> Optional[User]:
+    if not session_token:
+        return None
+
+    cached = session_cache.get(session_token)
+    if cached is not None:
+        return cached
+
     session = await db.sessions.find_one({"session_token": session_token})
     if not session or session['expires_at'] < datetime.utcnow():
         return None
     
     user = await db.users.find_one({"id": session['user_id']})
-    return User(**user) if user else None
+    if not user:
+        return None
+
+    user = User(**user)
+    session_cache.set(session_token, user, user.id, session['expires_at'])
+    return user
+
+async def rate_limit_identity(session_token: str) -> Optional[str]:
+    # The same lookup the handler makes next, so it is usually a cache hit
+    # there; tokens that do not resolve are limited by client address
+    user = await get_user_from_session(session_token)
+    return user.id if user else None
+
+# Outbox handlers for side effects of a placed order
+async def log_order_placed(payload: dict):
+    logger.info("Order %s placed by %s for %.2f", payload["order_id"], payload["user_id"], payload["total_amount"])
+
+outbox.subscribe("order.created", "log_order_placed", log_order_placed)
+
+async def load_cart(user_id: str) -> dict:
+    return cart_view(await cart_store.get(user_id), catalog.prices, inventory.available)
+
+def cart_etag(user_id: str, cart: Optional[dict]) -> str:
+    # Cart responses are priced from the catalog and show the stock of their
+    # items, so a menu change or a stock change for one of them is a new
+    # version too; stock changes for other items are not
+    stock = inventory.stock_stamp(cart_quantities(cart)) if cart else ""
+    return version_etag(user_id, cart_revision(cart), catalog.etag, stock)
+
+def cart_response(user_id: str, cart: Optional[dict]) -> FastJSONResponse:
+    headers = {"ETag": cart_etag(user_id, cart), "Cache-Control": PRIVATE_CACHE_CONTROL}
+    return FastJSONResponse(cart_view(cart, catalog.prices, inventory.available), headers=headers)
+
+async def load_orders_version(user_id: str, session=None) -> int:
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "orders_version": 1}, session=session)
+    return (user or {}).get("orders_version", 0)
+
+@asynccontextmanager
+async def history_session():
+    # When history is read from secondaries, a causally consistent session
+    # makes those reads at least as new as the order version read first
+    if HISTORY_READ_PREFERENCE == ReadPreference.PRIMARY:
+        yield None
+        return
+    async with await client.start_session(causal_consistency=True) as session:
+        yield session
 
 # Authentication endpoints
 @api_router.post("/auth/login")
 async def login(request: AuthRequest):
     try:
         # Call Emergent auth API
-        response = requests.get(
-            "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-            headers={"X-Session-ID": request.session_id}
-        )
-        
-        if response.status_code != 200:
-            raise HTTPException(status_code=401, detail="Invalid session")
-        
-        user_data = response.json()
+        try:
+            user_data = await auth_client.get_session_data(request.session_id)
+        except AuthProviderError as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
         
-        # Check if user exists
-        existing_user = await db.users.find_one({"email": user_data["email"]})
-        
-        if not existing_user:
-            # Create new user
-            user = User(
-                email=user_data["email"],
-                name=user_data["name"],
-                picture=user_data.get("picture")
+        # Find or create the user in one step, so concurrent first logins
+        # (e.g. coalesced requests for one session id) share one user
+        new_user = User(
+            email=user_data["email"],
+            name=user_data["name"],
+            picture=user_data.get("picture")
+        )
+        try:
+            stored_user = await db.users.find_one_and_update(
+                {"email": user_data["email"]},
+                {"$setOnInsert": new_user.dict()},
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
             )
-            await db.users.insert_one(user.dict())
-        else:
-            user = User(**existing_user)
+        except DuplicateKeyError:
+            # Lost the insert race; the other login created the user
+            stored_user = await db.users.find_one({"email": user_data["email"]}, {"_id": 0})
+        user = User(**stored_user)
         
         # Create session
         session_token = str(uuid.uuid4())
@@ -147,8 +410,11 @@ async def login(request: AuthRequest):
             "session_token": session_token
         }
         
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Login failed")
+        raise HTTPException(status_code=500, detail="Login failed")
 
 @api_router.get("/auth/profile")
 async def get_profile(authorization: str = Header(None)):
@@ -159,49 +425,54 @@ async def get_profile(authorization: str = Header(None)):
     if not user:
         raise HTTPException(status_code=401, detail="Invalid session")
     
-    return user.dict()
+    return FastJSONResponse(user.dict())
+
+@api_router.post("/auth/logout")
+async def logout(authorization: str = Header(None)):
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Authorization header required")
+    
+    # Delete first, so no worker can re-cache the session after the revocation;
+    # only real sessions are revoked, so made-up tokens write nothing
+    result = await db.sessions.delete_one({"session_token": authorization})
+    if result.deleted_count == 1:
+        await session_revocations.revoke(authorization)
+    else:
+        session_cache.invalidate(authorization)
+    
+    return {"message": "Logged out"}
+
+@api_router.get("/bootstrap")
+async def bootstrap(authorization: str = Header(None)):
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Authorization header required")
+    
+    user = await get_user_from_session(authorization)
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid session")
+    
+    # Authenticate once, then load the per-user data concurrently
+    cart, (orders, next_cursor) = await asyncio.gather(
+        load_cart(user.id),
+        fetch_orders_page(history_db, user.id, ORDERS_PAGE_SIZE, archive=order_archive),
+    )
+    
+    return FastJSONResponse({
+        "user": user.dict(),
+        "menu": catalog.items,
+        "cart": cart,
+        "orders": orders,
+        "orders_next_cursor": next_cursor,
+    })
 
 # Menu endpoints
 @api_router.get("/menu")
-async def get_menu():
-    menu_items = [
-        {
-            "id": "chicken",
-            "name": "Chicken",
-            "price": 800.0,
-            "description": "Fresh chicken pickle per KG",
-            "image_url": ""
-        },
-        {
-            "id": "chicken_boneless",
-            "name": "Chicken Boneless",
-            "price": 1000.0,
-            "description": "Boneless chicken pickle per KG",
-            "image_url": ""
-        },
-        {
-            "id": "prawns_small",
-            "name": "Prawns Small Size",
-            "price": 1200.0,
-            "description": "Small size prawn pickle per KG",
-            "image_url": ""
-        },
-        {
-            "id": "prawns_big",
-            "name": "Prawns Big Size",
-            "price": 1400.0,
-            "description": "Big size prawn pickle per KG",
-            "image_url": ""
-        },
-        {
-            "id": "mutton",
-            "name": "Mutton",
-            "price": 1500.0,
-            "description": "Fresh mutton pickle per KG",
-            "image_url": ""
-        }
-    ]
-    return menu_items
+async def get_menu(if_none_match: str = Header(None)):
+    headers = {"ETag": catalog.etag, "Cache-Control": MENU_CACHE_CONTROL}
+    if etag_matches(catalog.etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=catalog.body, media_type="application/json", headers=headers)
 
 # Cart endpoints
 @api_router.post("/cart/add")
@@ -210,51 +481,71 @@ async def add_to_cart(request: AddToCartRequest, authorization: str = Header(Non
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
+    if request.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be positive")
+    
     # Get menu item
-    menu_items = await get_menu()
-    menu_item = next((item for item in menu_items if item["id"] == request.menu_item_id), None)
+    menu_item = catalog.get(request.menu_item_id)
     if not menu_item:
         raise HTTPException(status_code=404, detail="Menu item not found")
     
-    # Get or create cart
-    cart = await db.carts.find_one({"user_id": user.id})
-    if not cart:
-        cart = Cart(user_id=user.id, items=[], total_amount=0.0)
-        await db.carts.insert_one(cart.dict())
-    else:
-        cart = Cart(**cart)
+    # Upsert the cart and add or increment the line
+    cart = await cart_store.apply(user.id, [CartChange("add", request.menu_item_id, request.quantity)])
+    return cart_response(user.id, cart)
+
+@api_router.post("/cart/batch")
+async def batch_update_cart(request: BatchCartRequest, authorization: str = Header(None)):
+    user = await get_user_from_session(authorization)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
     
-    # Add or update item in cart
-    existing_item = next((item for item in cart.items if item.menu_item_id == request.menu_item_id), None)
-    if existing_item:
-        existing_item.quantity += request.quantity
-    else:
-        cart_item = CartItem(
-            menu_item_id=request.menu_item_id,
-            quantity=request.quantity,
-            price=menu_item["price"]
-        )
-        cart.items.append(cart_item)
+    # Validate everything up front so the batch is applied all-or-nothing
+    changes = []
+    for operation in request.operations:
+        if operation.op == "remove":
+            changes.append(CartChange("remove", operation.menu_item_id))
+            continue
+        
+        menu_item = catalog.get(operation.menu_item_id)
+        if not menu_item:
+            raise HTTPException(status_code=404, detail=f"Menu item not found: {operation.menu_item_id}")
+        
+        if operation.op == "add" and operation.quantity <= 0:
+            raise HTTPException(status_code=400, detail="Quantity must be positive")
+        changes.append(CartChange(operation.op, operation.menu_item_id, operation.quantity))
     
-    # Calculate total
-    cart.total_amount = sum(item.quantity * item.price for item in cart.items)
-    cart.updated_at = datetime.utcnow()
+    try:
+        cart = await cart_store.apply(user.id, changes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return cart_response(user.id, cart)
+
+@api_router.get("/cart")
+async def get_cart(authorization: str = Header(None), if_none_match: str = Header(None)):
+    user = await get_user_from_session(authorization)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
     
-    await db.carts.replace_one({"user_id": user.id}, cart.dict())
+    # Revalidation only needs the cart's version and items, not the priced cart
+    if if_none_match:
+        etag = cart_etag(user.id, await cart_store.head(user.id))
+        if etag_matches(etag, if_none_match):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": PRIVATE_CACHE_CONTROL})
     
-    return cart.dict()
+    return cart_response(user.id, await cart_store.get(user.id))
 
-@api_router.get("/cart")
-async def get_cart(authorization: str = Header(None)):
+@api_router.put("/cart/item/{menu_item_id}")
+async def update_cart_item(menu_item_id: str, request: UpdateCartItemRequest, authorization: str = Header(None)):
     user = await get_user_from_session(authorization)
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    cart = await db.carts.find_one({"user_id": user.id})
-    if not cart:
-        return {"items": [], "total_amount": 0.0}
+    menu_item = catalog.get(menu_item_id)
+    if not menu_item:
+        raise HTTPException(status_code=404, detail="Menu item not found")
     
-    return cart
+    cart = await cart_store.apply(user.id, [CartChange("set", menu_item_id, request.quantity)])
+    return cart_response(user.id, cart)
 
 @api_router.delete("/cart/item/{menu_item_id}")
 async def remove_from_cart(menu_item_id: str, authorization: str = Header(None)):
@@ -262,90 +553,335 @@ async def remove_from_cart(menu_item_id: str, authorization: str = Header(None))
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    cart = await db.carts.find_one({"user_id": user.id})
+    try:
+        cart = await cart_store.apply(user.id, [CartChange("remove", menu_item_id)], upsert=False)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not cart:
         raise HTTPException(status_code=404, detail="Cart not found")
     
-    cart = Cart(**cart)
-    cart.items = [item for item in cart.items if item.menu_item_id != menu_item_id]
-    cart.total_amount = sum(item.quantity * item.price for item in cart.items)
-    cart.updated_at = datetime.utcnow()
+    return cart_response(user.id, cart)
+
+# Checkout endpoints
+@api_router.post("/checkout/reservation")
+async def reserve_stock(authorization: str = Header(None)):
+    user = await get_user_from_session(authorization)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    
+    # Hold the cart's stock while the shopper fills in the checkout page;
+    # calling again refreshes the hold to match the current cart
+    cart = await cart_store.get(user.id)
+    quantities = {item: quantity for item, (quantity, _) in priced_lines(cart or {}, catalog.prices).items()}
+    try:
+        reservation = await inventory.reserve(user.id, quantities)
+    except (OutOfStock, ReservationLost) as e:
+        raise HTTPException(status_code=409, detail=str(e))
     
-    await db.carts.replace_one({"user_id": user.id}, cart.dict())
+    return FastJSONResponse({"items": reservation.items, "expires_at": reservation.expires_at})
+
+@api_router.delete("/checkout/reservation")
+async def release_stock(authorization: str = Header(None)):
+    user = await get_user_from_session(authorization)
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
     
-    return cart.dict()
+    await inventory.release(user.id)
+    return {"message": "Reservation released"}
 
 # Order endpoints
 @api_router.post("/orders")
-async def create_order(request: CheckoutRequest, authorization: str = Header(None)):
+async def create_order(
+    request: CheckoutRequest,
+    authorization: str = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+):
     user = await get_user_from_session(authorization)
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    # Get cart
-    cart = await db.carts.find_one({"user_id": user.id})
-    if not cart or not cart.get("items"):
+    if idempotency_key:
+        try:
+            stored = await begin_idempotent_request(
+                db, user.id, idempotency_key, request_fingerprint(request.dict())
+            )
+        except IdempotencyConflict as e:
+            raise HTTPException(status_code=e.status_code, detail=e.detail)
+        if stored is not None:
+            return FastJSONResponse(stored)
+    
+    try:
+        # Orders are always placed from the flushed cart in MongoDB
+        async with cart_store.checkout(user.id):
+            if CHECKOUT_TRANSACTIONS:
+                async with await client.start_session() as session:
+                    order = await session.with_transaction(
+                        lambda s: _place_order(user, request, idempotency_key, session=s)
+                    )
+            else:
+                order = await _place_order(user, request, idempotency_key)
+    except BaseException:
+        if idempotency_key:
+            await abandon_idempotent_request(db, user.id, idempotency_key)
+        raise
+    
+    outbox.notify()
+    return FastJSONResponse(order)
+
+async def _place_order(user: User, request: CheckoutRequest, idempotency_key: Optional[str], session=None) -> dict:
+    # Claim the cart; a concurrent checkout or retry finds nothing to claim
+    cart = await claim_cart(db, user.id, session=session)
+    if not cart:
         raise HTTPException(status_code=400, detail="Cart is empty")
     
-    cart = Cart(**cart)
+    # Price the cart from the current menu; all arithmetic is in integer paise
+    lines = priced_lines(cart, catalog.prices)
+    if not lines:
+        if session is None:
+            await restore_cart(db, cart)
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    
+    # Take the stock (or top up the shopper's reservation) outside any
+    # transaction; if the order is not placed, the reservation expires and
+    # the stock goes back
+    try:
+        reservation = await inventory.reserve(user.id, {item: quantity for item, (quantity, _) in lines.items()})
+    except (OutOfStock, ReservationLost) as e:
+        if session is None:
+            await restore_cart(db, cart)
+        raise HTTPException(status_code=409, detail=str(e))
     
-    # Calculate courier charges
-    courier_charges = get_courier_charge(request.state)
-    total_weight = sum(item.quantity for item in cart.items)
-    total_courier_charges = courier_charges * total_weight
+    courier_charges = to_paise(get_courier_charge(request.state, request.pincode))
+    total_weight = sum(quantity for quantity, _ in lines.values())
     
     # Create order
-    order = Order(
-        user_id=user.id,
-        items=cart.items,
-        subtotal=cart.total_amount,
-        courier_charges=total_courier_charges,
-        total_amount=cart.total_amount + total_courier_charges,
+    document = new_order_document(
+        user.id,
+        lines,
+        courier_charges * total_weight,
         delivery_address=request.delivery_address,
         pincode=request.pincode,
         phone=request.phone,
-        state=request.state
+        state=request.state,
     )
     
-    await db.orders.insert_one(order.dict())
+    order = order_view(document)
+    events = outbox.build_events("order.created", {
+        "order_id": order["id"],
+        "user_id": user.id,
+        "total_amount": order["total_amount"],
+    })
+    consumed = False
+    try:
+        await inventory.consume(reservation, session=session)
+        consumed = True
+        await db.orders.insert_one(document, session=session)
+        await outbox.write(events, session=session)
+        await db.users.update_one({"id": user.id}, {"$inc": {"orders_version": 1}}, session=session)
+        if idempotency_key:
+            await complete_idempotent_request(db, user.id, idempotency_key, order, session=session)
+    except ReservationLost as e:
+        if session is None:
+            await restore_cart(db, cart)
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception:
+        if session is None:
+            await db.orders.delete_one({"id": order["id"]})
+            await db.outbox.delete_many({"id": {"$in": [event["id"] for event in events]}})
+            # The reservation is gone, so the sweeper will not return its stock
+            if consumed:
+                await inventory.restock(reservation)
+            await restore_cart(db, cart)
+        raise
     
-    # Clear cart
-    await db.carts.delete_one({"user_id": user.id})
+    # Inside the transaction the rollup commits with the order. Without one,
+    # a failed rollup is logged and left for the backfill to repair rather
+    # than failing an order that has already been placed.
+    try:
+        await apply_order_rollup(db, document, session=session)
+    except Exception:
+        if session is not None:
+            raise
+        logger.exception("Sales rollup update failed for order %s", order["id"])
     
-    return order.dict()
+    return order
 
 @api_router.get("/orders")
-async def get_orders(authorization: str = Header(None)):
+async def get_orders(
+    authorization: str = Header(None),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    if_none_match: str = Header(None),
+):
     user = await get_user_from_session(authorization)
     if not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    orders = await db.orders.find({"user_id": user.id}).to_list(100)
-    return [Order(**order) for order in orders]
+    try:
+        projection = orders_projection(fields.split(",") if fields else None, Order.model_fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        if format == "ndjson":
+            # Stream the full history from the cursor onwards without buffering it
+            if cursor:
+                decode_cursor(cursor)
+            return StreamingResponse(
+                stream_orders_ndjson(history_db, user.id, cursor, projection, archive=order_archive),
+                media_type="application/x-ndjson",
+            )
+        
+        page_size = min(limit or ORDERS_PAGE_SIZE, ORDERS_MAX_PAGE_SIZE)
+        async with history_session() as session:
+            # Read the version before the orders, so the ETag is never newer than the body
+            etag = version_etag(user.id, await load_orders_version(user.id, session))
+            headers = {"ETag": etag, "Cache-Control": PRIVATE_CACHE_CONTROL}
+            if etag_matches(etag, if_none_match):
+                return Response(status_code=304, headers=headers)
+            orders, next_cursor = await fetch_orders_page(
+                history_db, user.id, page_size, cursor, projection, session=session, archive=order_archive
+            )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return FastJSONResponse(orders, headers=headers)
+
+@api_router.get("/courier-charges")
+async def get_courier_rate_table(if_none_match: str = Header(None)):
+    headers = {"ETag": RATE_TABLE_ETAG, "Cache-Control": "public, max-age=3600"}
+    if etag_matches(RATE_TABLE_ETAG, if_none_match):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=RATE_TABLE_BODY, media_type="application/json", headers=headers)
 
 @api_router.get("/courier-charges/{state}")
-async def get_courier_charges(state: str):
-    charges = get_courier_charge(state)
+async def get_courier_charges(state: str, pincode: Optional[str] = None):
+    charges = get_courier_charge(state, pincode)
     return {"state": state, "charges_per_kg": charges}
 
+# Reporting endpoints
+@api_router.get("/reports/sales")
+async def get_sales_report(
+    start: date,
+    end: date,
+    menu_item_id: Optional[str] = None,
+    state: Optional[str] = None,
+    x_api_key: str = Header(None),
+):
+    if not REPORTS_API_KEY:
+        raise HTTPException(status_code=503, detail="Reporting is not configured")
+    if x_api_key != REPORTS_API_KEY:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    
+    rows = await query_rollups(reporting_db, start, end, menu_item_id, state)
+    return FastJSONResponse({"start": start.isoformat(), "end": end.isoformat(), "rows": rows})
+
+# Health endpoints
+@api_router.get("/health/live")
+async def liveness():
+    return {"status": "ok"}
+
+@api_router.get("/health/ready")
+async def readiness():
+    if not worker_state["ready"]:
+        raise HTTPException(status_code=503, detail="Warming up")
+    
+    return {"status": "ready", "pid": os.getpid(), "cold_start_ms": worker_state["cold_start_seconds"] * 1000}
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def session_cache_metrics():
+    stats = session_cache.stats()
+    yield "# TYPE session_cache_lookups_total counter"
+    yield f'session_cache_lookups_total{{result="hit"}} {stats["hits"]}'
+    yield f'session_cache_lookups_total{{result="miss"}} {stats["misses"]}'
+    yield "# TYPE session_cache_evictions_total counter"
+    yield f'session_cache_evictions_total {stats["evictions"]}'
+    yield "# TYPE session_cache_entries gauge"
+    yield f'session_cache_entries {stats["size"]}'
+
+metrics.add_collector(session_cache_metrics)
+
+def worker_metrics():
+    yield "# TYPE app_cold_start_seconds gauge"
+    yield f'app_cold_start_seconds {worker_state["cold_start_seconds"] or 0}'
+    yield "# TYPE app_ready gauge"
+    yield f'app_ready {int(worker_state["ready"])}'
+
+metrics.add_collector(worker_metrics)
+
+def admission_metrics():
+    yield from admission_rejections.render()
+    yield "# TYPE event_loop_lag_seconds gauge"
+    yield f'event_loop_lag_seconds {loop_lag_monitor.lag_seconds}'
+    yield "# TYPE mongodb_pool_waiters gauge"
+    yield f'mongodb_pool_waiters {pool_wait_listener.waiting}'
+
+metrics.add_collector(admission_metrics)
+
+def cart_store_metrics():
+    stats = cart_store.stats()
+    yield "# TYPE cart_store_dirty_carts gauge"
+    yield f'cart_store_dirty_carts {stats["dirty"]}'
+    yield "# TYPE cart_store_flushes_total counter"
+    yield f'cart_store_flushes_total{{result="success"}} {stats["flushes"]}'
+    yield f'cart_store_flushes_total{{result="failure"}} {stats["flush_failures"]}'
+
+metrics.add_collector(cart_store_metrics)
+
+def inventory_metrics():
+    yield "# TYPE inventory_available_kg gauge"
+    for menu_item_id, available in inventory.available.items():
+        yield f'inventory_available_kg{{menu_item_id="{menu_item_id}"}} {available}'
+
+metrics.add_collector(inventory_metrics)
+
+def log_slow_request(scope: dict, elapsed: float, db_stats):
+    if elapsed >= SLOW_REQUEST_SECONDS:
+        logger.warning(
+            "Slow request %s %s took %.0f ms (%d DB commands, %.0f ms in DB)",
+            scope["method"], scope["path"], elapsed * 1000, db_stats.commands, db_stats.seconds * 1000,
+        )
+
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_BYTES)
+
+# Inside CORS so rejections still carry CORS headers for the browser
+app.add_middleware(
+    AdmissionMiddleware,
+    buckets=rate_limit_buckets,
+    pool_listener=pool_wait_listener,
+    lag_monitor=loop_lag_monitor,
+    limited_routes=RATE_LIMITED_ROUTES,
+    rate=RATE_LIMIT_RPS,
+    burst=RATE_LIMIT_BURST,
+    max_loop_lag_seconds=SHED_LOOP_LAG_SECONDS,
+    max_pool_waiters=SHED_DB_POOL_WAITERS,
+    exempt_prefixes=("/api/health", "/metrics"),
+    on_reject=lambda reason: admission_rejections.inc(reason=reason),
+    identify=rate_limit_identity,
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    # Order history paging and revalidation read these from cross-origin responses
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+# Added last so it wraps every other middleware
+app.add_middleware(MetricsMiddleware, metrics=metrics, on_request=log_slow_request)
@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# How far back each poll for revocations reaches past the newest one seen,
+# to catch logouts whose writes committed out of timestamp order
+REVOCATION_OVERLAP = timedelta(seconds=5)
+
+
+class SessionCache:
+    """Bounded LRU cache of session_token -> user with per-entry TTL.
+
+    An entry never outlives the session's own ``expires_at``, so a cached
+    user disappears at the same moment the session would have been rejected
+    by the database lookup.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: float = 60.0):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[Any, str, float]]" = OrderedDict()
+        self._tokens_by_user: Dict[str, Set[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_token: str) -> Optional[Any]:
+        entry = self._entries.get(session_token)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        user, user_id, deadline = entry
+        if deadline <= time.monotonic():
+            self._remove(session_token)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(session_token)
+        self.hits += 1
+        return user
+
+    def set(self, session_token: str, user: Any, user_id: str, expires_at: datetime):
+        remaining = (expires_at - datetime.utcnow()).total_seconds()
+        ttl = min(self.ttl_seconds, remaining)
+        if ttl <= 0 or self.max_size <= 0:
+            return
+
+        if session_token in self._entries:
+            self._remove(session_token)
+
+        self._entries[session_token] = (user, user_id, time.monotonic() + ttl)
+        self._tokens_by_user.setdefault(user_id, set()).add(session_token)
+
+        while len(self._entries) > self.max_size:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, session_token: str):
+        if session_token in self._entries:
+            self._remove(session_token)
+
+    def invalidate_user(self, user_id: str):
+        for session_token in list(self._tokens_by_user.get(user_id, ())):
+            self._remove(session_token)
+
+    def clear(self):
+        self._entries.clear()
+        self._tokens_by_user.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _remove(self, session_token: str):
+        _, user_id, _ = self._entries.pop(session_token)
+        tokens = self._tokens_by_user.get(user_id)
+        if tokens is not None:
+            tokens.discard(session_token)
+            if not tokens:
+                del self._tokens_by_user[user_id]
+
+
+class SessionRevocations:
+    """Carries logouts to the session cache of every worker.
+
+    A logout records its token in the session_revocations collection, and
+    each worker polls that collection every ``interval_seconds`` and drops
+    the tokens from its own cache. A revoked token therefore keeps working
+    on other workers for about ``interval_seconds`` at most, rather than
+    for the rest of its cache entry's TTL.
+    """
+
+    def __init__(self, cache: SessionCache, interval_seconds: float = 1.0):
+        self.cache = cache
+        self.interval_seconds = interval_seconds
+        self.db = None
+        self._newest: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self, db):
+        self.db = db
+        if self.interval_seconds > 0:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def revoke(self, session_token: str):
+        """Drop ``session_token`` here and, within a poll, on every other worker."""
+        self.cache.invalidate(session_token)
+        # Timestamped by MongoDB, so polls never depend on worker clocks
+        await self.db.session_revocations.update_one(
+            {"session_token": session_token},
+            {"$currentDate": {"revoked_at": True}},
+            upsert=True,
+        )
+
+    async def poll(self) -> int:
+        query = {}
+        if self._newest is not None:
+            query = {"revoked_at": {"$gt": self._newest - REVOCATION_OVERLAP}}
+        revoked = 0
+        async for revocation in self.db.session_revocations.find(query, {"_id": 0}):
+            self.cache.invalidate(revocation["session_token"])
+            if self._newest is None or revocation["revoked_at"] > self._newest:
+                self._newest = revocation["revoked_at"]
+            revoked += 1
+        return revoked
+
+    async def _watch(self):
+        while True:
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("Polling session revocations failed")
+            await asyncio.sleep(self.interval_seconds)
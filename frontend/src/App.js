@@ -1,4 +1,4 @@
-import React, { useState, useEffect, createContext, useContext } from 'react';
+import React, { useState, useEffect, useRef, createContext, useContext } from 'react';
 import './App.css';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
@@ -10,6 +10,7 @@ const AuthContext = createContext();
 const AuthProvider = ({ children }) => {
   const [user, setUser] = useState(null);
   const [sessionToken, setSessionToken] = useState(localStorage.getItem('sessionToken'));
+  const [bootstrapData, setBootstrapData] = useState(null);
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
@@ -20,14 +21,16 @@ const AuthProvider = ({ children }) => {
     }
   }, [sessionToken]);
 
+  // Profile, menu, cart and recent orders arrive in a single request
   const fetchProfile = async () => {
     try {
-      const response = await fetch(`${API}/auth/profile`, {
+      const response = await fetch(`${API}/bootstrap`, {
         headers: { Authorization: sessionToken }
       });
       if (response.ok) {
-        const userData = await response.json();
-        setUser(userData);
+        const data = await response.json();
+        setBootstrapData(data);
+        setUser(data.user);
       } else {
         localStorage.removeItem('sessionToken');
         setSessionToken(null);
@@ -47,14 +50,26 @@ const AuthProvider = ({ children }) => {
     localStorage.setItem('sessionToken', token);
   };
 
+  const consumeBootstrap = () => {
+    const data = bootstrapData;
+    setBootstrapData(null);
+    return data;
+  };
+
   const logout = () => {
+    if (sessionToken) {
+      fetch(`${API}/auth/logout`, {
+        method: 'POST',
+        headers: { Authorization: sessionToken }
+      }).catch((error) => console.error('Error logging out:', error));
+    }
     setUser(null);
     setSessionToken(null);
     localStorage.removeItem('sessionToken');
   };
 
   return (
-    <AuthContext.Provider value={{ user, sessionToken, login, logout, loading }}>
+    <AuthContext.Provider value={{ user, sessionToken, login, logout, loading, consumeBootstrap }}>
       {children}
     </AuthContext.Provider>
   );
@@ -220,47 +235,51 @@ const ProfilePage = () => {
 
 // Home Page Component (after login)
 const HomePage = () => {
-  const { user, logout } = useAuth();
+  const { user, logout, consumeBootstrap } = useAuth();
   const [currentView, setCurrentView] = useState('menu');
   const [menu, setMenu] = useState([]);
   const [cart, setCart] = useState({ items: [], total_amount: 0 });
   const [orders, setOrders] = useState([]);
+  const [ordersCursor, setOrdersCursor] = useState(null);
 
   useEffect(() => {
-    fetchMenu();
-    fetchCart();
-    fetchOrders();
+    const data = consumeBootstrap();
+    if (data) {
+      applyBootstrap(data);
+    } else {
+      fetchBootstrap();
+    }
   }, []);
 
-  const fetchMenu = async () => {
-    try {
-      const response = await fetch(`${API}/menu`);
-      const data = await response.json();
-      setMenu(data);
-    } catch (error) {
-      console.error('Error fetching menu:', error);
-    }
+  const applyBootstrap = (data) => {
+    setMenu(data.menu);
+    setCart(data.cart);
+    setOrders(data.orders);
+    setOrdersCursor(data.orders_next_cursor || null);
   };
 
-  const fetchCart = async () => {
+  const fetchBootstrap = async () => {
     try {
-      const response = await fetch(`${API}/cart`, {
+      const response = await fetch(`${API}/bootstrap`, {
         headers: { Authorization: localStorage.getItem('sessionToken') }
       });
       const data = await response.json();
-      setCart(data);
+      applyBootstrap(data);
     } catch (error) {
-      console.error('Error fetching cart:', error);
+      console.error('Error fetching initial data:', error);
     }
   };
 
-  const fetchOrders = async () => {
+  // Without a cursor, reloads the first page; with one, appends the next page
+  const fetchOrders = async (cursor = null) => {
     try {
-      const response = await fetch(`${API}/orders`, {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`${API}/orders${query}`, {
         headers: { Authorization: localStorage.getItem('sessionToken') }
       });
       const data = await response.json();
-      setOrders(data);
+      setOrders(cursor ? (previous) => [...previous, ...data] : data);
+      setOrdersCursor(response.headers.get('X-Next-Cursor'));
     } catch (error) {
       console.error('Error fetching orders:', error);
     }
@@ -365,7 +384,7 @@ const HomePage = () => {
         {currentView === 'menu' && <MenuView menu={menu} addToCart={addToCart} />}
         {currentView === 'cart' && <CartView cart={cart} removeFromCart={removeFromCart} setCurrentView={setCurrentView} />}
         {currentView === 'checkout' && <CheckoutView cart={cart} setCurrentView={setCurrentView} fetchOrders={fetchOrders} />}
-        {currentView === 'orders' && <OrdersView orders={orders} />}
+        {currentView === 'orders' && <OrdersView orders={orders} hasMore={Boolean(ordersCursor)} loadMore={() => fetchOrders(ordersCursor)} />}
       </main>
     </div>
   );
@@ -459,30 +478,79 @@ const CheckoutView = ({ cart, setCurrentView, fetchOrders }) => {
     phone: '',
     state: ''
   });
-  const [courierCharges, setCourierCharges] = useState(0);
+  const [rateTable, setRateTable] = useState(null);
   const [totalWeight, setTotalWeight] = useState(0);
+  const [stockError, setStockError] = useState(null);
+  const orderPlaced = useRef(false);
 
   useEffect(() => {
     const weight = cart.items?.reduce((sum, item) => sum + item.quantity, 0) || 0;
     setTotalWeight(weight);
+    reserveStock();
   }, [cart]);
 
   useEffect(() => {
-    if (formData.state) {
-      fetchCourierCharges();
+    fetchRateTable();
+    // Give the held stock back when the shopper leaves without ordering;
+    // placing the order consumes the reservation instead
+    return () => {
+      if (!orderPlaced.current) {
+        fetch(`${API}/checkout/reservation`, {
+          method: 'DELETE',
+          headers: { Authorization: localStorage.getItem('sessionToken') },
+          keepalive: true
+        }).catch((error) => console.error('Error releasing stock:', error));
+      }
+    };
+  }, []);
+
+  // Holds the cart's stock while the form is filled in; called again
+  // whenever the cart changes so the hold matches it
+  const reserveStock = async () => {
+    try {
+      const response = await fetch(`${API}/checkout/reservation`, {
+        method: 'POST',
+        headers: { Authorization: localStorage.getItem('sessionToken') }
+      });
+      if (response.status === 409) {
+        const data = await response.json();
+        setStockError(data.detail);
+      } else {
+        setStockError(null);
+      }
+    } catch (error) {
+      console.error('Error reserving stock:', error);
     }
-  }, [formData.state]);
+  };
 
-  const fetchCourierCharges = async () => {
+  const fetchRateTable = async () => {
     try {
-      const response = await fetch(`${API}/courier-charges/${formData.state}`);
+      const response = await fetch(`${API}/courier-charges`);
       const data = await response.json();
-      setCourierCharges(data.charges_per_kg);
+      setRateTable(data);
     } catch (error) {
       console.error('Error fetching courier charges:', error);
     }
   };
 
+  // Mirrors courier_rates.rate_for on the backend
+  const quoteCourierCharges = () => {
+    if (!rateTable || !formData.state) {
+      return 0;
+    }
+    const state = formData.state.toLowerCase().replace(/&/g, ' and ').replace(/[^a-z0-9]+/g, ' ').trim();
+    if (state in rateTable.states) {
+      return rateTable.states[state];
+    }
+    const pincode = formData.pincode.replace(/ /g, '');
+    if (/^[0-9]{6}$/.test(pincode) && pincode.slice(0, 3) in rateTable.pincode_prefixes) {
+      return rateTable.pincode_prefixes[pincode.slice(0, 3)];
+    }
+    return rateTable.default_per_kg;
+  };
+
+  const courierCharges = quoteCourierCharges();
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     try {
@@ -496,8 +564,12 @@ const CheckoutView = ({ cart, setCurrentView, fetchOrders }) => {
       });
       
       if (response.ok) {
+        orderPlaced.current = true;
         await fetchOrders();
         setCurrentView('orders');
+      } else if (response.status === 409) {
+        const data = await response.json();
+        setStockError(data.detail);
       }
     } catch (error) {
       console.error('Error creating order:', error);
@@ -558,6 +630,9 @@ const CheckoutView = ({ cart, setCurrentView, fetchOrders }) => {
                 <option value="other">Other States</option>
               </select>
             </div>
+            {stockError && (
+              <p className="text-sm text-red-600">{stockError}</p>
+            )}
             <button
               type="submit"
               className="w-full bg-red-500 hover:bg-red-600 text-white py-3 rounded-lg font-medium"
@@ -605,7 +680,7 @@ const CheckoutView = ({ cart, setCurrentView, fetchOrders }) => {
 };
 
 // Orders View Component
-const OrdersView = ({ orders }) => {
+const OrdersView = ({ orders, hasMore, loadMore }) => {
   if (orders.length === 0) {
     return (
       <div className="text-center py-16">
@@ -663,6 +738,16 @@ const OrdersView = ({ orders }) => {
           </div>
         ))}
       </div>
+      {hasMore && (
+        <div className="text-center mt-8">
+          <button
+            onClick={loadMore}
+            className="bg-white border border-red-500 text-red-500 hover:bg-red-50 px-6 py-2 rounded-lg font-medium"
+          >
+            Load more orders
+          </button>
+        </div>
+      )}
     </div>
   );
 };
@@ -0,0 +1,77 @@
+import unittest
+from unittest import mock
+
+from admission import AdmissionMiddleware, InMemoryTokenBuckets, LoopLagMonitor, PoolWaitListener
+
+
+class TestInMemoryTokenBuckets(unittest.IsolatedAsyncioTestCase):
+    """Per-key token buckets"""
+
+    async def test_burst_then_refill(self):
+        buckets = InMemoryTokenBuckets()
+        with mock.patch("admission.time.monotonic", return_value=100.0):
+            results = [await buckets.take("a", rate=2, burst=3) for _ in range(4)]
+        self.assertEqual([allowed for allowed, _ in results], [True, True, True, False])
+        self.assertAlmostEqual(results[-1][1], 0.5)
+
+        with mock.patch("admission.time.monotonic", return_value=100.5):
+            self.assertEqual(await buckets.take("a", rate=2, burst=3), (True, 0.0))
+            self.assertFalse((await buckets.take("a", rate=2, burst=3))[0])
+
+    async def test_refill_is_capped_at_the_burst(self):
+        buckets = InMemoryTokenBuckets()
+        with mock.patch("admission.time.monotonic", return_value=0.0):
+            await buckets.take("a", rate=1, burst=2)
+        with mock.patch("admission.time.monotonic", return_value=1000.0):
+            results = [(await buckets.take("a", rate=1, burst=2))[0] for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+
+    async def test_keys_are_independent(self):
+        buckets = InMemoryTokenBuckets()
+        with mock.patch("admission.time.monotonic", return_value=0.0):
+            await buckets.take("a", rate=1, burst=1)
+            self.assertFalse((await buckets.take("a", rate=1, burst=1))[0])
+            self.assertTrue((await buckets.take("b", rate=1, burst=1))[0])
+
+    async def test_evicts_the_idlest_key(self):
+        buckets = InMemoryTokenBuckets(max_keys=2)
+        with mock.patch("admission.time.monotonic", return_value=0.0):
+            await buckets.take("a", rate=1, burst=1)
+            await buckets.take("b", rate=1, burst=1)
+            await buckets.take("a", rate=1, burst=1)
+            await buckets.take("c", rate=1, burst=1)
+            self.assertEqual(list(buckets._buckets), ["a", "c"])
+            # A forgotten key starts again with a full bucket
+            self.assertTrue((await buckets.take("b", rate=1, burst=1))[0])
+
+
+class TestClientKey(unittest.IsolatedAsyncioTestCase):
+    """Which bucket a request draws from"""
+
+    def middleware(self, identify=None):
+        async def app(scope, receive, send):
+            pass
+
+        return AdmissionMiddleware(
+            app, InMemoryTokenBuckets(), PoolWaitListener(), LoopLagMonitor(),
+            limited_routes=[("POST", "/api/cart/")], rate=1, burst=1,
+            max_loop_lag_seconds=0, max_pool_waiters=0, identify=identify,
+        )
+
+    @staticmethod
+    def scope(token=None):
+        headers = [(b"authorization", token.encode())] if token else []
+        return {"type": "http", "method": "POST", "path": "/api/cart/add", "headers": headers,
+                "client": ("10.0.0.1", 5000)}
+
+    async def test_resolved_tokens_are_keyed_by_user(self):
+        async def identify(token):
+            return {"good": "u1"}.get(token)
+
+        middleware = self.middleware(identify)
+        self.assertEqual(await middleware._client_key(self.scope("good")), "user:u1")
+        self.assertEqual(await middleware._client_key(self.scope("made-up")), "ip:10.0.0.1")
+        self.assertEqual(await middleware._client_key(self.scope()), "ip:10.0.0.1")
+
+    async def test_without_identify_everything_is_keyed_by_address(self):
+        self.assertEqual(await self.middleware()._client_key(self.scope("good")), "ip:10.0.0.1")
@@ -0,0 +1,91 @@
+import asyncio
+import unittest
+from contextlib import asynccontextmanager
+
+from mongomock_motor import AsyncMongoMockClient
+
+from cart_store import InProcessCartCache, WriteBackCartStore
+from cart_updates import CartChange
+from checkout import claim_cart
+
+
+class SharedCartCache(InProcessCartCache):
+    """A hot cache shared by several stores in one process, standing in for Redis."""
+
+    shared = True
+
+    def __init__(self):
+        super().__init__()
+        self.locked = set()
+
+    @asynccontextmanager
+    async def lock(self, user_id: str, wait: bool = True):
+        while user_id in self.locked:
+            if not wait:
+                yield False
+                return
+            await asyncio.sleep(0.001)
+        self.locked.add(user_id)
+        try:
+            yield True
+        finally:
+            self.locked.discard(user_id)
+
+
+class TestWriteBackCartStore(unittest.IsolatedAsyncioTestCase):
+    """Two workers sharing one hot cache and one carts collection"""
+
+    async def asyncSetUp(self):
+        self.db = AsyncMongoMockClient()["test_cart_store"]
+        await self.db.carts.create_index("user_id", unique=True)
+        hot = SharedCartCache()
+        # A long interval keeps the background flusher out of the way
+        self.worker_a = WriteBackCartStore(hot, flush_interval_seconds=3600)
+        self.worker_b = WriteBackCartStore(hot, flush_interval_seconds=3600)
+        self.worker_a.start(self.db)
+        self.worker_b.start(self.db)
+
+    async def asyncTearDown(self):
+        await self.worker_a.stop()
+        await self.worker_b.stop()
+
+    async def stored(self):
+        return await self.db.carts.find_one({"user_id": "u1"}, {"_id": 0})
+
+    async def test_flush_never_replaces_a_newer_stored_cart(self):
+        cart = await self.worker_a.apply("u1", [CartChange("add", "chicken", 1)])
+        await self.db.carts.insert_one({**cart, "items": {"chicken": 5}, "version": cart["version"] + 1})
+        await self.worker_a.flush()
+        self.assertEqual((await self.stored())["items"], {"chicken": 5})
+
+    async def test_flush_replaces_an_older_stored_cart(self):
+        await self.worker_a.apply("u1", [CartChange("add", "chicken", 1)])
+        await self.worker_a.flush()
+        await self.worker_a.apply("u1", [CartChange("add", "mutton", 2)])
+        await self.worker_a.flush()
+        stored = await self.stored()
+        self.assertEqual((stored["items"], stored["version"]), ({"chicken": 1, "mutton": 2}, 2))
+
+    async def test_flush_skips_a_cart_held_by_a_checkout(self):
+        await self.worker_b.apply("u1", [CartChange("add", "chicken", 2)])
+        async with self.worker_a.checkout("u1"):
+            self.assertIsNotNone(await claim_cart(self.db, "u1"))
+            # The hot copy is still there until checkout ends; it must not be written back
+            await self.worker_b.flush()
+            self.assertIsNone(await self.stored())
+        await self.worker_b.flush()
+        self.assertIsNone(await self.stored())
+        self.assertIsNone(await self.worker_b.get("u1"))
+
+    async def test_writes_wait_for_a_checkout_elsewhere(self):
+        await self.worker_a.apply("u1", [CartChange("add", "chicken", 2)])
+        async with self.worker_a.checkout("u1"):
+            write = asyncio.create_task(self.worker_b.apply("u1", [CartChange("add", "mutton", 1)]))
+            await asyncio.sleep(0.05)
+            self.assertFalse(write.done())
+            await claim_cart(self.db, "u1")
+        cart = await write
+        # Applied to the cart left after checkout, not lost with the hot copy
+        self.assertEqual(cart["items"], {"mutton": 1})
+        await self.worker_b.flush()
+        self.assertEqual((await self.stored())["items"], {"mutton": 1})
@@ -0,0 +1,107 @@
+import unittest
+
+from mongomock_motor import AsyncMongoMockClient
+
+from cart_updates import CartChange, _fold, apply_cart_update, apply_changes, cart_update
+from documents import SCHEMA_VERSION
+
+
+class TestFold(unittest.TestCase):
+    """Net effect of a batch of cart changes per item"""
+
+    def test_adds_accumulate(self):
+        changes = [CartChange("add", "chicken", 1), CartChange("add", "chicken", 2)]
+        self.assertEqual(_fold(changes), {"chicken": ("inc", 3)})
+
+    def test_set_then_add_stays_a_set(self):
+        changes = [CartChange("set", "chicken", 2), CartChange("add", "chicken", 1)]
+        self.assertEqual(_fold(changes), {"chicken": ("set", 3)})
+
+    def test_remove_then_add_sets(self):
+        changes = [CartChange("remove", "chicken"), CartChange("add", "chicken", 2)]
+        self.assertEqual(_fold(changes), {"chicken": ("set", 2)})
+
+    def test_set_to_zero_removes(self):
+        changes = [CartChange("add", "chicken", 2), CartChange("set", "chicken", 0)]
+        self.assertEqual(_fold(changes), {"chicken": ("unset", 0)})
+
+    def test_items_are_independent(self):
+        changes = [CartChange("add", "chicken", 1), CartChange("remove", "mutton")]
+        self.assertEqual(_fold(changes), {"chicken": ("inc", 1), "mutton": ("unset", 0)})
+
+    def test_update_document(self):
+        update = cart_update([CartChange("add", "chicken", 1), CartChange("remove", "mutton")])
+        self.assertEqual(update["$inc"], {"version": 1, "items.chicken": 1})
+        self.assertEqual(update["$unset"], {"items.mutton": ""})
+
+    def test_rejects_field_paths(self):
+        for menu_item_id in ("", "a.b", "$where"):
+            with self.assertRaises(ValueError):
+                cart_update([CartChange("add", menu_item_id, 1)])
+
+
+class TestApplyChanges(unittest.TestCase):
+    """In-memory carts change exactly like stored ones"""
+
+    def test_new_cart(self):
+        cart = apply_changes(None, "u1", [CartChange("add", "chicken", 2)])
+        self.assertEqual(cart["user_id"], "u1")
+        self.assertEqual(cart["v"], SCHEMA_VERSION)
+        self.assertEqual(cart["items"], {"chicken": 2})
+        self.assertEqual(cart["version"], 1)
+
+    def test_does_not_mutate_the_input(self):
+        cart = apply_changes(None, "u1", [CartChange("add", "chicken", 2)])
+        updated = apply_changes(cart, "u1", [CartChange("add", "chicken", 1), CartChange("set", "mutton", 3)])
+        self.assertEqual(cart["items"], {"chicken": 2})
+        self.assertEqual(updated["items"], {"chicken": 3, "mutton": 3})
+        self.assertEqual(updated["version"], 2)
+        self.assertEqual(updated["created_at"], cart["created_at"])
+
+    def test_remove(self):
+        cart = apply_changes(None, "u1", [CartChange("add", "chicken", 2), CartChange("add", "mutton", 1)])
+        cart = apply_changes(cart, "u1", [CartChange("remove", "chicken")])
+        self.assertEqual(cart["items"], {"mutton": 1})
+
+
+class TestApplyCartUpdate(unittest.IsolatedAsyncioTestCase):
+    """One find_one_and_update per batch against the carts collection"""
+
+    async def asyncSetUp(self):
+        self.db = AsyncMongoMockClient()["test_cart_updates"]
+        # Upserts rely on the unique index to meet carts in an older schema
+        await self.db.carts.create_index("user_id", unique=True)
+
+    async def test_creates_and_updates_the_cart(self):
+        cart = await apply_cart_update(self.db, "u1", [CartChange("add", "chicken", 2)])
+        self.assertEqual(cart["items"], {"chicken": 2})
+        self.assertEqual(cart["version"], 1)
+
+        cart = await apply_cart_update(self.db, "u1", [CartChange("add", "chicken", 1), CartChange("set", "mutton", 4)])
+        self.assertEqual(cart["items"], {"chicken": 3, "mutton": 4})
+        self.assertEqual(cart["version"], 2)
+        self.assertEqual(await self.db.carts.count_documents({}), 1)
+
+    async def test_matches_apply_changes(self):
+        changes = [[CartChange("add", "chicken", 2)], [CartChange("remove", "chicken"), CartChange("add", "mutton", 1)]]
+        cart = None
+        for batch in changes:
+            stored = await apply_cart_update(self.db, "u1", batch)
+            cart = apply_changes(cart, "u1", batch)
+        self.assertEqual(stored["items"], cart["items"])
+        self.assertEqual(stored["version"], cart["version"])
+
+    async def test_without_upsert_leaves_missing_carts_missing(self):
+        self.assertIsNone(await apply_cart_update(self.db, "u1", [CartChange("remove", "chicken")], upsert=False))
+        self.assertEqual(await self.db.carts.count_documents({}), 0)
+
+    async def test_upgrades_a_version_1_cart(self):
+        await self.db.carts.insert_one({
+            "id": "c1", "user_id": "u1", "total_amount": 10.0,
+            "items": [{"menu_item_id": "chicken", "quantity": 1, "price": 5.0},
+                      {"menu_item_id": "chicken", "quantity": 1, "price": 5.0}],
+        })
+        cart = await apply_cart_update(self.db, "u1", [CartChange("add", "mutton", 1)])
+        self.assertEqual(cart["v"], SCHEMA_VERSION)
+        self.assertEqual(cart["items"], {"chicken": 2, "mutton": 1})
+        self.assertEqual(await self.db.carts.count_documents({}), 1)
@@ -0,0 +1,88 @@
+import asyncio
+import unittest
+
+from mongomock_motor import AsyncMongoMockClient
+
+from checkout import (
+    IdempotencyConflict,
+    abandon_idempotent_request,
+    begin_idempotent_request,
+    claim_cart,
+    complete_idempotent_request,
+    request_fingerprint,
+    restore_cart,
+)
+
+
+class TestIdempotencyKeys(unittest.IsolatedAsyncioTestCase):
+    """Idempotency-Key records replay the first response"""
+
+    async def asyncSetUp(self):
+        self.db = AsyncMongoMockClient()["test_checkout"]
+        await self.db.idempotency_keys.create_index([("user_id", 1), ("key", 1)], unique=True)
+        self.fingerprint = request_fingerprint({"pincode": "534201", "state": "telangana"})
+
+    async def test_new_key_proceeds(self):
+        self.assertIsNone(await begin_idempotent_request(self.db, "u1", "k1", self.fingerprint))
+
+    async def test_completed_key_replays_the_response(self):
+        await begin_idempotent_request(self.db, "u1", "k1", self.fingerprint)
+        await complete_idempotent_request(self.db, "u1", "k1", {"id": "o1"})
+        self.assertEqual(await begin_idempotent_request(self.db, "u1", "k1", self.fingerprint), {"id": "o1"})
+
+    async def test_key_in_progress_conflicts(self):
+        await begin_idempotent_request(self.db, "u1", "k1", self.fingerprint)
+        with self.assertRaises(IdempotencyConflict) as raised:
+            await begin_idempotent_request(self.db, "u1", "k1", self.fingerprint)
+        self.assertEqual(raised.exception.status_code, 409)
+
+    async def test_key_reused_for_another_request(self):
+        await begin_idempotent_request(self.db, "u1", "k1", self.fingerprint)
+        await complete_idempotent_request(self.db, "u1", "k1", {"id": "o1"})
+        with self.assertRaises(IdempotencyConflict) as raised:
+            await begin_idempotent_request(self.db, "u1", "k1", request_fingerprint({"pincode": "500001"}))
+        self.assertEqual(raised.exception.status_code, 422)
+
+    async def test_keys_are_per_user(self):
+        await begin_idempotent_request(self.db, "u1", "k1", self.fingerprint)
+        self.assertIsNone(await begin_idempotent_request(self.db, "u2", "k1", self.fingerprint))
+
+    async def test_abandoned_key_can_be_retried(self):
+        await begin_idempotent_request(self.db, "u1", "k1", self.fingerprint)
+        await abandon_idempotent_request(self.db, "u1", "k1")
+        self.assertIsNone(await begin_idempotent_request(self.db, "u1", "k1", self.fingerprint))
+
+    async def test_abandon_keeps_completed_keys(self):
+        await begin_idempotent_request(self.db, "u1", "k1", self.fingerprint)
+        await complete_idempotent_request(self.db, "u1", "k1", {"id": "o1"})
+        await abandon_idempotent_request(self.db, "u1", "k1")
+        self.assertEqual(await begin_idempotent_request(self.db, "u1", "k1", self.fingerprint), {"id": "o1"})
+
+
+class TestClaimCart(unittest.IsolatedAsyncioTestCase):
+    """A cart turns into at most one order"""
+
+    async def asyncSetUp(self):
+        self.db = AsyncMongoMockClient()["test_checkout"]
+
+    async def test_claims_once(self):
+        await self.db.carts.insert_one({"user_id": "u1", "v": 2, "items": {"chicken": 2}})
+        claimed = await asyncio.gather(*(claim_cart(self.db, "u1") for _ in range(3)))
+        self.assertEqual(sum(cart is not None for cart in claimed), 1)
+        self.assertEqual(await self.db.carts.count_documents({}), 0)
+
+    async def test_empty_carts_are_not_claimed(self):
+        await self.db.carts.insert_many([
+            {"user_id": "u1", "v": 2, "items": {}},
+            {"user_id": "u2", "v": 2},
+        ])
+        for user_id in ("u1", "u2", "u3"):
+            self.assertIsNone(await claim_cart(self.db, user_id))
+        self.assertEqual(await self.db.carts.count_documents({}), 2)
+
+    async def test_restore_puts_the_cart_back(self):
+        await self.db.carts.insert_one({"user_id": "u1", "v": 2, "items": {"chicken": 2}})
+        cart = await claim_cart(self.db, "u1")
+        await restore_cart(self.db, cart)
+        restored = await self.db.carts.find_one({"user_id": "u1"}, {"_id": 0})
+        self.assertEqual(restored, {"user_id": "u1", "v": 2, "items": {"chicken": 2}})
@@ -0,0 +1,59 @@
+import gzip
+import unittest
+
+from compression import CompressionMiddleware
+
+
+def json_app(body: bytes, headers: list):
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+            + headers,
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    return app
+
+
+class TestCompressionMiddleware(unittest.IsolatedAsyncioTestCase):
+    """Negotiated compression of JSON responses"""
+
+    async def request(self, app, accept_encoding="gzip"):
+        scope = {"type": "http", "method": "GET", "path": "/",
+                 "headers": [(b"accept-encoding", accept_encoding.encode())]}
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await CompressionMiddleware(app)(scope, None, send)
+        start, body = messages
+        headers = {name.decode(): value.decode() for name, value in start["headers"]}
+        return headers, body["body"]
+
+    async def test_large_bodies_are_compressed(self):
+        body = b'{"rates": [' + b"1, " * 600 + b"1]}"
+        headers, sent = await self.request(json_app(body, []))
+        self.assertEqual(headers["content-encoding"], "gzip")
+        self.assertEqual(headers["vary"], "Accept-Encoding")
+        self.assertEqual(gzip.decompress(sent), body)
+
+    async def test_small_bodies_are_sent_as_is(self):
+        headers, sent = await self.request(json_app(b"{}", []))
+        self.assertNotIn("content-encoding", headers)
+        self.assertEqual(sent, b"{}")
+
+    async def test_compressed_responses_weaken_strong_etags(self):
+        body = b"[" + b"1," * 600 + b"1]"
+        headers, _ = await self.request(json_app(body, [(b"etag", b'"abc"')]))
+        self.assertEqual(headers["etag"], 'W/"abc"')
+
+        headers, _ = await self.request(json_app(body, [(b"etag", b'W/"abc"')]))
+        self.assertEqual(headers["etag"], 'W/"abc"')
+
+    async def test_uncompressed_responses_keep_strong_etags(self):
+        body = b"[" + b"1," * 600 + b"1]"
+        headers, _ = await self.request(json_app(body, [(b"etag", b'"abc"')]), accept_encoding="identity")
+        self.assertEqual(headers["etag"], '"abc"')
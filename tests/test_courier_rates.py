@@ -0,0 +1,45 @@
+import json
+import unittest
+
+from courier_rates import DEFAULT_RATE, RATE_TABLE_BODY, ZONE_RATES, canonical_state, rate_for
+
+AP_RATE = ZONE_RATES["andhra_pradesh"]
+TS_RATE = ZONE_RATES["telangana"]
+
+
+class TestRateFor(unittest.TestCase):
+    """Per-kg courier rates by state, then pincode"""
+
+    def test_states_and_aliases(self):
+        for state in ("Andhra Pradesh", "andhra-pradesh", "ANDHRA", "AP", " ap "):
+            self.assertEqual(rate_for(state), AP_RATE, state)
+        for state in ("Telangana", "telangana ", "TS", "tg"):
+            self.assertEqual(rate_for(state), TS_RATE, state)
+        for state in ("Tamil Nadu", "Jammu & Kashmir", "other"):
+            self.assertEqual(rate_for(state), DEFAULT_RATE, state)
+
+    def test_abbreviations_never_match_inside_other_names(self):
+        # Substring checks used to rate these as Andhra Pradesh or Telangana
+        for state in ("Hapur", "Pratapgarh", "Arunachal Pradesh - Itanagar Heights", "Gujarat, Surat Outskirts"):
+            self.assertEqual(rate_for(state), DEFAULT_RATE, state)
+
+    def test_pincode_is_used_when_the_state_is_not_recognised(self):
+        self.assertEqual(rate_for("", "500 001"), TS_RATE)
+        self.assertEqual(rate_for("Hapur", "530001"), AP_RATE)
+        self.assertEqual(rate_for(None, "5300"), DEFAULT_RATE)
+        self.assertEqual(rate_for("nowhere", "110001"), DEFAULT_RATE)
+
+    def test_a_recognised_state_wins_over_the_pincode(self):
+        self.assertEqual(rate_for("Karnataka", "500001"), DEFAULT_RATE)
+        self.assertEqual(rate_for("AP", "500001"), AP_RATE)
+
+    def test_canonical_state(self):
+        self.assertEqual(canonical_state(" A&N-Islands "), "a and n islands")
+        self.assertEqual(canonical_state("Andhra"), "andhra pradesh")
+        self.assertEqual(canonical_state(None), "")
+
+    def test_rate_table_lists_aliases(self):
+        table = json.loads(RATE_TABLE_BODY)
+        self.assertEqual(table["default_per_kg"], DEFAULT_RATE)
+        self.assertEqual((table["states"]["ap"], table["states"]["ts"]), (AP_RATE, TS_RATE))
+        self.assertEqual(table["pincode_prefixes"]["500"], TS_RATE)
@@ -0,0 +1,92 @@
+import unittest
+from datetime import datetime
+
+from mongomock_motor import AsyncMongoMockClient
+
+from documents import SCHEMA_VERSION, cart_view, migrate, new_order_document, order_view, upgrade_cart, upgrade_order
+
+V1_CART = {
+    "id": "c1", "user_id": "u1", "total_amount": 1050.0, "created_at": datetime(2024, 1, 1),
+    "items": [
+        {"menu_item_id": "chicken", "quantity": 1, "price": 350.0},
+        {"menu_item_id": "mutton", "quantity": 1, "price": 700.0},
+        {"menu_item_id": "chicken", "quantity": 2, "price": 350.0},
+    ],
+}
+
+V1_ORDER = {
+    "id": "o1", "user_id": "u1", "status": "pending", "created_at": datetime(2024, 1, 1),
+    "subtotal": 1050.5, "courier_charges": 240.0, "total_amount": 1290.5,
+    "items": [
+        {"menu_item_id": "chicken", "quantity": 1, "price": 350.25},
+        {"menu_item_id": "chicken", "quantity": 1, "price": 350.25},
+        {"menu_item_id": "mutton", "quantity": 1, "price": 350.0},
+    ],
+}
+
+
+class TestUpgrades(unittest.TestCase):
+    """Version 1 documents in the version 2 schema"""
+
+    def test_cart(self):
+        cart = upgrade_cart(V1_CART)
+        self.assertEqual(cart["v"], SCHEMA_VERSION)
+        self.assertEqual(cart["items"], {"chicken": 3, "mutton": 1})
+        self.assertNotIn("id", cart)
+        self.assertNotIn("total_amount", cart)
+        self.assertEqual(cart["created_at"], V1_CART["created_at"])
+
+    def test_order_amounts_become_paise(self):
+        order = upgrade_order(V1_ORDER)
+        self.assertEqual(order["v"], SCHEMA_VERSION)
+        self.assertEqual(order["items"], {"chicken": [2, 35025], "mutton": [1, 35000]})
+        self.assertEqual((order["subtotal"], order["courier_charges"], order["total_amount"]), (105050, 24000, 129050))
+
+    def test_current_documents_are_unchanged(self):
+        cart = upgrade_cart(V1_CART)
+        order = upgrade_order(V1_ORDER)
+        self.assertIs(upgrade_cart(cart), cart)
+        self.assertIs(upgrade_order(order), order)
+
+    def test_views_agree_across_versions(self):
+        upgraded = order_view(upgrade_order(V1_ORDER))
+        self.assertEqual(upgraded["total_amount"], V1_ORDER["total_amount"])
+        self.assertEqual(upgraded["items"], [
+            {"menu_item_id": "chicken", "quantity": 2, "price": 350.25},
+            {"menu_item_id": "mutton", "quantity": 1, "price": 350.0},
+        ])
+
+    def test_cart_view_prices_from_the_catalog(self):
+        view = cart_view(upgrade_cart(V1_CART), {"chicken": 40000}, {"chicken": 5})
+        self.assertEqual(view["items"], [{"menu_item_id": "chicken", "quantity": 3, "price": 400.0, "available_kg": 5}])
+        self.assertEqual(view["total_amount"], 1200.0)
+
+    def test_new_order_totals(self):
+        order = new_order_document("u1", {"chicken": [2, 40000]}, 16000, state="telangana")
+        self.assertEqual((order["subtotal"], order["total_amount"]), (80000, 96000))
+        self.assertEqual(order["state"], "telangana")
+
+
+class TestMigrate(unittest.IsolatedAsyncioTestCase):
+    """Bulk rewrite of older documents"""
+
+    async def asyncSetUp(self):
+        self.db = AsyncMongoMockClient()["test_documents"]
+
+    async def test_rewrites_only_older_documents(self):
+        await self.db.orders.insert_many([{**V1_ORDER, "id": f"o{i}"} for i in range(5)])
+        await self.db.orders.insert_one(new_order_document("u1", {"chicken": [1, 40000]}, 8000))
+        current = await self.db.orders.find_one({"v": SCHEMA_VERSION}, {"_id": 0})
+
+        self.assertEqual(await migrate(self.db, "orders", batch_size=2), 5)
+        orders = await self.db.orders.find({}, {"_id": 0}).to_list(None)
+        self.assertTrue(all(order["v"] == SCHEMA_VERSION for order in orders))
+        self.assertEqual(sorted(order["id"] for order in orders), sorted([f"o{i}" for i in range(5)] + [current["id"]]))
+        self.assertEqual(await self.db.orders.find_one({"id": current["id"]}, {"_id": 0}), current)
+
+    async def test_rerun_is_a_no_op(self):
+        await self.db.carts.insert_one(dict(V1_CART))
+        self.assertEqual(await migrate(self.db, "carts"), 1)
+        self.assertEqual(await migrate(self.db, "carts"), 0)
+        cart = await self.db.carts.find_one({"user_id": "u1"}, {"_id": 0})
+        self.assertEqual(cart["items"], {"chicken": 3, "mutton": 1})
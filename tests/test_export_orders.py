@@ -0,0 +1,102 @@
+import json
+import re
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from mongomock_motor import AsyncMongoMockClient
+
+from courier_rates import canonical_state, state_pattern
+from documents import new_order_document
+from export_orders import ExportFormat, _NdjsonWriter, archived_orders_filter, export_orders, orders_filter
+from order_archive import OrderArchive
+
+SPELLINGS = [
+    "Andhra Pradesh", "andhra-pradesh", " AP ", "A.P.", "Andhra", "andhrapradesh", "Telangana", "TS",
+    "Jammu & Kashmir", "jammu&kashmir", "Jammu and Kashmir", "jammuand kashmir", "Maharashtra", "Tamil Nadu", "",
+]
+
+
+class TestStatePattern(unittest.TestCase):
+    """The --state filter matches what canonical_state would"""
+
+    def test_matches_exactly_the_same_canonical_state(self):
+        for state in ("andhra pradesh", "AP", "ts", "J&K", "jammu and kashmir", "tamil nadu"):
+            pattern = re.compile(state_pattern(state), re.IGNORECASE)
+            for spelling in SPELLINGS:
+                with self.subTest(state=state, spelling=spelling):
+                    self.assertEqual(bool(pattern.match(spelling)), canonical_state(spelling) == canonical_state(state))
+
+
+class TestExportOrders(unittest.IsolatedAsyncioTestCase):
+    """Exports cover the hot orders and the archived ones"""
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = AsyncMongoMockClient()["test_export_orders"]
+        self.archive = OrderArchive(f"{self.directory.name}/archive")
+        orders = []
+        for day, state in enumerate(["Andhra Pradesh", "AP", "maharashtra", "andhra", "Telangana", "A.P."]):
+            order = new_order_document("u1", {"chicken": [1, 40000]}, 8000, state=state, pincode="500001")
+            order["created_at"] = datetime(2024, 1, 1) + timedelta(days=20 * day)
+            orders.append(order)
+        await self.db.orders.insert_many(orders)
+        # The first three (January and February) are archived
+        await self.archive.archive(self.db, datetime(2024, 3, 1))
+        self.ids_by_state = {}
+        for order in orders:
+            self.ids_by_state.setdefault(canonical_state(order["state"]), []).append(order["id"])
+        self.ids = [order["id"] for order in orders]
+
+    async def asyncTearDown(self):
+        self.directory.cleanup()
+
+    async def export(self, state=None, start=None, end=None, resume=False):
+        output = Path(self.directory.name) / "orders.ndjson"
+        query = orders_filter(start, end, state, None, [])
+        rows = await export_orders(
+            self.db, output, ExportFormat.ndjson, query, 2, resume=resume, force=True, archive=self.archive,
+            start=start.date() if start else None, end=end.date() if end else None,
+            keep=archived_orders_filter(state, None, []),
+        )
+        ids = [json.loads(line)["id"] for line in output.read_text().splitlines()]
+        if not resume:
+            self.assertEqual(len(ids), rows)
+        return ids
+
+    async def test_archived_orders_come_first(self):
+        self.assertEqual(await self.db.orders.count_documents({}), 3)
+        self.assertEqual(await self.export(), self.ids)
+
+    async def test_state_matches_every_spelling(self):
+        self.assertEqual(await self.export(state="ap"), self.ids_by_state["andhra pradesh"])
+        self.assertEqual(await self.export(state="Maharashtra"), self.ids_by_state["maharashtra"])
+
+    async def test_dates_apply_to_archived_orders(self):
+        self.assertEqual(await self.export(start=datetime(2024, 1, 15), end=datetime(2024, 3, 15)), self.ids[1:4])
+
+    async def test_resume_after_an_archived_batch(self):
+        write = _NdjsonWriter.write
+        writes = 0
+
+        def interrupted_write(self, orders):
+            nonlocal writes
+            writes += 1
+            if writes == 2:
+                raise OSError("disk full")
+            return write(self, orders)
+
+        _NdjsonWriter.write = interrupted_write
+        try:
+            with self.assertRaises(OSError):
+                await self.export()
+        finally:
+            _NdjsonWriter.write = write
+        self.assertEqual(await self.export(resume=True), self.ids)
+
+    async def test_without_an_archive_only_hot_orders_are_exported(self):
+        output = Path(self.directory.name) / "orders.ndjson"
+        rows = await export_orders(self.db, output, ExportFormat.ndjson, {}, 2, resume=False, force=True)
+        self.assertEqual(rows, 3)
+        self.assertEqual([json.loads(line)["id"] for line in output.read_text().splitlines()], self.ids[3:])
@@ -0,0 +1,124 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from inventory import Inventory, OutOfStock, ReservationLost
+
+
+class TestInventory(unittest.IsolatedAsyncioTestCase):
+    """Sharded stock counters and per-user reservations"""
+
+    async def asyncSetUp(self):
+        self.db = AsyncMongoMockClient()["test_inventory"]
+        await self.db.stock.create_index([("menu_item_id", 1), ("shard", 1)], unique=True)
+        await self.db.stock_reservations.create_index("user_id", unique=True)
+        self.inventory = Inventory(reservation_ttl_seconds=60)
+        self.inventory.start(self.db, 0)
+
+    async def available(self, menu_item_id: str) -> int:
+        await self.inventory.refresh()
+        return self.inventory.available.get(menu_item_id, 0)
+
+    async def test_adjust_spreads_stock_over_shards(self):
+        await self.inventory.adjust("prawns_big", 10, shards=4)
+        shards = await self.db.stock.find({"menu_item_id": "prawns_big"}, {"_id": 0}).sort("shard", 1).to_list(None)
+        self.assertEqual([shard["available_kg"] for shard in shards], [3, 3, 2, 2])
+        self.assertEqual(await self.available("prawns_big"), 10)
+
+    async def test_take_gathers_from_several_shards(self):
+        await self.inventory.adjust("prawns_big", 8, shards=4)
+        await self.inventory.adjust("prawns_big", -7)
+        self.assertEqual(await self.available("prawns_big"), 1)
+
+    async def test_take_more_than_available_changes_nothing(self):
+        await self.inventory.adjust("prawns_big", 5, shards=3)
+        with self.assertRaises(OutOfStock) as raised:
+            await self.inventory.adjust("prawns_big", -6)
+        self.assertEqual(raised.exception.available_kg, 5)
+        self.assertEqual(await self.available("prawns_big"), 5)
+
+    async def test_concurrent_takes_never_oversell(self):
+        await self.inventory.adjust("mutton", 10, shards=4)
+        results = await asyncio.gather(
+            *(self.inventory.reserve(f"u{i}", {"mutton": 1}) for i in range(12)), return_exceptions=True
+        )
+        self.assertEqual(sum(not isinstance(result, Exception) for result in results), 10)
+        self.assertTrue(all(isinstance(result, OutOfStock) for result in results if isinstance(result, Exception)))
+        self.assertEqual(await self.available("mutton"), 0)
+
+    async def test_reserve_takes_only_the_difference(self):
+        await self.inventory.adjust("prawns_big", 10, shards=2)
+        first = await self.inventory.reserve("u1", {"prawns_big": 6})
+        self.assertEqual(await self.available("prawns_big"), 4)
+
+        second = await self.inventory.reserve("u1", {"prawns_big": 2})
+        self.assertEqual(second.items, {"prawns_big": 2})
+        self.assertEqual(second.version, first.version + 1)
+        self.assertEqual(await self.available("prawns_big"), 8)
+
+    async def test_failed_reserve_keeps_the_previous_hold(self):
+        await self.inventory.adjust("prawns_big", 10, shards=2)
+        await self.inventory.reserve("u1", {"prawns_big": 4})
+        with self.assertRaises(OutOfStock):
+            await self.inventory.reserve("u1", {"prawns_big": 11})
+        held = await self.db.stock_reservations.find_one({"user_id": "u1"})
+        self.assertEqual(held["items"], {"prawns_big": 4})
+        self.assertEqual(await self.available("prawns_big"), 6)
+
+    async def test_untracked_items_are_not_reserved(self):
+        await self.inventory.adjust("prawns_big", 10)
+        reservation = await self.inventory.reserve("u1", {"prawns_big": 1, "chicken": 100})
+        self.assertEqual(reservation.items, {"prawns_big": 1})
+
+    async def test_release_returns_the_stock(self):
+        await self.inventory.adjust("prawns_big", 10, shards=2)
+        await self.inventory.reserve("u1", {"prawns_big": 6})
+        await self.inventory.release("u1")
+        self.assertEqual(await self.available("prawns_big"), 10)
+        self.assertEqual(await self.db.stock_reservations.count_documents({}), 0)
+
+    async def test_consume_keeps_the_stock_taken(self):
+        await self.inventory.adjust("prawns_big", 10)
+        reservation = await self.inventory.reserve("u1", {"prawns_big": 6})
+        await self.inventory.consume(reservation)
+        await self.inventory.release("u1")
+        self.assertEqual(await self.available("prawns_big"), 4)
+
+    async def test_restock_returns_a_consumed_reservation(self):
+        await self.inventory.adjust("prawns_big", 10, shards=2)
+        reservation = await self.inventory.reserve("u1", {"prawns_big": 6})
+        await self.inventory.consume(reservation)
+        await self.inventory.restock(reservation)
+        self.assertEqual(await self.available("prawns_big"), 10)
+
+    async def test_consume_of_a_changed_reservation_fails(self):
+        await self.inventory.adjust("prawns_big", 10)
+        stale = await self.inventory.reserve("u1", {"prawns_big": 2})
+        await self.inventory.reserve("u1", {"prawns_big": 3})
+        with self.assertRaises(ReservationLost):
+            await self.inventory.consume(stale)
+
+    async def test_expired_reservations_return_their_stock(self):
+        await self.inventory.adjust("prawns_big", 10, shards=2)
+        reservation = await self.inventory.reserve("u1", {"prawns_big": 6})
+        await self.db.stock_reservations.update_one(
+            {"user_id": "u1"}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        self.assertEqual(await self.inventory.expire_reservations(), 1)
+        self.assertEqual(await self.available("prawns_big"), 10)
+        with self.assertRaises(ReservationLost):
+            await self.inventory.consume(reservation)
+
+    async def test_stock_stamp_covers_only_the_given_items(self):
+        await self.inventory.adjust("prawns_big", 10)
+        await self.inventory.adjust("mutton", 10)
+        await self.inventory.refresh()
+        stamp = self.inventory.stock_stamp(["prawns_big", "chicken"])
+        await self.inventory.adjust("mutton", -3)
+        await self.inventory.refresh()
+        self.assertEqual(self.inventory.stock_stamp(["prawns_big", "chicken"]), stamp)
+        await self.inventory.adjust("prawns_big", -3)
+        await self.inventory.refresh()
+        self.assertNotEqual(self.inventory.stock_stamp(["prawns_big", "chicken"]), stamp)
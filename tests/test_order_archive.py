@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from documents import new_order_document
+from order_archive import OrderArchive
+
+
+class TestOrderArchive(unittest.IsolatedAsyncioTestCase):
+    """Moving cold orders to Parquet and recovering interrupted runs"""
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = AsyncMongoMockClient()["test_order_archive"]
+        self.archive = OrderArchive(self.directory.name)
+        self.cutoff = datetime(2024, 3, 1)
+        self.orders = []
+        for day in range(0, 60, 6):
+            order = new_order_document("u1", {"chicken": [day + 1, 40000]}, 8000, state="telangana")
+            order["created_at"] = datetime(2024, 1, 1) + timedelta(days=day)
+            self.orders.append(order)
+        recent = new_order_document("u1", {"mutton": [1, 70000]}, 8000, state="telangana")
+        await self.db.orders.insert_many([dict(order) for order in self.orders] + [recent])
+
+    async def asyncTearDown(self):
+        self.directory.cleanup()
+
+    def files_on_disk(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.directory.name)
+            for root, _, names in os.walk(self.directory.name) for name in names
+        )
+
+    async def test_archive_moves_orders_and_fetch_reads_them_back(self):
+        self.assertEqual(await self.archive.archive(self.db, self.cutoff, batch_size=4), len(self.orders))
+        self.assertEqual(await self.db.orders.count_documents({}), 1)
+        self.assertEqual(await self.db.orders_archive.count_documents({"pending": True}), 0)
+
+        fetched, position = await self.archive.fetch(self.db, "u1", limit=100)
+        self.assertEqual([order["id"] for order in fetched],
+                         [order["id"] for order in sorted(self.orders, key=lambda o: o["created_at"], reverse=True)])
+        self.assertEqual(fetched[-1]["items"], self.orders[0]["items"])
+        self.assertEqual(fetched[-1]["total_amount"], self.orders[0]["total_amount"])
+        self.assertEqual(position, (self.orders[0]["created_at"], self.orders[0]["id"]))
+
+    async def test_recover_discards_a_file_that_was_never_finished(self):
+        collection = type(self.db.order_archive_files)
+        update_one = collection.update_one
+
+        async def crash(self, *args, **kwargs):
+            raise ConnectionError("job killed")
+
+        # The run dies after writing a file and its stubs, before listing it as done
+        collection.update_one = crash
+        try:
+            with self.assertRaises(ConnectionError):
+                await self.archive.archive(self.db, self.cutoff)
+        finally:
+            collection.update_one = update_one
+        self.assertEqual(await self.db.order_archive_files.count_documents({"status": "writing"}), 1)
+        self.assertEqual(len(self.files_on_disk()), 1)
+
+        await self.archive._recover(self.db)
+        self.assertEqual(await self.db.order_archive_files.count_documents({}), 0)
+        self.assertEqual(await self.db.orders_archive.count_documents({}), 0)
+        self.assertEqual(self.files_on_disk(), [])
+        self.assertEqual(await self.db.orders.count_documents({}), len(self.orders) + 1)
+
+        # A rerun archives everything exactly once
+        self.assertEqual(await self.archive.archive(self.db, self.cutoff), len(self.orders))
+        self.assertEqual(await self.db.orders_archive.count_documents({}), len(self.orders))
+
+    async def test_recover_finishes_pending_stubs(self):
+        original = self.archive._finish_pending
+        calls = []
+
+        async def crash(db, chunk_size=5000):
+            calls.append(db)
+            # The first call is archive() resuming earlier runs
+            if len(calls) == 1:
+                return await original(db, chunk_size)
+            raise ConnectionError("job killed")
+
+        # The run dies after a complete file, before deleting the hot orders
+        self.archive._finish_pending = crash
+        with self.assertRaises(ConnectionError):
+            await self.archive.archive(self.db, self.cutoff)
+        self.archive._finish_pending = original
+        self.assertEqual(await self.db.orders_archive.count_documents({"pending": True}), len(self.orders))
+        fetched, _ = await self.archive.fetch(self.db, "u1", limit=100)
+        self.assertEqual(fetched, [])
+
+        await self.archive._recover(self.db)
+        self.assertEqual(await self.db.orders.count_documents({}), 1)
+        self.assertEqual(await self.db.orders_archive.count_documents({"pending": True}), 0)
+        fetched, _ = await self.archive.fetch(self.db, "u1", limit=100)
+        self.assertEqual(len(fetched), len(self.orders))
@@ -0,0 +1,71 @@
+import unittest
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from documents import new_order_document
+from order_history import (
+    InvalidCursor, decode_cursor, encode_cursor, fetch_orders_page, keyset_query, orders_projection,
+)
+
+
+class TestCursors(unittest.TestCase):
+    """Opaque page cursors"""
+
+    def test_round_trip(self):
+        order = {"created_at": datetime(2024, 5, 1, 12, 30, 15, 123000), "id": "a|b"}
+        cursor = encode_cursor(order)
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decode_cursor(cursor), (order["created_at"], "a|b"))
+
+    def test_garbage_is_rejected(self):
+        for cursor in ("", "not a cursor", "////", encode_cursor({"created_at": datetime(2024, 1, 1), "id": "x"})[:-4]):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                decode_cursor(cursor)
+
+    def test_keyset_query(self):
+        self.assertEqual(keyset_query("u1"), {"user_id": "u1"})
+        created_at = datetime(2024, 5, 1)
+        self.assertEqual(keyset_query("u1", (created_at, "o5")), {"user_id": "u1", "$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": "o5"}},
+        ]})
+
+    def test_projection_keeps_the_cursor_fields(self):
+        projection = orders_projection(["status"], ["status", "total_amount"])
+        self.assertEqual(projection, {"status": 1, "created_at": 1, "id": 1, "_id": 0, "v": 1})
+        with self.assertRaises(ValueError):
+            orders_projection(["password"], ["status"])
+
+
+class TestFetchOrdersPage(unittest.IsolatedAsyncioTestCase):
+    """Paging through a user's orders, newest first"""
+
+    async def asyncSetUp(self):
+        self.db = AsyncMongoMockClient()["test_order_history"]
+        orders = []
+        # Pairs of orders share a created_at, so the id breaks ties
+        for index in range(7):
+            order = new_order_document("u1", {"chicken": [1, 40000]}, 8000, state="telangana")
+            order["id"] = f"o{index}"
+            order["created_at"] = datetime(2024, 5, 1) + timedelta(minutes=index // 2)
+            orders.append(order)
+        other = new_order_document("u2", {"chicken": [1, 40000]}, 8000, state="telangana")
+        await self.db.orders.insert_many(orders + [other])
+        orders.sort(key=lambda order: (order["created_at"], order["id"]), reverse=True)
+        self.newest_first = [order["id"] for order in orders]
+
+    async def test_pages_cover_every_order_once(self):
+        seen, cursor = [], None
+        while True:
+            page, cursor = await fetch_orders_page(self.db, "u1", 3, cursor)
+            seen += [order["id"] for order in page]
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.newest_first)
+
+    async def test_new_orders_do_not_shift_later_pages(self):
+        first, cursor = await fetch_orders_page(self.db, "u1", 3)
+        await self.db.orders.insert_one(new_order_document("u1", {"mutton": [1, 70000]}, 8000, state="telangana"))
+        second, _ = await fetch_orders_page(self.db, "u1", 3, cursor)
+        self.assertEqual([order["id"] for order in first + second], self.newest_first[:6])
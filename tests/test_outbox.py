@@ -0,0 +1,132 @@
+import asyncio
+import unittest
+from datetime import datetime, timedelta
+
+from mongomock_motor import AsyncMongoMockClient
+
+from outbox import Outbox
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+    """At-least-once delivery with retries and dead events"""
+
+    async def asyncSetUp(self):
+        self.db = AsyncMongoMockClient()["test_outbox"]
+        self.outbox = Outbox(max_attempts=3, backoff_base_seconds=0.01, poll_interval_seconds=0.01)
+        self.delivered = []
+        self.failures = 0
+
+        async def record(payload):
+            if self.failures:
+                self.failures -= 1
+                raise RuntimeError("handler failed")
+            self.delivered.append(payload["n"])
+
+        self.outbox.subscribe("order.created", "record", record)
+        self.outbox.start(self.db, 0)
+
+    async def publish(self, n: int) -> dict:
+        [event] = self.outbox.build_events("order.created", {"n": n})
+        await self.outbox.write([event])
+        return event
+
+    async def deliver_next(self) -> bool:
+        event = await self.outbox._claim()
+        if event is None:
+            return False
+        await self.outbox._deliver(event)
+        return True
+
+    async def make_available(self):
+        await self.db.outbox.update_many({"status": "pending"}, {"$set": {"available_at": datetime.utcnow()}})
+
+    async def status(self, event: dict) -> dict:
+        return await self.db.outbox.find_one({"id": event["id"]}, {"_id": 0})
+
+    async def test_one_event_per_subscriber(self):
+        async def other(payload):
+            pass
+
+        self.outbox.subscribe("order.created", "other", other)
+        events = self.outbox.build_events("order.created", {"n": 1})
+        self.assertEqual([event["handler"] for event in events], ["record", "other"])
+        self.assertEqual(self.outbox.build_events("order.cancelled", {"n": 1}), [])
+
+    async def test_delivers_and_marks_done(self):
+        event = await self.publish(1)
+        self.assertTrue(await self.deliver_next())
+        self.assertEqual(self.delivered, [1])
+        self.assertEqual((await self.status(event))["status"], "done")
+        self.assertFalse(await self.deliver_next())
+
+    async def test_failure_is_retried_after_a_backoff(self):
+        event = await self.publish(1)
+        self.failures = 1
+        await self.deliver_next()
+        stored = await self.status(event)
+        self.assertEqual(stored["status"], "pending")
+        self.assertGreater(stored["available_at"], datetime.utcnow() - timedelta(seconds=1))
+        self.assertIn("handler failed", stored["last_error"])
+
+        await self.make_available()
+        await self.deliver_next()
+        self.assertEqual(self.delivered, [1])
+        stored = await self.status(event)
+        self.assertEqual((stored["status"], stored["attempts"]), ("done", 2))
+
+    async def test_parked_as_dead_after_max_attempts(self):
+        event = await self.publish(1)
+        self.failures = 3
+        for _ in range(3):
+            await self.make_available()
+            await self.deliver_next()
+        self.assertEqual((await self.status(event))["status"], "dead")
+        await self.make_available()
+        self.assertFalse(await self.deliver_next())
+        self.assertEqual(self.delivered, [])
+
+    async def test_expired_lease_is_redelivered(self):
+        event = await self.publish(1)
+        claimed = await self.outbox._claim()
+        self.assertEqual(claimed["id"], event["id"])
+        self.assertIsNone(await self.outbox._claim())
+
+        await self.db.outbox.update_one(
+            {"id": event["id"]}, {"$set": {"locked_until": datetime.utcnow() - timedelta(seconds=1)}}
+        )
+        self.assertTrue(await self.deliver_next())
+        self.assertEqual(self.delivered, [1])
+
+    async def test_worker_survives_a_failed_status_write(self):
+        outbox = Outbox(lease_seconds=0.05, poll_interval_seconds=0.01)
+        delivered = []
+
+        async def record(payload):
+            delivered.append(payload["n"])
+
+        outbox.subscribe("order.created", "record", record)
+        collection = type(self.db.outbox)
+        update_one = collection.update_one
+        calls = []
+
+        async def flaky_update_one(self, *args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise ConnectionError("MongoDB unavailable")
+            return await update_one(self, *args, **kwargs)
+
+        collection.update_one = flaky_update_one
+        try:
+            outbox.start(self.db, 1)
+            await outbox.write(outbox.build_events("order.created", {"n": 1}))
+            outbox.notify()
+            for _ in range(100):
+                if await self.db.outbox.count_documents({"status": "done"}):
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await outbox.stop()
+            collection.update_one = update_one
+        # Delivered once before the status write failed, and again after the lease expired
+        self.assertEqual(delivered, [1, 1])
+        self.assertEqual(await self.db.outbox.count_documents({"status": "done"}), 1)
@@ -0,0 +1,75 @@
+import os
+import unittest
+import uuid
+
+# The app reads its settings at import; keep background work out of the tests
+os.environ.setdefault('MONGO_URL', 'mongodb://127.0.0.1:27017')
+os.environ.setdefault('DB_NAME', 'test_place_order')
+os.environ.setdefault('OUTBOX_WORKERS', '0')
+os.environ.setdefault('CATALOG_RELOAD_SECONDS', '0')
+os.environ.setdefault('INVENTORY_REFRESH_SECONDS', '0')
+os.environ.setdefault('SESSION_REVOCATION_POLL_SECONDS', '0')
+
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import server  # noqa: E402
+from cart_updates import CartChange  # noqa: E402
+
+
+class InMemoryClient(AsyncMongoMockClient):
+    def __init__(self, *args, event_listeners=None, **kwargs):
+        super().__init__()
+
+
+class TestPlaceOrderStock(unittest.IsolatedAsyncioTestCase):
+    """Checkout without a transaction never loses reserved stock"""
+
+    async def asyncSetUp(self):
+        self._client_class = server.AsyncIOMotorClient
+        server.AsyncIOMotorClient = InMemoryClient
+        self.lifespan = server.app.router.lifespan_context(server.app)
+        await self.lifespan.__aenter__()
+        self.db = server.db
+        self.inventory = server.inventory
+        await self.inventory.adjust("mutton", 10, shards=2)
+        self.user = server.User(id=str(uuid.uuid4()), email="shopper@example.com", name="Shopper")
+        await server.cart_store.apply(self.user.id, [CartChange("add", "mutton", 3)])
+        self.request = server.CheckoutRequest(
+            delivery_address="12-3-45, Main Road", pincode="500001", phone="9999999999", state="telangana",
+        )
+
+    async def asyncTearDown(self):
+        await self.lifespan.__aexit__(None, None, None)
+        server.AsyncIOMotorClient = self._client_class
+
+    async def available(self) -> int:
+        await self.inventory.refresh()
+        return self.inventory.available["mutton"]
+
+    async def test_placed_order_keeps_the_stock(self):
+        order = await server._place_order(self.user, self.request, None)
+        self.assertEqual(order["items"][0]["quantity"], 3)
+        self.assertEqual(await self.available(), 7)
+        self.assertEqual(await self.db.stock_reservations.count_documents({}), 0)
+
+    async def test_failed_insert_returns_the_stock(self):
+        collection = type(self.db.orders)
+        insert_one = collection.insert_one
+
+        # Collections share a class, so fail only the order insert
+        async def failing_insert_one(self, *args, **kwargs):
+            if self.name == "orders":
+                raise ConnectionError("MongoDB unavailable")
+            return await insert_one(self, *args, **kwargs)
+
+        collection.insert_one = failing_insert_one
+        try:
+            with self.assertRaises(ConnectionError):
+                await server._place_order(self.user, self.request, None)
+        finally:
+            collection.insert_one = insert_one
+
+        self.assertEqual(await self.db.orders.count_documents({}), 0)
+        self.assertEqual((await server.cart_store.get(self.user.id))["items"], {"mutton": 3})
+        self.assertEqual(await self.db.stock_reservations.count_documents({}), 0)
+        self.assertEqual(await self.available(), 10)
@@ -0,0 +1,37 @@
+import unittest
+from datetime import datetime
+
+from documents import new_order_document
+from sales_rollups import _courier_shares, order_lines
+
+
+class TestCourierShares(unittest.TestCase):
+    """Splitting an order's courier charges over its lines"""
+
+    def test_shares_add_up_exactly(self):
+        cases = [(100, [1, 1, 1]), (8000, [3, 7]), (1, [5, 5]), (9999, [1, 2, 3, 4]), (0, [2, 1])]
+        for courier_charges, quantities in cases:
+            with self.subTest(courier_charges=courier_charges, quantities=quantities):
+                shares = _courier_shares(courier_charges, quantities)
+                self.assertEqual(sum(shares), courier_charges)
+                self.assertEqual(len(shares), len(quantities))
+
+    def test_shares_follow_the_weight(self):
+        self.assertEqual(_courier_shares(100, [1, 1, 1]), [34, 33, 33])
+        self.assertEqual(_courier_shares(8000, [3, 1]), [6000, 2000])
+
+    def test_weightless_lines_put_everything_on_the_first(self):
+        self.assertEqual(_courier_shares(500, [0, 0]), [500, 0])
+
+
+class TestOrderLines(unittest.TestCase):
+    """Rollup contributions of one order"""
+
+    def test_lines_use_the_canonical_state_and_the_day(self):
+        order = new_order_document("u1", {"chicken": [2, 40000], "mutton": [1, 70000]}, 10001, state=" AP ")
+        order["created_at"] = datetime(2024, 5, 1, 23, 59)
+        lines = order_lines(order)
+        self.assertEqual({line["state"] for line in lines}, {"andhra pradesh"})
+        self.assertEqual({line["day"] for line in lines}, {"2024-05-01"})
+        self.assertEqual(sum(line["subtotal"] for line in lines), order["subtotal"])
+        self.assertEqual(sum(line["courier_charges"] for line in lines), 10001)
@@ -0,0 +1,75 @@
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from mongomock_motor import AsyncMongoMockClient
+
+from session_cache import SessionCache, SessionRevocations
+
+LATER = datetime.utcnow() + timedelta(days=1)
+
+
+class TestSessionCache(unittest.TestCase):
+    """Bounded LRU of session_token -> user with per-entry TTL"""
+
+    def test_entries_expire_after_the_ttl(self):
+        cache = SessionCache(ttl_seconds=60)
+        with mock.patch("session_cache.time.monotonic", return_value=1000.0):
+            cache.set("t1", "alice", "u1", LATER)
+            self.assertEqual(cache.get("t1"), "alice")
+        with mock.patch("session_cache.time.monotonic", return_value=1060.0):
+            self.assertIsNone(cache.get("t1"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_entries_never_outlive_the_session(self):
+        cache = SessionCache(ttl_seconds=60)
+        with mock.patch("session_cache.time.monotonic", return_value=1000.0):
+            cache.set("t1", "alice", "u1", datetime.utcnow() + timedelta(seconds=10))
+        with mock.patch("session_cache.time.monotonic", return_value=1011.0):
+            self.assertIsNone(cache.get("t1"))
+
+    def test_expired_sessions_are_not_cached(self):
+        cache = SessionCache()
+        cache.set("t1", "alice", "u1", datetime.utcnow() - timedelta(seconds=1))
+        self.assertIsNone(cache.get("t1"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+    def test_evicts_the_least_recently_used(self):
+        cache = SessionCache(max_size=2)
+        cache.set("t1", "alice", "u1", LATER)
+        cache.set("t2", "bob", "u2", LATER)
+        cache.get("t1")
+        cache.set("t3", "carol", "u3", LATER)
+        self.assertIsNone(cache.get("t2"))
+        self.assertEqual((cache.get("t1"), cache.get("t3")), ("alice", "carol"))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_invalidate_user_drops_all_their_sessions(self):
+        cache = SessionCache()
+        cache.set("t1", "alice", "u1", LATER)
+        cache.set("t2", "alice", "u1", LATER)
+        cache.set("t3", "bob", "u2", LATER)
+        cache.invalidate_user("u1")
+        self.assertEqual([cache.get(token) for token in ("t1", "t2", "t3")], [None, None, "bob"])
+
+
+class TestSessionRevocations(unittest.IsolatedAsyncioTestCase):
+    """Logouts reach the caches of other workers"""
+
+    async def test_revoked_tokens_leave_every_cache(self):
+        db = AsyncMongoMockClient()["test_session_cache"]
+        here, there = SessionCache(), SessionCache()
+        revocations_here, revocations_there = SessionRevocations(here, 0), SessionRevocations(there, 0)
+        revocations_here.start(db)
+        revocations_there.start(db)
+        for cache in (here, there):
+            cache.set("t1", "alice", "u1", LATER)
+            cache.set("t2", "bob", "u2", LATER)
+
+        await revocations_here.revoke("t1")
+        self.assertIsNone(here.get("t1"))
+        self.assertEqual(there.get("t1"), "alice")
+
+        self.assertEqual(await revocations_there.poll(), 1)
+        self.assertIsNone(there.get("t1"))
+        self.assertEqual(there.get("t2"), "bob")